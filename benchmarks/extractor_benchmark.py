@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the reference extraction over a corpus of saved article pages.
+
+The corpus is a directory of html files (optionally gzipped as .html.gz), eg. pages saved from de.wikipedia.org.
+For every extractor, the throughput in MB/s of html is reported, along with the amount of references found, so that
+differences between the extractors do not go unnoticed.
+
+    benchmarks/extractor_benchmark.py CORPUS_DIR [--repeat N] [--json PATH]
+"""
+import gzip
+import json
+import os
+import re
+import sys
+from argparse import ArgumentParser
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reference_extractors.german_wiki_article_extractor import GermanWikipediaArticleReferenceExtractor
+
+
+def legacy_extract(html):
+    """The extraction as it was done before the single pass extractor: Title and references in separate scans."""
+    re.search(r'<h1 id="firstHeading" .*?>(.*?)</h1>', html)
+    wikipediarefs = re.findall(r'<a\s+href="((?:(?:https?://)?de.wikipedia.org)?/wiki/(?:[^#"\s]|)+?)"[^<>]*', html)
+    only_article_refs = filter(lambda ref: not re.match(r'/wiki/((Datei)|(Spezial)|(Kategorie)|(Wikipedia)|(Hilfe)|(Portal)):.*?', ref), wikipediarefs)
+    result_set = set()
+    for ref in only_article_refs:
+        if not ref.startswith("https://de.wikipedia.org"):
+            result_set.add("https://de.wikipedia.org" + ref)
+    return result_set
+
+
+EXTRACTORS = {
+    'legacy': legacy_extract,
+    'single_pass': GermanWikipediaArticleReferenceExtractor().extract,
+    'single_pass_content_only': GermanWikipediaArticleReferenceExtractor(content_only=True).extract,
+}
+
+
+def load_corpus(directory):
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith('.html.gz'):
+            with gzip.open(path, 'rb') as file:
+                pages.append(file.read().decode('utf-8'))
+        elif name.endswith('.html'):
+            with open(path, encoding='utf-8') as file:
+                pages.append(file.read())
+    return pages
+
+
+def run(pages, repeat=5):
+    """Runs every extractor over the pages.
+
+    Args:
+        pages (list[str]): html of the pages
+        repeat (int, optional): Passes over the corpus per extractor. The fastest one counts. Defaults to 5.
+
+    Returns:
+        dict: results per extractor, with seconds, MB/s and the amount of references found.
+    """
+    megabytes = sum(len(page.encode('utf-8')) for page in pages) / 1024 ** 2
+    results = {}
+    for name, extractor in EXTRACTORS.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = perf_counter()
+            found = [extractor(page) for page in pages]
+            best = min(best, perf_counter() - start)
+        references = sum(len(result if isinstance(result, set) else result.references) for result in found)
+        results[name] = {'seconds': best, 'mb_per_s': megabytes / best if best else float('inf'), 'references': references}
+    return {'pages': len(pages), 'megabytes': megabytes, 'extractors': results}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Measures the throughput of the reference extractors over saved article pages')
+    parser.add_argument('corpus', metavar='CORPUS_DIR', help='directory with .html or .html.gz files')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the corpus per extractor; the fastest one counts')
+    parser.add_argument('--json', metavar='PATH', default=None, help='also write the results as JSON into this file')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        print(f'There are no .html or .html.gz files in {args.corpus}.')
+        exit(1)
+    results = run(pages, args.repeat)
+    print(f"{results['pages']} pages, {results['megabytes']:.2f} MB")
+    for name, result in results['extractors'].items():
+        print(f"{name:>26}: {result['mb_per_s']:8.2f} MB/s, {result['references']} references")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Benchmark suite of the WikiGraph against a synthetic wiki (see synthetic_wiki), reproducible without the internet.
+
+Scenarios:
+    crawl       crawls the wiki from a local server, per graph size, concurrency, parse workers and backend (pages or
+                the MediaWiki API): nodes per second and requests
+    extraction  extracts the references of generated pages: MB/s per markup
+    persistence saves and loads a graph in the binary and the pickle format: seconds and file size
+    export      exports a graph into every export format: seconds and file size
+
+Graphs of the persistence and export scenarios are built from the wiki directly (without serving pages), so large sizes
+are cheap. Every scenario runs in a fresh process, so that its peak memory (max RSS) is its own.
+
+Results are appended to a JSON lines file, one line per scenario and parameters, tagged with the git commit. --compare
+prints the change against the results of another run, eg. of an earlier commit:
+
+    benchmarks/run_benchmarks.py --sizes 1000 10000 --output results.jsonl
+    benchmarks/run_benchmarks.py --sizes 1000 10000 --output new.jsonl --compare results.jsonl
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_wiki import MARKUPS, SyntheticLinkSource, SyntheticWiki, WikiServer, session_for
+
+SCENARIOS = ('crawl', 'extraction', 'persistence', 'export')
+# Scenario results that get better as they grow. Everything else (seconds, bytes, memory) gets better as it shrinks.
+_HIGHER_IS_BETTER = ('nodes_per_s', 'mb_per_s')
+
+
+def _peak_memory_mb():
+    # ru_maxrss is in KiB on Linux, but in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _file_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def _build_graph(wiki, depth):
+    from wikigraph import WikiGraph
+    from wikigraph_progress import ProgressReporter
+    return WikiGraph(wiki.url(0), depth, wiki.size, link_source=SyntheticLinkSource(wiki), progress=ProgressReporter())
+
+
+def crawl(wiki, depth, concurrency, latency, parse_workers=0, backend='html'):
+    from fetcher import Fetcher
+    from mediawiki_api import API_PATH, MediaWikiLinkSource
+    from synthetic_wiki import HOST
+    from wikigraph import WikiGraph
+    from wikigraph_progress import ProgressReporter
+    with WikiServer(wiki, latency) as server:
+        # The rate limit would measure itself instead of the crawl.
+        fetcher = Fetcher(session_for(server, pool_size=max(10, concurrency)), rate=10 ** 6, max_rate=10 ** 6, adaptive=False)
+        link_source = MediaWikiLinkSource(HOST + API_PATH, fetcher) if backend == 'api' else None
+        start = perf_counter()
+        graph = WikiGraph(wiki.url(0), depth, wiki.size, concurrency=concurrency, fetcher=fetcher, progress=ProgressReporter(),
+                          parse_workers=parse_workers, link_source=link_source)
+        seconds = perf_counter() - start
+    return {'seconds': seconds, 'nodes': len(graph.nodes), 'edges': graph._count_edges(), 'requests': fetcher.stats['requests'],
+            'nodes_per_s': len(graph.nodes) / seconds}
+
+
+def extraction(wiki, pages, repeat):
+    from reference_extractors.german_wiki_article_extractor import GermanWikipediaArticleReferenceExtractor
+    extractor = GermanWikipediaArticleReferenceExtractor()
+    html = [wiki.page(number) for number in range(min(pages, wiki.size))]
+    megabytes = sum(len(page.encode('utf-8')) for page in html) / 1024 ** 2
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        references = sum(len(extractor.extract(page).references) for page in html)
+        best = min(best, perf_counter() - start)
+    return {'seconds': best, 'pages': len(html), 'megabytes': megabytes, 'references': references, 'mb_per_s': megabytes / best}
+
+
+def persistence(wiki, depth, directory):
+    from wikigraph import WikiGraph
+    graph = _build_graph(wiki, depth)
+    results = {'nodes': len(graph.nodes), 'edges': graph._count_edges()}
+    for format in ('binary', 'pickle'):
+        path = os.path.join(directory, f'graph.{format}')
+        start = perf_counter()
+        graph.save(path, format=format)
+        results[f'{format}_save_seconds'] = perf_counter() - start
+        results[f'{format}_bytes'] = _file_size(path)
+        start = perf_counter()
+        loaded = WikiGraph.load(path)
+        # Loading is only done when the graph can be used.
+        len(loaded.nodes)
+        results[f'{format}_load_seconds'] = perf_counter() - start
+    return results
+
+
+def export(wiki, depth, directory):
+    graph = _build_graph(wiki, depth)
+    results = {'nodes': len(graph.nodes), 'edges': graph._count_edges()}
+    for format, extension in (('gml', 'gml'), ('graphml', 'graphml'), ('edge_list', 'csv'), ('adjacency_list', 'adjlist')):
+        path = os.path.join(directory, f'graph.{extension}')
+        start = perf_counter()
+        graph.export(path, format={'edge_list': 'csv', 'adjacency_list': 'adjlist'}.get(format, format))
+        results[f'{format}_seconds'] = perf_counter() - start
+        results[f'{format}_bytes'] = _file_size(path)
+    return results
+
+
+def _run(scenario, wiki_parameters, parameters, results):
+    wiki = SyntheticWiki(**wiki_parameters)
+    with tempfile.TemporaryDirectory() as directory:
+        if scenario == 'crawl':
+            result = crawl(wiki, parameters['depth'], parameters['concurrency'], parameters['latency'], parameters['parse_workers'],
+                           parameters.get('backend', 'html'))
+        elif scenario == 'extraction':
+            result = extraction(wiki, parameters['pages'], parameters['repeat'])
+        elif scenario == 'persistence':
+            result = persistence(wiki, parameters['depth'], directory)
+        else:
+            result = export(wiki, parameters['depth'], directory)
+    result['peak_memory_mb'] = _peak_memory_mb()
+    results.put(result)
+
+
+def run_scenario(scenario: str, wiki: SyntheticWiki, **parameters) -> dict:
+    """Runs one scenario in a fresh process.
+
+    Returns:
+        dict: the result line: scenario, parameters of wiki and scenario, commit, time and the measured results
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(scenario, wiki.parameters, parameters, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return {'scenario': scenario, 'wiki': wiki.parameters, 'parameters': parameters, 'commit': _commit(), 'time': time(),
+            'python': platform.python_version(), 'results': result}
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(line):
+    return json.dumps([line['scenario'], line['wiki'], line['parameters']], sort_keys=True)
+
+
+def compare(lines, baseline_path):
+    """Prints the change of every result against the latest result of the same scenario and parameters in the baseline."""
+    with open(baseline_path) as file:
+        baseline = {_key(line): line for line in map(json.loads, filter(str.strip, file))}
+    for line in lines:
+        old = baseline.get(_key(line))
+        if old is None:
+            continue
+        print(f"{line['scenario']} {line['parameters']} against {old['commit']}:")
+        for name, value in line['results'].items():
+            previous = old['results'].get(name)
+            if not isinstance(value, (int, float)) or not previous:
+                continue
+            change = (value - previous) / previous
+            better = change > 0 if name.endswith(_HIGHER_IS_BETTER) else change < 0
+            print(f"  {name:>28}: {previous:12.4g} -> {value:12.4g} ({change:+.1%}{', better' if better and abs(change) > 0.05 else ''})")
+
+
+def _summary(line):
+    results = line['results']
+    shown = {name: value for name, value in results.items() if name.endswith(('per_s', 'seconds', 'bytes', 'memory_mb'))}
+    return ', '.join(f'{name}={value:.4g}' for name, value in shown.items())
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Benchmarks the WikiGraph against a synthetic wiki')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help='scenarios to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='graph sizes (articles of the wiki)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='parallel downloads of the crawl scenario')
+    parser.add_argument('--parse_workers', type=int, nargs='+', default=[0], help='worker processes for the extraction in the crawl scenario')
+    parser.add_argument('--backends', nargs='+', choices=('html', 'api'), default=['html'], help='where the crawl scenario gets the references from: downloaded pages or the stand-in MediaWiki API')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds every response of the local server is delayed by')
+    parser.add_argument('--crawl_size', type=int, default=2000, help='maximum graph size of the crawl scenario, which is slow for large sizes')
+    parser.add_argument('--depth', type=int, default=10, help='depth of the crawled and built graphs')
+    parser.add_argument('--degree', choices=('fixed', 'poisson', 'powerlaw'), default='powerlaw', help='distribution of the links per page')
+    parser.add_argument('--mean_degree', type=float, default=20, help='average amount of article links per page')
+    parser.add_argument('--page_bytes', type=int, default=60000, help='approximate size of every page')
+    parser.add_argument('--pages', type=int, default=500, help='pages of the extraction scenario')
+    parser.add_argument('--repeat', type=int, default=3, help='passes of the extraction scenario; the fastest one counts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', metavar='PATH', default=None, help='append the results as JSON lines to this file')
+    parser.add_argument('--compare', metavar='PATH', default=None, help='compare the results with those in this JSON lines file')
+    args = parser.parse_args()
+
+    def wiki(size, markup='modern'):
+        return SyntheticWiki(size, args.mean_degree, args.degree, page_bytes=args.page_bytes, markup=markup, seed=args.seed)
+
+    runs = []
+    if 'crawl' in args.scenarios:
+        # Crawls of pages keep the parameters of earlier results, so they can be compared.
+        runs += [('crawl', wiki(size), {'depth': args.depth, 'concurrency': concurrency, 'latency': args.latency, 'parse_workers': workers,
+                                        **({'backend': backend} if backend != 'html' else {})})
+                 for size in sorted(set(min(size, args.crawl_size) for size in args.sizes))
+                 for concurrency in args.concurrency for workers in args.parse_workers for backend in args.backends]
+    if 'extraction' in args.scenarios:
+        runs += [('extraction', wiki(args.pages, markup), {'pages': args.pages, 'repeat': args.repeat}) for markup in MARKUPS]
+    for scenario in ('persistence', 'export'):
+        if scenario in args.scenarios:
+            runs += [(scenario, wiki(size), {'depth': args.depth}) for size in args.sizes]
+
+    lines = []
+    for scenario, scenario_wiki, parameters in runs:
+        line = run_scenario(scenario, scenario_wiki, **parameters)
+        print(f"{scenario} (size {scenario_wiki.size}, {scenario_wiki.markup}, {parameters}): {_summary(line)}")
+        lines.append(line)
+        if args.output:
+            with open(args.output, 'a') as file:
+                file.write(json.dumps(line) + '\n')
+    if args.compare:
+        compare(lines, args.compare)
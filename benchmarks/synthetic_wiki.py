@@ -0,0 +1,455 @@
+"""Synthetic Wikipedia for benchmarks: a generated wiki of any size, and a local HTTP server that serves it.
+
+Every page is generated on demand from the seed and its number, so even wikis with millions of articles take no memory
+and the same parameters always give the same wiki. Articles are called Artikel_0, Artikel_1, ... and link to each other
+in markup like that of de.wikipedia.org, with the usual noise around the article links (files, categories, special pages,
+red links, anchors, external links, navigation).
+
+The server is a separate process, so that generating pages does not compete with the crawl for the GIL. Crawls keep
+using the urls of de.wikipedia.org: session_for mounts an adapter that sends their requests to the local server instead.
+It also stands in for the MediaWiki Action API under /w/api.php, as far as prop=links and prop=linkshere queries go
+(see mediawiki_api). Weiterleitung_0, Weiterleitung_1, ... are redirects to the articles of the same number. Like an
+overloaded server, it can answer with errors (eg. 429 or 503) and Retry-After headers.
+Pages come with ETag and Last-Modified validators, and conditional requests for unchanged pages are answered with 304.
+
+    benchmarks/synthetic_wiki.py --size 100000 --latency 0.05   # serves a wiki until interrupted
+"""
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import threading
+from argparse import ArgumentParser
+from email.utils import formatdate, parsedate_to_datetime
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from link_source import LinkSource
+
+HOST = 'https://de.wikipedia.org'
+DEGREES = ('fixed', 'poisson', 'powerlaw')
+# Links per API response, like pllimit=max for clients without bot rights
+API_LIMIT = 500
+# Titles per API request, as for clients without bot rights
+API_TITLES = 50
+MARKUPS = ('modern', 'legacy')
+# Generated pages never change. They all claim to be last edited at this time.
+LAST_MODIFIED = formatdate(1704067200, usegmt=True)
+_FILLER = ('Die', 'Geschichte', 'der', 'Stadt', 'wurde', 'im', 'Jahr', 'erstmals', 'urkundlich', 'erwähnt', 'und',
+           'entwickelte', 'sich', 'zu', 'einem', 'bedeutenden', 'Zentrum', 'des', 'Handels', 'mit', 'Umland')
+_NOISE = ('<a href="/wiki/Datei:Karte_{n}.png" class="mw-file-description"><img src="//upload.wikimedia.org/karte_{n}.png" width="220"></a>',
+          '<a href="/wiki/Spezial:ISBN-Suche/978{n}" class="internal mw-magiclink-isbn">ISBN 978{n}</a>',
+          '<a href="/w/index.php?title=Unbekannt_{n}&amp;action=edit&amp;redlink=1" class="new" title="Unbekannt {n} (Seite nicht vorhanden)">Unbekannt {n}</a>',
+          '<a href="#Geschichte_{n}">Geschichte</a>',
+          '<a rel="nofollow" class="external text" href="https://www.example.org/quelle/{n}">Quelle {n}</a>',
+          '<sup id="cite_ref-{n}" class="reference"><a href="#cite_note-{n}">[{n}]</a></sup>')
+
+
+class SyntheticWiki:
+    """A generated wiki. Holds nothing but its parameters, and the reverse links once they are asked for."""
+    _referencing = None
+
+    def __init__(self, size: int, mean_degree: float = 20, degree: str = 'powerlaw', popularity: float = 2.0,
+                 page_bytes: int = 60000, markup: str = 'modern', seed: int = 0) -> None:
+        """
+        Args:
+            size (int): Number of articles.
+            mean_degree (float, optional): Average amount of article links per page. Defaults to 20.
+            degree (str, optional): Distribution of the links per page: 'fixed', 'poisson' or 'powerlaw' (a few pages
+                with very many links, like lists and navigation heavy articles). Defaults to 'powerlaw'.
+            popularity (float, optional): Skew of the link targets. 1 links all articles equally often, higher values
+                link articles with low numbers far more often. Defaults to 2.0.
+            page_bytes (int, optional): Approximate size of every page, filled up with text. Defaults to 60000, roughly
+                that of an average de.wikipedia.org article.
+            markup (str, optional): 'modern' (the current Vector skin, with navigation and footer) or 'legacy' (bare
+                article text). Defaults to 'modern'.
+            seed (int, optional): Seed of the wiki. Defaults to 0.
+
+        Raises:
+            ValueError: unknown degree distribution or markup
+        """
+        if degree not in DEGREES:
+            raise ValueError(f'Unknown degree distribution {degree}, expected one of {", ".join(DEGREES)}.')
+        if markup not in MARKUPS:
+            raise ValueError(f'Unknown markup {markup}, expected one of {", ".join(MARKUPS)}.')
+        self.size = size
+        self.mean_degree = mean_degree
+        self.degree = degree
+        self.popularity = popularity
+        self.page_bytes = page_bytes
+        self.markup = markup
+        self.seed = seed
+
+    @property
+    def parameters(self) -> dict:
+        return {'size': self.size, 'mean_degree': self.mean_degree, 'degree': self.degree, 'popularity': self.popularity,
+                'page_bytes': self.page_bytes, 'markup': self.markup, 'seed': self.seed}
+
+    @staticmethod
+    def title(number: int) -> str:
+        return f'Artikel_{number}'
+
+    def url(self, number: int, host: str = HOST) -> str:
+        return f'{host}/wiki/{self.title(number)}'
+
+    def number(self, title: str):
+        """
+        Returns:
+            int | None: number of the article with this title (as in its url), None if there is no such article
+        """
+        return self._numbered(title, 'Artikel')
+
+    def redirect(self, title: str):
+        """
+        Returns:
+            int | None: number of the article a redirect (Weiterleitung_<number>) leads to, None if there is no such redirect
+        """
+        return self._numbered(title, 'Weiterleitung')
+
+    def _numbered(self, title, name):
+        prefix, _, number = unquote(title).partition('_')
+        if prefix != name or not number.isdigit() or int(number) >= self.size:
+            return None
+        return int(number)
+
+    def _random(self, number, purpose):
+        return random.Random(f'{self.seed}:{purpose}:{number}')
+
+    def _out_degree(self, rnd):
+        if self.degree == 'fixed':
+            return round(self.mean_degree)
+        if self.degree == 'poisson':
+            # Knuth's method is fine for the small means of link counts.
+            threshold, count, product = math.exp(-self.mean_degree), 0, rnd.random()
+            while product > threshold:
+                count += 1
+                product *= rnd.random()
+            return count
+        # Pareto with shape 2 has mean 2 * scale.
+        return min(self.size, int(rnd.paretovariate(2.0) * self.mean_degree / 2))
+
+    def links(self, number: int) -> list:
+        """
+        Returns:
+            list[int]: numbers of the articles the article links to, without duplicates, in order of appearance
+        """
+        rnd = self._random(number, 'links')
+        links = {}
+        for _ in range(self._out_degree(rnd)):
+            links[int(self.size * rnd.random() ** self.popularity)] = None
+        return list(links)
+
+    def referencing(self, number: int) -> list:
+        """The first call generates the links of every article, which takes a while for large wikis.
+
+        Returns:
+            list[int]: numbers of the articles that link to the article, ascending
+        """
+        if self._referencing is None:
+            self._referencing = [[] for _ in range(self.size)]
+            for source in range(self.size):
+                for target in self.links(source):
+                    self._referencing[target].append(source)
+        return self._referencing[number]
+
+    def page(self, number: int) -> str:
+        """
+        Returns:
+            str: html of the article page
+        """
+        rnd = self._random(number, 'page')
+        title = self.title(number).replace('_', ' ')
+        links = self.links(number)
+        paragraphs = []
+        for index, target in enumerate(links):
+            words = ' '.join(rnd.choice(_FILLER) for _ in range(12))
+            noise = _NOISE[index % len(_NOISE)].format(n=rnd.randrange(10 ** 6)) if rnd.random() < 0.5 else ''
+            target_title = self.title(target)
+            paragraphs.append(f'<p>{words} <a href="/wiki/{target_title}" title="{target_title.replace("_", " ")}">'
+                              f'{target_title.replace("_", " ")}</a> {noise}</p>')
+        content = '\n'.join(paragraphs)
+        if self.markup == 'legacy':
+            head = f'<html><head><title>{title} – Wikipedia</title></head><body>\n<h1 id="firstHeading" class="firstHeading">{title}</h1>\n'
+            foot = '</body></html>\n'
+            body = f'<div id="mw-content-text">\n{content}\n'
+            closing = '</div>\n'
+        else:
+            head = (f'<!DOCTYPE html>\n<html class="client-nojs" lang="de" dir="ltr"><head><meta charset="UTF-8">'
+                    f'<title>{title} – Wikipedia</title><link rel="canonical" href="{self.url(number)}"></head>\n'
+                    '<body class="skin-vector mediawiki ltr"><div id="mw-navigation">'
+                    '<a href="/wiki/Wikipedia:Hauptseite" title="Hauptseite">Hauptseite</a>'
+                    '<a href="/wiki/Spezial:Zuf%C3%A4llige_Seite" title="Zufällige Seite">Zufälliger Artikel</a>'
+                    '<a href="/wiki/Hilfe:%C3%9Cbersicht">Hilfe</a><a href="/wiki/Portal:Geographie">Portal</a></div>\n'
+                    f'<h1 id="firstHeading" class="firstHeading mw-first-heading"><span class="mw-page-title-main">{title}</span></h1>\n')
+            body = f'<div id="mw-content-text" class="mw-body-content"><div class="mw-parser-output">\n{content}\n'
+            foot = ''
+            closing = ('</div></div>\n<div class="printfooter">Abgerufen von „<a dir="ltr" href="'
+                       f'{self.url(number)}">{self.url(number)}</a>“</div>\n'
+                       '<div id="catlinks" class="catlinks"><a href="/wiki/Kategorie:Ort">Ort</a></div>\n'
+                       '<div id="footer"><a href="/wiki/Wikipedia:Impressum">Impressum</a></div></body></html>\n')
+        # Text without links up to the page size, like the bulk of a real article.
+        missing = self.page_bytes - len(head) - len(body) - len(closing) - len(foot)
+        filler = []
+        while missing > 0:
+            sentence = '<p>' + ' '.join(rnd.choice(_FILLER) for _ in range(40)) + '.</p>\n'
+            filler.append(sentence)
+            missing -= len(sentence.encode('utf-8'))
+        return head + body + ''.join(filler) + closing + foot
+
+
+class SyntheticLinkSource(LinkSource):
+    """References straight from a synthetic wiki, to build large graphs without serving and extracting pages."""
+    def __init__(self, wiki: SyntheticWiki, host: str = HOST) -> None:
+        self.wiki = wiki
+        self.host = host
+
+    def references(self, url):
+        number = self.wiki.number(urlsplit(url).path.rpartition('/')[2])
+        if number is None:
+            return []
+        return [self.wiki.url(target, self.host) for target in self.wiki.links(number)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wiki: SyntheticWiki = None
+    latency = 0.0
+    jitter = 0.0
+    error_status = 503
+    error_rate = 0.0
+    failures = 0
+    retry_after = None
+    # Requests per path so far, for the failures
+    requests_seen: Counter = None
+    lock: threading.Lock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path, query = urlsplit(self.path)[2:4]
+        number = None
+        if path.startswith('/wiki/'):
+            # Redirects show the article they lead to, with its canonical url.
+            number = self.wiki.number(path[len('/wiki/'):])
+            number = number if number is not None else self.wiki.redirect(path[len('/wiki/'):])
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            sleep(delay)
+        with self.lock:
+            self.requests_seen[self.path] += 1
+            seen = self.requests_seen[self.path]
+        if seen <= self.failures or (self.error_rate and random.random() < self.error_rate):
+            return self._error()
+        if path == '/w/api.php':
+            return self._api(parse_qs(query))
+        if number is None:
+            body, status = b'Dieser Artikel existiert nicht.', 404
+        else:
+            body, status = self.wiki.page(number).encode('utf-8'), 200
+            etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+            if self._not_modified(etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', LAST_MODIFIED)
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag):
+        # If-None-Match wins over If-Modified-Since, like in RFC 9110.
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(LAST_MODIFIED)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _error(self):
+        body = b'Der Server ist ausgelastet.'
+        self.send_response(self.error_status)
+        if self.retry_after is not None:
+            self.send_header('Retry-After', f'{self.retry_after:g}')
+        self.send_header('Content-Type', 'text/plain; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _api(self, params):
+        param = lambda name, default=None: params.get(name, [default])[0]
+        prop = param('prop')
+        if param('action') != 'query' or prop not in ('links', 'linkshere'):
+            data = {'error': {'code': 'badvalue', 'info': 'The stand-in only knows action=query&prop=links|linkshere.'}}
+        elif len(param('titles', '').split('|')) > API_TITLES:
+            data = {'error': {'code': 'toomanyvalues', 'info': f'Too many values supplied for parameter "titles". The limit is {API_TITLES}.'}}
+        else:
+            prefix = 'pl' if prop == 'links' else 'lh'
+            related = self.wiki.links if prop == 'links' else self.wiki.referencing
+            namespaces = param(f'{prefix}namespace', '0').split('|')
+            offset = int(param(f'{prefix}continue', '0'))
+            pages, remaining = [], API_LIMIT
+            normalized, redirects, seen = [], [], set()
+            links = 0
+            for raw in param('titles', '').split('|'):
+                # Normalized and redirected like by the real API, which then answers once for every page.
+                title = raw.replace('_', ' ')
+                title = title[:1].upper() + title[1:]
+                if title != raw:
+                    normalized.append({'fromencoded': False, 'from': raw, 'to': title})
+                number = self.wiki.number(title.replace(' ', '_'))
+                target = self.wiki.redirect(title.replace(' ', '_')) if param('redirects') else None
+                if target is not None:
+                    number = target
+                    redirects.append({'from': title, 'to': self.wiki.title(target).replace('_', ' ')})
+                    title = redirects[-1]['to']
+                if title in seen:
+                    continue
+                seen.add(title)
+                page = {'ns': 0, 'title': title}
+                if number is None:
+                    page['missing'] = True
+                elif '0' in namespaces:
+                    # Sorted by title, like the real API. Continuation counts links across the pages of the query.
+                    titles = sorted(self.wiki.title(other).replace('_', ' ') for other in related(number))
+                    start = max(0, offset - links)
+                    page[prop] = [{'ns': 0, 'title': link} for link in titles[start:start + remaining]]
+                    links += len(titles)
+                    remaining -= len(page[prop])
+                pages.append(page)
+            query = {'pages': pages}
+            if redirects:
+                query = {'redirects': redirects, **query}
+            if normalized:
+                query = {'normalized': normalized, **query}
+            data = {'batchcomplete': True, 'query': query}
+            if links > offset + API_LIMIT:
+                data = {'continue': {f'{prefix}continue': str(offset + API_LIMIT), 'continue': '||'}, **data}
+                del data['batchcomplete']
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _serve(wiki, options, ports):
+    handler = type('Handler', (_Handler,), {'wiki': wiki, 'requests_seen': Counter(), 'lock': threading.Lock(), **options})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+class WikiServer:
+    """A synthetic wiki served over HTTP on localhost, by a separate process. Use as context manager."""
+    def __init__(self, wiki: SyntheticWiki, latency: float = 0.0, jitter: float = 0.0, error_status: int = 503,
+                 error_rate: float = 0.0, failures: int = 0, retry_after: float = None) -> None:
+        """
+        Args:
+            wiki (SyntheticWiki): the wiki to serve
+            latency (float, optional): Seconds every response is delayed by, like the round trip to a real server. Defaults to 0.0.
+            jitter (float, optional): Up to this many seconds are added at random to the latency. Defaults to 0.0.
+            error_status (int, optional): Status of the injected errors, eg. 429 or 503. Defaults to 503.
+            error_rate (float, optional): Share of the requests that are answered with an error at random. Defaults to 0.0.
+            failures (int, optional): The first this many requests of every url are answered with an error. Defaults to 0.
+            retry_after (float, optional): Seconds sent as Retry-After with the errors. Defaults to None, no header.
+        """
+        self.wiki = wiki
+        self.latency = latency
+        self.jitter = jitter
+        self.error_status = error_status
+        self.error_rate = error_rate
+        self.failures = failures
+        self.retry_after = retry_after
+        self.url = None
+        self._process = None
+
+    def start(self):
+        ports = multiprocessing.Queue()
+        options = {'latency': self.latency, 'jitter': self.jitter, 'error_status': self.error_status, 'error_rate': self.error_rate,
+                   'failures': self.failures, 'retry_after': self.retry_after}
+        self._process = multiprocessing.Process(target=_serve, args=(self.wiki, options, ports), daemon=True)
+        self._process.start()
+        self.url = f'http://127.0.0.1:{ports.get(timeout=30)}'
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _LocalAdapter(HTTPAdapter):
+    # Sends requests for the real host to the local server.
+    def __init__(self, host, local, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.host = host
+        self.local = local
+
+    def send(self, request, **kwargs):
+        if request.url.startswith(self.host):
+            request.url = self.local + request.url[len(self.host):]
+        return super().send(request, **kwargs)
+
+
+def session_for(server: WikiServer, host: str = HOST, pool_size: int = 10) -> requests.Session:
+    """
+    Returns:
+        requests.Session: session that downloads the pages of the host from the server
+    """
+    session = requests.Session()
+    session.mount(host + '/', _LocalAdapter(host, server.url, pool_connections=pool_size, pool_maxsize=pool_size))
+    return session
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Serves a synthetic wiki on localhost until interrupted')
+    parser.add_argument('--size', type=int, default=10000, help='number of articles')
+    parser.add_argument('--degree', choices=DEGREES, default='powerlaw', help='distribution of the links per page')
+    parser.add_argument('--mean_degree', type=float, default=20, help='average amount of article links per page')
+    parser.add_argument('--page_bytes', type=int, default=60000, help='approximate size of every page')
+    parser.add_argument('--markup', choices=MARKUPS, default='modern', help='markup of the pages')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every response is delayed by')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds are added at random to the latency')
+    parser.add_argument('--error_status', type=int, default=503, help='status of the injected errors, eg. 429 or 503')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='share of the requests that are answered with an error')
+    parser.add_argument('--failures', type=int, default=0, help='the first this many requests of every url are answered with an error')
+    parser.add_argument('--retry_after', type=float, default=None, help='seconds sent as Retry-After with the errors')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    wiki = SyntheticWiki(args.size, args.mean_degree, args.degree, page_bytes=args.page_bytes, markup=args.markup, seed=args.seed)
+    with WikiServer(wiki, args.latency, args.jitter, args.error_status, args.error_rate, args.failures, args.retry_after) as server:
+        print(f'Serving {args.size} articles at {server.url}/wiki/{wiki.title(0)} (Ctrl+C to stop)')
+        try:
+            while True:
+                sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,101 @@
+"""Append-only checkpoints of a running crawl.
+
+A checkpoint is a gzip file of JSON lines. The first line describes the crawl (root, depth, max_nodes), every
+following line one expansion of a node:
+
+    {"node": id, "new": [urls of the nodes it added, in order], "targets": [ids of all its references in the graph],
+     "rest": [references that did not fit into the graph anymore]}
+
+or the canonical url that the page of a node stated, if it was not the url of the node (see WikiGraph._resolve_canonical):
+
+    {"node": id, "canonical": url}
+
+Node ids are handed out in order of addition, so replaying the expansions in order rebuilds the visited nodes,
+their depths, the edges and the frontier exactly. Every flush appends a new gzip member, so nothing that was flushed
+before is ever rewritten, and a crash can at most cost the records since the last flush.
+"""
+import gzip
+import json
+import zlib
+from time import time
+
+FORMAT = 'wikigraph-checkpoint'
+VERSION = 1
+
+
+class CheckpointWriter:
+    """Collects expansion records and appends them to the checkpoint file every few expansions or seconds."""
+    def __init__(self, path: str, every: int = 100, seconds: float = 30) -> None:
+        """
+        Args:
+            path (str): path of the checkpoint file
+            every (int, optional): Expansions after which the records are appended to the file. Defaults to 100.
+            seconds (float, optional): Seconds after which the records are appended to the file. Defaults to 30.
+        """
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self._records = []
+        self._last_flush = time()
+
+    def start(self, root: str, depth: int, max_nodes: int):
+        """Creates the checkpoint file with the description of the crawl.
+
+        Raises:
+            FileExistsError: there is already a file in this path. Use resume to continue it.
+        """
+        with gzip.open(self.path, 'xt', encoding='utf-8') as file:
+            file.write(json.dumps({'format': FORMAT, 'version': VERSION, 'root': root, 'depth': depth, 'max_nodes': max_nodes}) + '\n')
+
+    def record(self, node_id: int, new_urls, targets, rest=()):
+        self._records.append({'node': node_id, 'new': list(new_urls), 'targets': list(targets), 'rest': list(rest)})
+        if len(self._records) >= self.every or time() - self._last_flush >= self.seconds:
+            self.flush()
+
+    def record_canonical(self, node_id: int, url: str):
+        self._records.append({'node': node_id, 'canonical': url})
+
+    def flush(self):
+        self._last_flush = time()
+        if not self._records:
+            return
+        with gzip.open(self.path, 'at', encoding='utf-8') as file:
+            file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in self._records)
+        self._records = []
+
+    def __getstate__(self):
+        # Unflushed records are flushed, not pickled.
+        self.flush()
+        return self.__dict__.copy()
+
+
+def read_checkpoint(path: str):
+    """Reads a checkpoint file. A damaged end (eg. from a crash during a flush) is ignored.
+
+    Args:
+        path (str): path of the checkpoint file
+
+    Raises:
+        ValueError: the file is no checkpoint
+
+    Returns:
+        tuple[dict, list[dict]]: description of the crawl and the expansion records in order
+    """
+    lines = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                lines.append(line)
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        pass
+    if not lines:
+        raise ValueError(f'{path} is no crawl checkpoint.')
+    header = json.loads(lines[0])
+    if header.get('format') != FORMAT:
+        raise ValueError(f'{path} is no crawl checkpoint.')
+    records = []
+    for line in lines[1:]:
+        if not line.endswith('\n'):
+            break # Cut off in the middle of a record
+        records.append(json.loads(line))
+    return header, records
@@ -0,0 +1,475 @@
+"""Out-of-core crawls, for graphs of millions of articles that do not fit into memory.
+
+A WikiGraph keeps every node in memory: its url, an entry in the index of urls and its adjacency. A DiskCrawl keeps
+nothing per node in memory. Everything lives in a work directory:
+    visited set  sqlite table of all known urls (including the ones of renamed redirects), with the id of their node,
+                 next to the table of the nodes with url and depth
+    frontier     the table of the nodes itself: ids are given in the order in which nodes are found, which in a width-first
+                 crawl is the order in which they are expanded. The queue is a cursor running over the ids.
+    edges        appended to a file in the order of their sources, which is the order of the ids again, so that file already
+                 is the forward adjacency. The same edges are collected in a buffer that is sorted by target and written as
+                 a run whenever it is full. At the end, the runs are merged into the backward adjacency, block of targets
+                 by block of targets.
+The graph is then streamed into a binary WikiGraph file (see wikigraph_format), which WikiGraph.load maps into memory
+without reading it. The arrays with an entry per node that the file needs are built as memory mapped files.
+
+The memory budget is shared by the page cache of sqlite and the edge buffer, which also bounds the blocks of the merge.
+
+Compared to the crawl of WikiGraph, there are a few restrictions:
+    - Crawls are width-first, as the frontier is the order of the ids.
+    - A redirect is renamed to the article it leads to, unless that is a node already. Merging the two would mean
+      rewriting edges on disk, so the redirect stays a node of its own, with a single reference to the article.
+    - No eager titles, search index, html retention, checkpoints or parse workers.
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+import numpy as np
+
+import wikigraph_format
+from fetcher import Fetcher, FetchError
+from graph_core import NOT_EXPANDED, EXPANDED, PARTIALLY_EXPANDED, FAILED
+from link_source import LinkSource
+from page_cache import PageCache
+from wikiarticle import WikiArticle
+from wikigraph_metrics import REGISTRY as METRICS
+from wikigraph_progress import Progress, ProgressReporter, ConsoleProgress
+from wikiurl import canonical_url
+
+# Rows and array entries that are streamed at once while writing the file
+CHUNK = 1 << 16
+# Bytes per edge while a run or a block of the merge is sorted: targets, sources and the int64 order of the sort.
+_BYTES_PER_EDGE = 4 + 4 + 8 + 4 + 4
+# Variables in one sqlite statement are limited to 999 in older versions.
+_LOOKUP_BATCH = 900
+
+
+class _Visited:
+    """The visited set, and the nodes in the order of their ids."""
+    def __init__(self, path: str, cache_bytes: int) -> None:
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(f'''
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            PRAGMA cache_size = -{max(1024, cache_bytes // 1024)};
+            CREATE TABLE nodes (id INTEGER PRIMARY KEY, url TEXT NOT NULL, depth INTEGER NOT NULL);
+            CREATE TABLE urls (url TEXT PRIMARY KEY, id INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE aliases (url TEXT PRIMARY KEY, id INTEGER NOT NULL) WITHOUT ROWID;
+        ''')
+
+    def lookup(self, urls) -> dict:
+        """
+        Returns:
+            dict[str, int]: ids of the nodes of those urls that are known
+        """
+        urls = list(dict.fromkeys(urls))
+        found = {}
+        for start in range(0, len(urls), _LOOKUP_BATCH):
+            batch = urls[start:start + _LOOKUP_BATCH]
+            found.update(self._connection.execute(f'SELECT url, id FROM urls WHERE url IN ({",".join("?" * len(batch))})', batch))
+        return found
+
+    def add(self, nodes, depth: int):
+        """Adds new nodes, given as (id, url), at a depth."""
+        self._connection.executemany('INSERT INTO nodes (id, url, depth) VALUES (?, ?, ?)', ((node_id, url, depth) for node_id, url in nodes))
+        self._connection.executemany('INSERT INTO urls (url, id) VALUES (?, ?)', ((url, node_id) for node_id, url in nodes))
+
+    def add_alias(self, url: str, node_id: int):
+        self._connection.execute('INSERT OR IGNORE INTO urls (url, id) VALUES (?, ?)', (url, node_id))
+        self._connection.execute('INSERT OR IGNORE INTO aliases (url, id) VALUES (?, ?)', (url, node_id))
+
+    def rename(self, node_id: int, url: str, canonical: str):
+        self._connection.execute('UPDATE nodes SET url = ? WHERE id = ?', (canonical, node_id))
+        self._connection.execute('INSERT INTO urls (url, id) VALUES (?, ?)', (canonical, node_id))
+        self._connection.execute('INSERT OR IGNORE INTO aliases (url, id) VALUES (?, ?)', (url, node_id))
+
+    def queued(self, start: int, count: int, max_depth: int) -> list:
+        """The next nodes of the frontier.
+
+        Returns:
+            list[tuple[int, str, int]]: id, url and depth of up to count nodes from the id start on, that are within the depth
+        """
+        return self._connection.execute('SELECT id, url, depth FROM nodes WHERE id >= ? AND depth < ? ORDER BY id LIMIT ?',
+                                        (start, max_depth, count)).fetchall()
+
+    def url(self, node_id: int) -> str:
+        return self._connection.execute('SELECT url FROM nodes WHERE id = ?', (node_id,)).fetchone()[0]
+
+    def column(self, name: str):
+        """Yields the values of a column of the nodes table in chunks, in the order of the ids."""
+        cursor = self._connection.execute(f'SELECT {name} FROM nodes ORDER BY id')
+        rows = cursor.fetchmany(CHUNK)
+        while rows:
+            yield [value for value, in rows]
+            rows = cursor.fetchmany(CHUNK)
+
+    def aliases(self) -> dict:
+        return dict(self._connection.execute('SELECT url, id FROM aliases'))
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+class _EdgeRuns:
+    """Edges of the crawl: forward in the order of their sources, and backward as runs sorted by target."""
+    def __init__(self, directory: str, run_edges: int) -> None:
+        self._directory = directory
+        self._run_edges = max(1, run_edges)
+        self._forward = open(os.path.join(directory, 'forward.bin'), 'wb')
+        # Out degree and expansion state of every expanded node, in the order of the ids
+        self._degrees = open(os.path.join(directory, 'degrees.bin'), 'wb')
+        self._states = open(os.path.join(directory, 'states.bin'), 'wb')
+        self._sources, self._targets = array('i'), array('i')
+        self._degree_buffer, self._state_buffer = array('i'), array('B')
+        self.runs = []
+        self.count = 0
+        self.expanded = 0
+
+    def append(self, source: int, targets, state: int):
+        """Adds the edges of the next expanded node, which has to be the one after the last one."""
+        self._targets.extend(targets)
+        self._sources.extend([source] * len(targets))
+        self._degree_buffer.append(len(targets))
+        self._state_buffer.append(state)
+        self.count += len(targets)
+        self.expanded += 1
+        if len(self._targets) >= self._run_edges:
+            self.flush()
+
+    def flush(self):
+        self._degree_buffer.tofile(self._degrees)
+        self._state_buffer.tofile(self._states)
+        del self._degree_buffer[:], self._state_buffer[:]
+        if not self._targets:
+            return
+        targets = np.frombuffer(self._targets, dtype=np.int32)
+        sources = np.frombuffer(self._sources, dtype=np.int32)
+        targets.tofile(self._forward)
+        # Stable, so the sources of a target stay in the order of the crawl.
+        order = np.argsort(targets, kind='stable')
+        run = os.path.join(self._directory, f'run{len(self.runs)}')
+        np.save(f'{run}.targets.npy', targets[order])
+        np.save(f'{run}.sources.npy', sources[order])
+        self.runs.append(run)
+        del targets, sources
+        del self._targets[:], self._sources[:]
+
+    def close(self):
+        if self._forward.closed:
+            return
+        self.flush()
+        for file in (self._forward, self._degrees, self._states):
+            file.close()
+
+    def file_chunks(self, name, dtype):
+        """Yields the content of a file of the work directory as arrays of up to CHUNK entries."""
+        path = os.path.join(self._directory, name)
+        # Empty files cannot be mapped.
+        data = np.memmap(path, dtype=dtype, mode='r') if os.path.getsize(path) else np.empty(0, dtype)
+        for start in range(0, len(data), CHUNK):
+            yield np.array(data[start:start + CHUNK])
+
+    def forward_indices(self):
+        return self.file_chunks('forward.bin', np.int32)
+
+    def indptr(self, node_count: int):
+        """Yields the forward index pointers in chunks. Nodes that were not expanded have no edges."""
+        yield np.zeros(1, dtype=np.int64)
+        total = 0
+        for degrees in self.file_chunks('degrees.bin', np.int32):
+            chunk = np.cumsum(degrees, dtype=np.int64) + total
+            total = int(chunk[-1])
+            yield chunk
+        for start in range(self.expanded, node_count, CHUNK):
+            yield np.full(min(CHUNK, node_count - start), total, dtype=np.int64)
+
+    def expansion(self, node_count: int):
+        yield from self.file_chunks('states.bin', np.uint8)
+        for start in range(self.expanded, node_count, CHUNK):
+            yield np.full(min(CHUNK, node_count - start), NOT_EXPANDED, dtype=np.uint8)
+
+    def reverse_blocks(self, node_count: int, block_edges: int):
+        """Merges the runs, one block of targets at a time, with at most block_edges edges per block (unless a single
+        target has more).
+
+        Yields:
+            tuple[np.ndarray, np.ndarray]: in degrees of the targets of the block and their sources, ordered by target
+        """
+        runs = [(np.load(f'{run}.targets.npy', mmap_mode='r'), np.load(f'{run}.sources.npy', mmap_mode='r')) for run in self.runs]
+        step = max(1, node_count * block_edges // max(1, self.count))
+        low = 0
+        while low < node_count:
+            high = min(node_count, low + step)
+            bounds = [(int(targets.searchsorted(low)), int(targets.searchsorted(high))) for targets, _ in runs]
+            size = sum(end - start for start, end in bounds)
+            if size > block_edges and high - low > 1:
+                step = max(1, (high - low) // 2)
+                continue
+            targets = np.concatenate([np.empty(0, np.int32)] + [run[start:end] for (run, _), (start, end) in zip(runs, bounds)])
+            sources = np.concatenate([np.empty(0, np.int32)] + [run[start:end] for (_, run), (start, end) in zip(runs, bounds)])
+            # The runs are in the order of the crawl, so a stable sort keeps the sources of every target in that order.
+            order = np.argsort(targets, kind='stable')
+            yield np.bincount(targets - low, minlength=high - low), sources[order]
+            low = high
+            if size < block_edges // 4:
+                step *= 2
+
+
+class DiskCrawl:
+    """Width-first crawl whose visited set, frontier and edges are kept on disk, and whose result is written into a
+    binary WikiGraph file."""
+    def __init__(self, root: str, path: str, depth: int = 10, max_nodes: int = 1000000, memory: int = 256 * 1024 ** 2,
+                 work_dir: str = None, concurrency: int = 1, page_cache: PageCache = None, link_source: LinkSource = None,
+                 fetcher: Fetcher = None, progress: ProgressReporter = None) -> None:
+        """
+        Args:
+            root (str): url of the article around which the graph is built
+            path (str): path of the binary WikiGraph file that is written. Must not exist yet.
+            depth (int, optional): Maximum amount of references across which an article may be away from the root. Defaults to 10.
+            max_nodes (int, optional): Maximum amount of nodes of the graph. Defaults to 1000000.
+            memory (int, optional): Bytes for the sqlite page cache and the edge buffer. Defaults to 256 MB.
+            work_dir (str, optional): Directory in which the work directory of the crawl is created (and deleted once it is
+                done). Needs space for about two copies of the graph. Defaults to None, the temporary directory.
+            concurrency (int, optional): Maximum amount of articles that are downloaded at the same time. Defaults to 1.
+            page_cache (PageCache, optional): Cache through which the articles are downloaded. Defaults to None.
+            link_source (LinkSource, optional): Where the references of articles come from instead of their pages. Defaults to None.
+            fetcher (Fetcher, optional): Fetcher through which the articles are downloaded. Defaults to None, a new one.
+            progress (ProgressReporter, optional): Reporter of the progress of the crawl. Defaults to None, a line on the console.
+        """
+        self.raw_root = root
+        self.root = canonical_url(root)
+        self.path = path
+        self.depth = depth
+        self.max_nodes = max_nodes
+        self.memory = memory
+        self.work_dir = work_dir
+        self.concurrency = max(1, concurrency)
+        self.page_cache = page_cache
+        self.link_source = link_source
+        self.fetcher = fetcher if fetcher is not None else Fetcher(pool_size=max(10, self.concurrency))
+        self.progress = progress if progress is not None else ConsoleProgress()
+        self.size = 0
+        self._pending = {}
+        self._visited = None
+        self._edges = None
+        # First id of every depth, for the sizes of the layers
+        self._layer_starts = {}
+
+    @property
+    def parameters(self) -> dict:
+        return {'depth': self.depth, 'max_nodes': self.max_nodes, 'concurrency': self.concurrency, 'eager_titles': False,
+                'out_of_core': True}
+
+    def run(self) -> str:
+        """Crawls and writes the file.
+
+        Raises:
+            FileExistsError: there is already a file in the path.
+
+        Returns:
+            str: path of the written file
+        """
+        if os.path.exists(self.path):
+            raise FileExistsError(f'{self.path} points to an existing file. We are not overwriting!')
+        directory = tempfile.mkdtemp(prefix='wikigraph-crawl-', dir=self.work_dir)
+        try:
+            self._visited = _Visited(os.path.join(directory, 'visited.sqlite3'), self.memory // 2)
+            self._edges = _EdgeRuns(directory, self.memory // 2 // _BYTES_PER_EDGE)
+            self._visited.add([(0, self.root)], 0)
+            if self.raw_root != self.root:
+                self._visited.add_alias(self.raw_root, 0)
+            self.size = 1
+            self._layer_starts = {0: 0}
+            if self.concurrency > 1:
+                with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                    self._crawl(executor)
+            else:
+                self._crawl()
+            self._edges.close()
+            self._visited.commit()
+            self._write(directory)
+        finally:
+            if self.link_source is not None:
+                self.link_source.finished()
+            if self._edges is not None:
+                self._edges.close()
+            if self._visited is not None:
+                self._visited.close()
+            shutil.rmtree(directory, ignore_errors=True)
+        return self.path
+
+    def _references(self, url):
+        # References and the canonical url of an article, None if it could not be downloaded
+        try:
+            if self.link_source is not None:
+                references = list(self.link_source.references(url))
+                return references, self.link_source.canonical_url(url)
+            article = WikiArticle(url, session=self.fetcher, page_cache=self.page_cache)
+            references = list(article.references)
+            return references, article.canonical_url
+        except FetchError as error:
+            logging.warning(error)
+            return None
+
+    def _expansions(self, executor=None):
+        """Takes nodes from the frontier and yields each with its references, like WikiGraph._expansions does."""
+        batch = self.link_source.batch_size if self.link_source is not None else 1
+        window = (self.concurrency if executor is not None else 1) + batch - 1
+        pending = deque()
+        next_id = 0
+        try:
+            while True:
+                while len(pending) + batch <= window:
+                    nodes = self._visited.queued(next_id, batch, self.depth)
+                    if not nodes:
+                        break
+                    next_id = nodes[-1][0] + 1
+                    if batch > 1:
+                        self.link_source.prefetch([url for _, url, _ in nodes])
+                    for node in nodes:
+                        pending.append((node, executor.submit(self._references, node[1]) if executor is not None else None))
+                    if len(nodes) < batch:
+                        break
+                if not pending:
+                    return
+                node, future = pending.popleft()
+                yield node, future.result() if future is not None else self._references(node[1])
+        finally:
+            # If the graph is full, the nodes that were taken ahead stay unexpanded.
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+    def _crawl(self, executor=None):
+        start_time = monotonic()
+        expanded, added, failed = 0, 0, 0
+        current_depth, done = 0, 0
+
+        def progress():
+            return Progress(current_depth, self.depth, self._layer_size(current_depth), done, expanded, added, failed,
+                            self.size, self.max_nodes, monotonic() - start_time)
+
+        self.progress.started(progress())
+        for (node_id, url, depth), result in self._expansions(executor):
+            if depth > current_depth or not expanded:
+                current_depth, done = depth, 0
+                self._visited.commit()
+                self.progress.layer_started(progress())
+            targets, state = [], EXPANDED
+            if result is None:
+                state = FAILED
+                failed += 1
+            else:
+                references, canonical = result
+                redirect = self._resolve_canonical(node_id, url, canonical)
+                if redirect is not None:
+                    targets = [redirect]
+                else:
+                    size = self.size
+                    targets, rest = self._add_references(depth, references)
+                    added += self.size - size
+                    if rest:
+                        state = PARTIALLY_EXPANDED
+                        self._pending[node_id] = rest
+                METRICS.counter('wikigraph_expansions_total').inc()
+            self._edges.append(node_id, targets, state)
+            expanded += 1
+            done = node_id - self._layer_starts[depth] + 1
+            METRICS.gauge('wikigraph_nodes').set(self.size)
+            self.progress.update(progress())
+            if self.size >= self.max_nodes:
+                break
+        self.progress.finished(progress())
+        if failed:
+            print(f'{failed} articles could not be downloaded.')
+
+    def _layer_size(self, depth):
+        return self._layer_starts.get(depth + 1, self.size) - self._layer_starts.get(depth, self.size)
+
+    def _resolve_canonical(self, node_id, url, canonical):
+        """Renames a node to the url its page states, if it is another one.
+
+        Returns:
+            int | None: id of the node that has the canonical url already, None if that is the node itself
+        """
+        if canonical is None:
+            return None
+        canonical = canonical_url(canonical)
+        if canonical == url:
+            return None
+        target = self._visited.lookup([canonical]).get(canonical)
+        if target is None:
+            self._visited.rename(node_id, url, canonical)
+            return None
+        return target if target != node_id else None
+
+    def _add_references(self, depth, references):
+        """Adds the references of a node at a depth, with the same cutoff as WikiGraph._add_references.
+
+        Returns:
+            tuple[list[int], list[str]]: ids of the referenced nodes, and the references that did not fit anymore
+        """
+        if self.size >= self.max_nodes:
+            return [], references
+        urls = [canonical_url(reference) for reference in references]
+        known = self._visited.lookup(urls)
+        targets, new = [], []
+        for url in urls:
+            target = known.get(url)
+            if target is None:
+                target = known[url] = self.size
+                new.append((target, url))
+                self.size += 1
+            targets.append(target)
+            if self.size >= self.max_nodes:
+                break
+        rest = references[len(targets):]
+        if new:
+            self._visited.add(new, depth + 1)
+            self._layer_starts.setdefault(depth + 1, new[0][0])
+        # Edges are only added once, as in GraphCore.add_edges.
+        return list(dict.fromkeys(targets)), rest
+
+    def _write(self, directory):
+        count = self.size
+        edges = self._edges
+
+        def write(writer):
+            offsets = np.memmap(os.path.join(directory, 'url_offsets.bin'), dtype=np.uint64, mode='w+', shape=(count + 1,))
+            urls = (url.encode('utf-8') for chunk in self._visited.column('url') for url in chunk)
+            writer.write_blobs('url', urls, count, offsets=offsets)
+            del offsets
+            writer.write_chunks('depths', (np.array(chunk, dtype=np.int32) for chunk in self._visited.column('depth')))
+            writer.write_chunks('indptr', edges.indptr(count))
+            writer.write_chunks('indices', edges.forward_indices())
+            # The merge yields both halves of the backward adjacency at once. The indices wait in a file for their turn.
+            reverse_path = os.path.join(directory, 'reverse.bin')
+            with open(reverse_path, 'wb') as reverse:
+                def reverse_indptr():
+                    yield np.zeros(1, dtype=np.int64)
+                    total = 0
+                    for in_degrees, sources in edges.reverse_blocks(count, self.memory // 2 // _BYTES_PER_EDGE):
+                        sources.tofile(reverse)
+                        chunk = np.cumsum(in_degrees, dtype=np.int64) + total
+                        total = int(chunk[-1])
+                        yield chunk
+                writer.write_chunks('reverse_indptr', reverse_indptr())
+            writer.write_chunks('reverse_indices', edges.file_chunks('reverse.bin', np.int32))
+            writer.write_chunks('expansion', edges.expansion(count))
+            aliases = self._visited.aliases()
+            if aliases:
+                writer.write('aliases', json.dumps(aliases, ensure_ascii=False).encode('utf-8'))
+            if self._pending:
+                writer.write('pending', json.dumps({str(node_id): references for node_id, references in self._pending.items()}).encode('utf-8'))
+        wikigraph_format.write_sections(self.path, self._visited.url(0), 0, count, edges.count, self.parameters, write)
@@ -0,0 +1,240 @@
+"""Fetch layer between the graph and the server: connection pooling, per host rate limiting that adapts to the server,
+timeouts and retries.
+
+The request rate of every host is a token bucket, whose rate follows AIMD (additive increase, multiplicative decrease):
+Every quick successful response raises it a little, every slow response, 429 or 5xx halves it (at most once per cooldown).
+Like TCP, it starts out with slow start, doubling the rate with every rate worth of responses, until the first overload.
+A Retry-After header pauses the host for as long as the server asks. Failed requests are retried with jittered
+exponential backoff. A Fetcher has the get method of a requests.Session, so it can be used wherever a session can.
+
+requests is only imported once a Fetcher is created, so that graphs can be loaded and processed without it.
+"""
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from time import monotonic, sleep, time
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from wikigraph_metrics import REGISTRY
+
+if TYPE_CHECKING:
+    import requests
+
+
+class FetchError(Exception):
+    """A page could not be downloaded, even after retrying."""
+    def __init__(self, url: str, reason: str, status: int = None) -> None:
+        super().__init__(f'{url} could not be downloaded: {reason}')
+        self.url = url
+        self.status = status
+
+
+class TokenBucket:
+    """Hands out tokens at a rate, with bursts of up to capacity. Callers that find the bucket empty wait for their turn."""
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._stamp = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            # Tokens may go negative: Every caller reserves its token right away and waits until it is covered.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            sleep(wait)
+
+
+class _Host:
+    # Rate limit and AIMD state of one host
+    def __init__(self, fetcher, name) -> None:
+        self.name = name
+        self.rate = fetcher.rate
+        self.bucket = TokenBucket(self.rate, fetcher.burst)
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.slow_start = True
+        self.lock = threading.Lock()
+
+    def wait(self):
+        pause = self.paused_until - monotonic()
+        if pause > 0:
+            sleep(pause)
+        self.bucket.acquire()
+
+
+class Fetcher:
+    """Downloads pages through a requests.Session with pooling, adaptive per host rate limits, timeouts and retries."""
+    # Statuses after which a request is retried, and which tell that the server is overwhelmed.
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, session: 'requests.Session' = None, pool_size: int = 10, rate: float = 10.0, max_rate: float = 100.0,
+                 min_rate: float = 0.5, burst: float = None, adaptive: bool = True, target_latency: float = 2.0,
+                 timeout=(5, 30), retries: int = 4, backoff: float = 0.5, max_backoff: float = 60.0) -> None:
+        """
+        Args:
+            session (requests.Session, optional): Session to download with. Defaults to None, creating one.
+            pool_size (int, optional): Connections kept open per host. Should be at least the amount of parallel downloads. Defaults to 10.
+            rate (float, optional): Initial requests per second and host. Defaults to 10.0.
+            max_rate (float, optional): Upper bound of the adaptive rate. Defaults to 100.0.
+            min_rate (float, optional): Lower bound of the adaptive rate. Defaults to 0.5.
+            burst (float, optional): Requests that may be sent at once after idling. Defaults to None, the rate.
+            adaptive (bool, optional): Adapt the rate to latencies and errors. Otherwise it stays at rate. Defaults to True.
+            target_latency (float, optional): Responses slower than this many seconds count as sign of overload. Defaults to 2.0.
+            timeout (float | tuple[float, float], optional): Connect and read timeout in seconds. Defaults to (5, 30).
+            retries (int, optional): Retries of a failed request. Defaults to 4.
+            backoff (float, optional): Base of the exponential backoff in seconds. Defaults to 0.5.
+            max_backoff (float, optional): Longest wait before a retry, also caps Retry-After. Defaults to 60.0.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = session if session is not None else requests.Session()
+        self.pool_size = pool_size
+        if pool_size > 10:
+            # The default adapters keep 10 connections per host, which would be the bottleneck for more parallel downloads.
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._setup()
+
+    def _setup(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'failures': 0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('_hosts', '_lock', 'stats'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
+
+    def _host(self, url) -> _Host:
+        name = urlsplit(url).netloc
+        with self._lock:
+            host = self._hosts.get(name)
+            if host is None:
+                host = self._hosts[name] = _Host(self, name)
+            return host
+
+    def host_rate(self, url: str) -> float:
+        """
+        Returns:
+            float: current requests per second to the host of the url
+        """
+        return self._host(url).rate
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+        REGISTRY.counter('wikigraph_http_total', event=name).inc()
+
+    def _adapt(self, host: _Host, overloaded: bool):
+        if not self.adaptive:
+            return
+        with host.lock:
+            if overloaded:
+                # Responses to requests that were sent before the decrease would decrease again. Once per cooldown is enough.
+                if monotonic() - host.last_decrease < max(1.0, 1 / host.rate):
+                    return
+                host.rate = max(self.min_rate, host.rate / 2)
+                host.last_decrease = monotonic()
+                host.slow_start = False
+            elif host.slow_start:
+                host.rate = min(self.max_rate, host.rate + 1)
+            else:
+                # Roughly +1 request per second for every second at the current rate
+                host.rate = min(self.max_rate, host.rate + 1 / host.rate)
+            host.bucket.rate = host.rate
+            REGISTRY.gauge('wikigraph_host_rate', host=host.name).set(host.rate)
+
+    def _retry_after(self, response):
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(0.0, seconds), self.max_backoff)
+
+    def get(self, url: str, headers: dict = None, **kwargs) -> 'requests.Response':
+        """Downloads a page like requests.Session.get, waiting for the rate limit and retrying on failures.
+
+        Raises:
+            FetchError: the page could not be downloaded: The server answered with a client error (except 429), the request
+                failed for good (eg. too many redirects), or every attempt failed.
+
+        Returns:
+            requests.Response: a successful response (2xx or 304)
+        """
+        import requests
+        # Failures that may well go away on the next attempt. Others (eg. too many redirects, invalid urls) would not.
+        transient = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                     requests.exceptions.ContentDecodingError)
+        kwargs.setdefault('timeout', self.timeout)
+        host = self._host(url)
+        reason, status = None, None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count('retries')
+            host.wait()
+            self._count('requests')
+            start = monotonic()
+            try:
+                response = self.session.get(url, headers=headers, **kwargs)
+            except requests.RequestException as error:
+                reason, status = type(error).__name__, None
+                if not isinstance(error, transient):
+                    self._count('failures')
+                    raise FetchError(url, reason) from error
+                self._adapt(host, True)
+                if attempt < self.retries:
+                    sleep(self._backoff(attempt))
+                continue
+            latency = monotonic() - start
+            status = response.status_code
+            if status < 400:
+                self._adapt(host, latency > self.target_latency)
+                return response
+            if status not in self.RETRY_STATUSES:
+                self._count('failures')
+                raise FetchError(url, f'status {status}', status)
+            self._count('throttled')
+            self._adapt(host, True)
+            reason = f'status {status}'
+            retry_after = self._retry_after(response)
+            if retry_after is not None:
+                # The server said when it wants to hear from us again. That goes for every request to it.
+                host.paused_until = max(host.paused_until, monotonic() + retry_after)
+            if attempt < self.retries:
+                # No waiting after the last attempt, the failure is reported right away.
+                sleep(max(retry_after or 0, self._backoff(attempt)))
+        self._count('failures')
+        raise FetchError(url, f'{reason} after {self.retries + 1} attempts', status)
+
+    def _backoff(self, attempt):
+        # Full jitter: Retries of many parallel requests spread out instead of hitting the server together again.
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
@@ -0,0 +1,259 @@
+"""Frontiers of crawls: the nodes that wait for their references to be added, and the strategy in which order they are.
+
+With a budget of max_nodes, the order decides which part of the neighbourhood of the root makes it into the graph:
+    BreadthFirstFrontier    layer by layer, in the order in which the nodes were found (the classic crawl)
+    BestFirstFrontier       most referenced nodes first, by the in-degree seen so far: the central part of the neighbourhood
+    RelevanceFrontier       nodes whose titles match a search term (or the title of a target article) first, and nodes
+                            referenced by matching ones before the rest
+
+Only nodes within the depth of the crawl are pushed. Pushing, popping and reprioritizing are O(log n) (O(1) for breadth
+first). Priorities only ever grow, so the heaps are lazy: a node whose priority grows is pushed again, and the outdated
+entries are skipped when they come up.
+"""
+import heapq
+from collections import Counter, deque
+from itertools import count
+
+from search_index import tokenize
+
+
+class Frontier:
+    """Interface of frontiers. Holds the nodes that wait for expansion, with their depths."""
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self):
+        self._core = None
+        self._title_of = None
+        self._max_depth = 0
+        # Depth of every queued node, and the amount of queued nodes per depth
+        self._depths = {}
+        self._per_depth = Counter()
+
+    def start(self, core, title_of, depth: int):
+        """Empties the frontier for a new crawl of a graph.
+
+        Args:
+            core (GraphCore): core of the graph
+            title_of (callable): title of a node id, without downloading anything
+            depth (int): depth of the crawl. Nodes in this depth or deeper are not expanded, so they are not queued.
+        """
+        self._reset()
+        self._core = core
+        self._title_of = title_of
+        self._max_depth = depth
+
+    def push(self, node_id: int, depth: int):
+        """Queues a node for expansion, or updates its depth if it is queued already. Nodes beyond the depth of the crawl
+        are ignored."""
+        if depth >= self._max_depth:
+            return
+        previous = self._depths.get(node_id)
+        if previous is not None:
+            self._per_depth[previous] -= 1
+        self._depths[node_id] = depth
+        self._per_depth[depth] += 1
+        self._push(node_id, depth)
+
+    def referenced(self, node_id: int, source_id: int):
+        """Tells the frontier that an edge to a node was added. Only matters for queued nodes."""
+        pass
+
+    def pop(self):
+        """
+        Returns:
+            int | None: id of the node to expand next, None if the frontier is empty
+        """
+        node_id = self._pop()
+        if node_id is not None:
+            self._per_depth[self._depths.pop(node_id)] -= 1
+        return node_id
+
+    def queued(self, depth: int = None) -> int:
+        """
+        Returns:
+            int: amount of queued nodes, in one depth or in all
+        """
+        return len(self._depths) if depth is None else self._per_depth[depth]
+
+    def __len__(self):
+        return len(self._depths)
+
+    def __contains__(self, node_id):
+        return node_id in self._depths
+
+    # Only the strategy travels with pickled graphs, not the state of a crawl.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('_core', '_title_of', '_max_depth', '_depths', '_per_depth'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def _push(self, node_id, depth):
+        raise NotImplementedError
+
+    def _pop(self):
+        raise NotImplementedError
+
+
+class BreadthFirstFrontier(Frontier):
+    """Layer by layer. Within a layer, nodes are expanded in the order in which they were pushed."""
+    def _reset(self):
+        super()._reset()
+        self._layers = {}
+        self._current = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_layers', None)
+        state.pop('_current', None)
+        return state
+
+    def _push(self, node_id, depth):
+        self._layers.setdefault(depth, deque()).append(node_id)
+        if self._current is None or depth < self._current:
+            self._current = depth
+
+    def _pop(self):
+        while self._layers:
+            layer = self._layers.get(self._current)
+            while layer:
+                node_id = layer.popleft()
+                # Entries of nodes that were pushed again into a lower layer are outdated.
+                if self._depths.get(node_id) == self._current:
+                    return node_id
+            self._layers.pop(self._current, None)
+            self._current = min(self._layers) if self._layers else None
+        return None
+
+
+class _PriorityFrontier(Frontier):
+    # Lazy max-heap on priority. Ties go to the lower depth, then to the node that was pushed first.
+    def _reset(self):
+        super()._reset()
+        self._heap = []
+        self._priorities = {}
+        self._order = count()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        for name in ('_heap', '_priorities', '_order'):
+            state.pop(name, None)
+        return state
+
+    def priority(self, node_id: int) -> float:
+        raise NotImplementedError
+
+    def _push(self, node_id, depth):
+        priority = self.priority(node_id)
+        self._priorities[node_id] = priority
+        heapq.heappush(self._heap, (-priority, depth, next(self._order), node_id))
+
+    def _reprioritize(self, node_id):
+        depth = self._depths.get(node_id)
+        if depth is None:
+            return
+        priority = self.priority(node_id)
+        if priority > self._priorities[node_id]:
+            self._priorities[node_id] = priority
+            heapq.heappush(self._heap, (-priority, depth, next(self._order), node_id))
+
+    def _pop(self):
+        while self._heap:
+            negative, depth, _, node_id = heapq.heappop(self._heap)
+            if self._depths.get(node_id) == depth and self._priorities.get(node_id) == -negative:
+                del self._priorities[node_id]
+                return node_id
+        return None
+
+
+class BestFirstFrontier(_PriorityFrontier):
+    """Most referenced nodes first, by the in-degree within the graph so far."""
+    def priority(self, node_id):
+        return self._core.in_degree(node_id)
+
+    def referenced(self, node_id, source_id):
+        self._reprioritize(node_id)
+
+
+class RelevanceFrontier(_PriorityFrontier):
+    """Nodes relevant to a search term first. The relevance of a node is the share of the words of the term in its title,
+    plus a part of the relevance of the most relevant node that references it, so the crawl keeps following the links
+    of relevant articles even if the titles of the referenced ones do not match.
+    """
+    def __init__(self, term: str, inherit: float = 0.5) -> None:
+        """
+        Args:
+            term (str): Search term, or title of a target article.
+            inherit (float, optional): Part of the relevance of the referencing node that a node inherits. Defaults to 0.5.
+
+        Raises:
+            ValueError: the term contains no words.
+        """
+        self.term = term
+        self.inherit = inherit
+        self._words = frozenset(tokenize(term))
+        if not self._words:
+            raise ValueError(f'The term {term!r} contains no words.')
+        super().__init__()
+
+    def _reset(self):
+        super()._reset()
+        self._inherited = {}
+        self._own = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_inherited', None)
+        state.pop('_own', None)
+        return state
+
+    def own_relevance(self, node_id: int) -> float:
+        relevance = self._own.get(node_id)
+        if relevance is None:
+            words = set(tokenize(self._title_of(node_id)))
+            relevance = self._own[node_id] = len(words & self._words) / len(self._words)
+        return relevance
+
+    def priority(self, node_id):
+        return self.own_relevance(node_id) + self._inherited.get(node_id, 0.0)
+
+    def referenced(self, node_id, source_id):
+        if node_id not in self._depths:
+            return
+        inherited = self.inherit * (self.own_relevance(source_id) + self._inherited.get(source_id, 0.0))
+        if inherited > self._inherited.get(node_id, 0.0):
+            self._inherited[node_id] = inherited
+            self._reprioritize(node_id)
+
+
+STRATEGIES = {
+    'bfs': BreadthFirstFrontier,
+    'indegree': BestFirstFrontier,
+    'relevance': RelevanceFrontier,
+}
+
+
+def make_frontier(strategy: str = 'bfs', term: str = None) -> Frontier:
+    """
+    Args:
+        strategy (str, optional): 'bfs', 'indegree' or 'relevance'. Defaults to 'bfs'.
+        term (str, optional): Search term or title of a target article. Required for 'relevance'. Defaults to None.
+
+    Raises:
+        ValueError: unknown strategy, or relevance without a term
+
+    Returns:
+        Frontier: empty frontier of the strategy
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown crawl strategy {strategy}, expected one of {", ".join(STRATEGIES)}.')
+    if strategy == 'relevance':
+        if not term:
+            raise ValueError('The relevance strategy needs a search term or target article.')
+        return RelevanceFrontier(term)
+    return STRATEGIES[strategy]()
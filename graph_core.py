@@ -0,0 +1,421 @@
+from array import array
+import numpy as np
+
+
+# Expansion states of a node: Have its references been added to the graph?
+NOT_EXPANDED = 0
+EXPANDED = 1
+# Only some of the references made it into the graph, before it was full.
+PARTIALLY_EXPANDED = 2
+# The article could not be downloaded. Expanding it is tried again when the graph is extended.
+FAILED = 3
+# Tombstone of a node that turned out to be an alias of another one (eg. a redirect), which took over its edges.
+MERGED = 4
+
+
+class GraphCore:
+    """Compact storage of a directed graph whose nodes are urls.
+
+    Every url is interned once and mapped to an integer id. While the graph is growing, the adjacency is kept
+    in one array('i') of neighbour ids per node and direction. compact() turns it into CSR form (numpy index
+    pointer and index arrays for both directions), which is what analysis and serialization work on. Mutating a
+    compacted core transparently turns it back into growable lists.
+
+    A core can also be put on top of read only arrays and string tables (see from_arrays), eg. of a memory mapped file.
+    Those are only copied into growable structures once the core is mutated.
+
+    Further urls of a node (eg. percent-encoded variants and redirects) are kept in an alias index, so looking them up
+    is as cheap as looking up the url of the node. Nodes that are merged into others keep their id as tombstone without
+    edges, so that ids stay stable.
+    """
+    # Aliases by the id of their node, so that merges only touch the aliases of the merged node. Built on the first merge.
+    _alias_index = None
+
+    def __init__(self) -> None:
+        self.urls = []
+        self._ids = {}
+        # Further urls of nodes, by the id of the node they lead to
+        self.aliases = {}
+        # Amount of tombstones
+        self.merged = 0
+        self.depths = array('i')
+        self.expansion = bytearray()
+        # Titles that are already known without downloading the article, eg. from a saved graph. None if there are none.
+        self.titles = None
+        # Articles are created on demand by article_factory(url, title), most nodes never need theirs.
+        self.articles: dict = {}
+        self.article_factory = None
+        self._out_degree = array('i')
+        self._in_degree = array('i')
+        self._out = []
+        self._in = []
+        self._csr = None
+        self.edge_count = 0
+        # Incremented on each mutation, so that derived results can tell whether they are outdated.
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    @property
+    def node_count(self) -> int:
+        """Amount of nodes, without tombstones. len(core) is the amount of ids."""
+        return len(self.urls) - self.merged
+
+    @classmethod
+    def from_arrays(cls, urls, depths, indptr, indices, reverse_indptr, reverse_indices, titles=None, expansion=None, aliases=None):
+        """Creates a compacted core on top of existing sequences and arrays, without copying them.
+
+        Args:
+            urls (Sequence[str]): url of every node
+            depths (np.ndarray): depth of every node
+            indptr (np.ndarray): index pointers of the forward CSR adjacency
+            indices (np.ndarray): successor ids of the forward CSR adjacency
+            reverse_indptr (np.ndarray): index pointers of the backward CSR adjacency
+            reverse_indices (np.ndarray): predecessor ids of the backward CSR adjacency
+            titles (Sequence[str], optional): known title of every node, empty if unknown. Defaults to None.
+            expansion (np.ndarray, optional): expansion state of every node. Defaults to None, guessing it from the out degrees.
+            aliases (dict[str, int], optional): further urls of nodes. Defaults to None.
+
+        Returns:
+            GraphCore: core on top of the given data
+        """
+        core = cls()
+        core.urls = urls
+        core._ids = None
+        core.depths = depths
+        core.titles = titles
+        core._csr = (indptr, indices, reverse_indptr, reverse_indices)
+        core._out = core._in = None
+        core._out_degree = np.diff(indptr)
+        core._in_degree = np.diff(reverse_indptr)
+        core.edge_count = len(indices)
+        core.expansion = expansion if expansion is not None else core.guess_expansion()
+        core.aliases = dict(aliases or {})
+        core.merged = int((np.asarray(core.expansion) == MERGED).sum())
+        return core
+
+    def guess_expansion(self):
+        """For graphs stored before expansion states were kept. Nodes without references count as not expanded,
+        which at worst means that they are downloaded once more.
+
+        Returns:
+            bytearray: guessed expansion state of every node
+        """
+        return bytearray((np.asarray(self._out_degree) > 0).astype(np.uint8).tobytes())
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'expansion' not in state:
+            self.expansion = self.guess_expansion()
+        self.__dict__.setdefault('aliases', {})
+        self.__dict__.setdefault('merged', 0)
+
+    def id_of(self, url: str):
+        """
+        Returns:
+            int | None: id of the node with this url, or None if there is no such node.
+        """
+        if self._ids is None:
+            # Built on the first lookup, as it means decoding every url. Urls of tombstones lead to their nodes as aliases.
+            self._ids = {node_url: node_id for node_id, node_url in enumerate(self.urls)}
+            if self.merged:
+                for node_id in np.flatnonzero(np.asarray(self.expansion) == MERGED).tolist():
+                    del self._ids[self.urls[node_id]]
+        node_id = self._ids.get(url)
+        if node_id is None and self.aliases:
+            return self.aliases.get(url)
+        return node_id
+
+    def add_alias(self, url: str, node_id: int):
+        """Makes a further url lead to a node. Urls of other nodes are not touched."""
+        if self.id_of(url) is None:
+            self._set_alias(url, node_id)
+
+    def _set_alias(self, url, node_id):
+        index = self._alias_index
+        if index is not None:
+            old = self.aliases.get(url)
+            if old is not None:
+                index[old].discard(url)
+            index.setdefault(node_id, set()).add(url)
+        self.aliases[url] = node_id
+
+    def _drop_alias(self, url):
+        node_id = self.aliases.pop(url, None)
+        if node_id is not None and self._alias_index is not None:
+            self._alias_index[node_id].discard(url)
+
+    def rename(self, node_id: int, url: str):
+        """Changes the url of a node. The old url becomes an alias of it.
+
+        Raises:
+            ValueError: another node has this url
+        """
+        other = self.id_of(url)
+        if other is not None and other != node_id:
+            raise ValueError(f'{url} is the url of node {other}. Merge the nodes instead.')
+        self._thaw()
+        old = self.urls[node_id]
+        del self._ids[old]
+        self._drop_alias(url)
+        self._ids[url] = node_id
+        self.urls[node_id] = url
+        self._set_alias(old, node_id)
+        self.version += 1
+
+    def merge(self, alias_id: int, node_id: int):
+        """Merges a node into another one: edges from and to it are moved to the other node (edges between the two
+        are dropped), its urls become aliases of the other node, and its depth is taken over if it is smaller.
+        The merged node is left as tombstone.
+        """
+        if alias_id == node_id:
+            return
+        self._thaw()
+        for source in self._in[alias_id].tolist():
+            self._unlink(source, alias_id)
+            if source != node_id and source != alias_id and node_id not in self._out[source]:
+                self._link(source, node_id)
+        for target in self._out[alias_id].tolist():
+            self._unlink(alias_id, target)
+            if target != node_id and node_id not in self._in[target]:
+                self._link(node_id, target)
+        self.depths[node_id] = min(self.depths[node_id], self.depths[alias_id])
+        self.expansion[alias_id] = MERGED
+        self.articles.pop(alias_id, None)
+        if self._alias_index is None:
+            self._alias_index = {}
+            for alias, target in self.aliases.items():
+                self._alias_index.setdefault(target, set()).add(alias)
+        url = self.urls[alias_id]
+        del self._ids[url]
+        self._set_alias(url, node_id)
+        for alias in self._alias_index.pop(alias_id, ()):
+            self.aliases[alias] = node_id
+            self._alias_index.setdefault(node_id, set()).add(alias)
+        self.merged += 1
+        self.version += 1
+
+    def add_node(self, url: str, depth: int, article=None) -> int:
+        """Adds a node, if there is none with this url yet.
+
+        Args:
+            url (str): url of the node
+            depth (int): depth of the node within the graph
+            article (WikiArticle, optional): article of the node. Defaults to None, creating it on demand.
+
+        Returns:
+            int: id of the node
+        """
+        node_id = self.id_of(url)
+        if node_id is not None:
+            return node_id
+        self._thaw()
+        node_id = len(self.urls)
+        self._ids[url] = node_id
+        self.urls.append(url)
+        self.depths.append(depth)
+        self.expansion.append(NOT_EXPANDED)
+        if self.titles is not None:
+            self.titles.append('')
+        if article is not None:
+            self.articles[node_id] = article
+        self._out_degree.append(0)
+        self._in_degree.append(0)
+        self._out.append(array('i'))
+        self._in.append(array('i'))
+        self.version += 1
+        return node_id
+
+    def article(self, node_id: int):
+        """
+        Returns:
+            WikiArticle: article of the node, which is created if it does not exist yet.
+        """
+        article = self.articles.get(node_id)
+        if article is None:
+            title = self.titles[node_id] if self.titles is not None else None
+            article = self.article_factory(self.urls[node_id], title or None)
+            self.articles[node_id] = article
+        return article
+
+    def set_expansion(self, node_id: int, state: int):
+        self._thaw()
+        self.expansion[node_id] = state
+        self.version += 1
+
+    def expansion_array(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: expansion state of every node, indexed by id
+        """
+        return np.array(self.expansion, dtype=np.uint8)
+
+    def set_depth(self, node_id: int, depth: int):
+        self._thaw()
+        self.depths[node_id] = depth
+        self.version += 1
+
+    def add_edge(self, source: int, target: int) -> bool:
+        """Adds a directed edge between two nodes.
+
+        Returns:
+            bool: Was the edge new?
+        """
+        self._thaw()
+        # Linear, but in C and over a single node's neighbours. Batches should use add_edges.
+        if target in self._out[source]:
+            return False
+        self._link(source, target)
+        return True
+
+    def add_edges(self, source: int, targets) -> int:
+        """Adds directed edges from one node to many.
+
+        Returns:
+            int: Number of edges that were new.
+        """
+        self._thaw()
+        existing = set(self._out[source])
+        added = 0
+        for target in targets:
+            if target not in existing:
+                existing.add(target)
+                self._link(source, target)
+                added += 1
+        return added
+
+    def _unlink(self, source, target):
+        self._out[source].remove(target)
+        self._in[target].remove(source)
+        self._out_degree[source] -= 1
+        self._in_degree[target] -= 1
+        self.edge_count -= 1
+        self.version += 1
+
+    def _link(self, source, target):
+        self._out[source].append(target)
+        self._in[target].append(source)
+        self._out_degree[source] += 1
+        self._in_degree[target] += 1
+        self.edge_count += 1
+        self.version += 1
+
+    def successors(self, node_id: int):
+        """
+        Returns:
+            Sequence[int]: ids of the nodes that this node has edges to. Must not be modified.
+        """
+        if self._csr is not None:
+            indptr, indices = self._csr[0], self._csr[1]
+            return indices[indptr[node_id]:indptr[node_id + 1]]
+        return self._out[node_id]
+
+    def predecessors(self, node_id: int):
+        """
+        Returns:
+            Sequence[int]: ids of the nodes that have edges to this node. Must not be modified.
+        """
+        if self._csr is not None:
+            indptr, indices = self._csr[2], self._csr[3]
+            return indices[indptr[node_id]:indptr[node_id + 1]]
+        return self._in[node_id]
+
+    def out_degree(self, node_id: int) -> int:
+        return int(self._out_degree[node_id])
+
+    def in_degree(self, node_id: int) -> int:
+        return int(self._in_degree[node_id])
+
+    # The array module does not allow resizing while numpy looks at its buffer, so these are copies.
+    def out_degrees(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: out degree of every node, indexed by id
+        """
+        return np.array(self._out_degree, dtype=np.int64)
+
+    def in_degrees(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: in degree of every node, indexed by id
+        """
+        return np.array(self._in_degree, dtype=np.int64)
+
+    def depth_array(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: depth of every node, indexed by id
+        """
+        return np.array(self.depths, dtype=np.int32)
+
+    def csr(self):
+        """Compacts the core and returns the forward adjacency in CSR form.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: index pointers (length n+1) and successor ids
+        """
+        self.compact()
+        return self._csr[0], self._csr[1]
+
+    def reverse_csr(self):
+        """Compacts the core and returns the backward adjacency in CSR form.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: index pointers (length n+1) and predecessor ids
+        """
+        self.compact()
+        return self._csr[2], self._csr[3]
+
+    def edges(self):
+        """
+        Returns:
+            tuple[np.ndarray, np.ndarray]: source and target ids of all edges
+        """
+        indptr, indices = self.csr()
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(indptr)), indices
+
+    def compact(self):
+        """Turns the growable per node adjacency lists into CSR arrays. Call when the graph is done growing."""
+        if self._csr is not None:
+            return
+        self._csr = self._lists_to_csr(self._out, self._out_degree) + self._lists_to_csr(self._in, self._in_degree)
+        self._out = self._in = None
+
+    @staticmethod
+    def _lists_to_csr(lists, degrees):
+        indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(np.array(degrees, dtype=np.int64), out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        for node_id, neighbours in enumerate(lists):
+            if neighbours:
+                indices[indptr[node_id]:indptr[node_id + 1]] = np.frombuffer(neighbours, dtype=np.int32)
+        return indptr, indices
+
+    def _thaw(self):
+        if self._csr is None:
+            return
+        if not isinstance(self.urls, list):
+            # Sitting on top of read only data. Copy everything into growable structures.
+            self.urls = list(self.urls)
+            self.depths = array('i', np.asarray(self.depths, dtype=np.int32).tobytes())
+            self.expansion = bytearray(np.asarray(self.expansion, dtype=np.uint8).tobytes())
+            self._out_degree = array('i', np.asarray(self._out_degree, dtype=np.int32).tobytes())
+            self._in_degree = array('i', np.asarray(self._in_degree, dtype=np.int32).tobytes())
+            if self.titles is not None:
+                self.titles = list(self.titles)
+            self.id_of('')
+        self._out = self._csr_to_lists(self._csr[0], self._csr[1])
+        self._in = self._csr_to_lists(self._csr[2], self._csr[3])
+        self._csr = None
+
+    @staticmethod
+    def _csr_to_lists(indptr, indices):
+        return [array('i', indices[indptr[i]:indptr[i + 1]].astype(np.int32).tobytes()) for i in range(len(indptr) - 1)]
+
+    def __getstate__(self):
+        # Pickled compacted: a handful of flat arrays instead of a list of small ones. The factory belongs to the graph.
+        self.compact()
+        state = self.__dict__.copy()
+        state['article_factory'] = None
+        return state
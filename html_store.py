@@ -0,0 +1,240 @@
+"""Retention of the html of articles after the crawl, for searching the texts or exporting them, without downloading
+the pages again and without keeping every page as string in memory.
+
+Retention policies of a WikiGraph (see make_html_store):
+    none        the html is dropped once the references are extracted (the default)
+    compressed  pages are kept compressed in memory with zlib or zstd, by default with a dictionary built from the
+                first pages. Wikipedia pages share most of their skeleton (head, navigation, footer), which a shared
+                dictionary compresses away even for small pages.
+                With a budget, the oldest pages are spilled to an append-only segment file on disk once the compressed
+                pages in memory exceed it.
+
+Stores are thread safe, downloading threads put pages into them while the crawl reads others.
+"""
+import os
+import tempfile
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+from wikigraph_metrics import REGISTRY
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ('zlib', 'zstd')
+# zlib only looks back 32 KiB, so larger dictionaries are of no use to it.
+DICTIONARY_SIZE = {'zlib': 32 * 1024, 'zstd': 112 * 1024}
+DEFAULT_LEVEL = {'zlib': 6, 'zstd': 9}
+
+
+class HtmlStore:
+    """Interface of html stores (see WikiArticle.html_store), which keep the html of articles by their url."""
+    def get(self, url: str):
+        """
+        Returns:
+            str | None: stored html of the article, None if it is not stored
+        """
+        return None
+
+    def put(self, url: str, html: str):
+        """Stores the html of an article. Articles that are stored already are not replaced."""
+        pass
+
+
+def train_dictionary(pages, size: int = 32 * 1024) -> bytes:
+    """Builds a compression dictionary out of the lines that at least half of the pages share: the skeleton of the pages
+    of a wiki.
+
+    Args:
+        pages (Iterable[bytes]): sample pages
+        size (int, optional): maximum size of the dictionary. Defaults to 32 KiB.
+
+    Returns:
+        bytes: the dictionary, empty if the pages have nothing in common
+    """
+    pages = list(pages)
+    lines = Counter()
+    for page in pages:
+        lines.update(set(page.splitlines(keepends=True)))
+    common = [(count, line) for line, count in lines.items() if 2 * count >= len(pages) and len(line.strip()) > 8]
+    # Matches close to the end of the dictionary are the cheapest, so the most common lines go last.
+    common.sort(key=lambda entry: (entry[0], len(entry[1])))
+    return b''.join(line for _, line in common)[-size:]
+
+
+class CompressedHtmlStore(HtmlStore):
+    """Keeps pages compressed in memory, and beyond a budget in a segment file on disk.
+
+    Until train_pages pages are stored, they are kept uncompressed. Then the dictionary is built out of them and they
+    are compressed along with all following pages.
+    """
+    def __init__(self, codec: str = 'zlib', level: int = None, dictionary: bool = True, budget: int = None,
+                 spill_dir: str = None, train_pages: int = 32, fallback: HtmlStore = None) -> None:
+        """
+        Args:
+            codec (str, optional): 'zlib' or 'zstd' (requires zstandard). Defaults to 'zlib'.
+            level (int, optional): Compression level. Defaults to None, 6 for zlib and 9 for zstd.
+            dictionary (bool, optional): Compress with a dictionary built from the first pages. Defaults to True.
+            budget (int, optional): Bytes of compressed pages kept in memory. Beyond, the oldest pages are spilled to disk.
+                Defaults to None, keeping everything in memory.
+            spill_dir (str, optional): Directory of the segment file, which is deleted once the store is closed or gone.
+                Defaults to None, the temporary directory.
+            train_pages (int, optional): Pages out of which the dictionary is built. Defaults to 32.
+            fallback (HtmlStore, optional): Store that is asked for pages which are not in this one, eg. the html stored
+                with a loaded graph. Defaults to None.
+
+        Raises:
+            ValueError: unknown codec
+            ImportError: zstd was requested, but zstandard is not installed.
+        """
+        if codec not in CODECS:
+            raise ValueError(f'Unknown codec {codec}, expected one of {", ".join(CODECS)}.')
+        if codec == 'zstd' and zstandard is None:
+            raise ImportError('Compressing html with zstd requires the zstandard package (pip install zstandard).')
+        self.codec = codec
+        self.level = level if level is not None else DEFAULT_LEVEL[codec]
+        self.budget = budget
+        self.spill_dir = spill_dir
+        self.fallback = fallback
+        self._train_pages = max(1, train_pages)
+        self._trained = not dictionary
+        self._dictionary = b''
+        self._zstd_dictionary = None
+        # Uncompressed pages until the dictionary is trained, compressed pages in memory in the order in which they
+        # were stored, and (offset, length) of the spilled ones in the segment file
+        self._samples = OrderedDict()
+        self._memory = OrderedDict()
+        self._disk = {}
+        self._segment = None
+        self._lock = threading.Lock()
+        self.raw_bytes = 0
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+
+    def __len__(self):
+        return len(self._samples) + len(self._memory) + len(self._disk)
+
+    def __contains__(self, url):
+        return url in self._samples or url in self._memory or url in self._disk
+
+    @property
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: pages, and bytes of the pages uncompressed, compressed in memory and on disk
+        """
+        return {'pages': len(self), 'raw_bytes': self.raw_bytes, 'memory_bytes': self.memory_bytes, 'disk_bytes': self.disk_bytes}
+
+    def put(self, url, html):
+        data = html.encode('utf-8')
+        with self._lock:
+            if url in self:
+                return
+            if not self._trained:
+                self._samples[url] = data
+                self.raw_bytes += len(data)
+                self.memory_bytes += len(data)
+                if len(self._samples) >= self._train_pages:
+                    self._train()
+                self._spill()
+                return
+        # The dictionary does not change anymore, so the compression does not hold up the other threads.
+        blob = self._compress(data)
+        with self._lock:
+            if url in self:
+                return
+            self._memory[url] = blob
+            self.raw_bytes += len(data)
+            self.memory_bytes += len(blob)
+            self._spill()
+
+    def get(self, url):
+        with self._lock:
+            data = self._samples.get(url)
+            if data is not None:
+                return data.decode('utf-8')
+            blob = self._memory.get(url)
+            if blob is None and url in self._disk:
+                offset, length = self._disk[url]
+                self._segment.seek(offset)
+                blob = self._segment.read(length)
+        if blob is None:
+            return self.fallback.get(url) if self.fallback is not None else None
+        return self._decompress(blob).decode('utf-8')
+
+    def close(self):
+        """Deletes the segment file. Spilled pages are gone afterwards."""
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+                self._disk.clear()
+                self.disk_bytes = 0
+
+    def _train(self):
+        self._dictionary = train_dictionary(self._samples.values(), DICTIONARY_SIZE[self.codec])
+        if self.codec == 'zstd' and self._dictionary:
+            self._zstd_dictionary = zstandard.ZstdCompressionDict(self._dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        self._trained = True
+        samples, self._samples = self._samples, OrderedDict()
+        for url, data in samples.items():
+            blob = self._compress(data)
+            self._memory[url] = blob
+            self.memory_bytes += len(blob) - len(data)
+
+    def _compress(self, data):
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level, dict_data=self._zstd_dictionary).compress(data)
+        if not self._dictionary:
+            return zlib.compress(data, self.level)
+        compressor = zlib.compressobj(self.level, zdict=self._dictionary)
+        return compressor.compress(data) + compressor.flush()
+
+    def _decompress(self, blob):
+        if self.codec == 'zstd':
+            return zstandard.ZstdDecompressor(dict_data=self._zstd_dictionary).decompress(blob)
+        if not self._dictionary:
+            return zlib.decompress(blob)
+        decompressor = zlib.decompressobj(zdict=self._dictionary)
+        return decompressor.decompress(blob) + decompressor.flush()
+
+    def _spill(self):
+        # Called with the lock held. Pages waiting for the dictionary stay in memory, there are only a few of them.
+        while self.budget is not None and self.memory_bytes > self.budget and self._memory:
+            url, blob = self._memory.popitem(last=False)
+            if self._segment is None:
+                self._segment = tempfile.TemporaryFile(prefix='wikigraph-html-', dir=self.spill_dir)
+            offset = self._segment.seek(0, os.SEEK_END)
+            self._segment.write(blob)
+            self._disk[url] = (offset, len(blob))
+            self.memory_bytes -= len(blob)
+            self.disk_bytes += len(blob)
+        REGISTRY.gauge('wikigraph_html_store_bytes', where='memory').set(self.memory_bytes)
+        REGISTRY.gauge('wikigraph_html_store_bytes', where='disk').set(self.disk_bytes)
+
+
+RETENTIONS = ('none', 'compressed')
+
+
+def make_html_store(retention='none', **options):
+    """
+    Args:
+        retention (str | HtmlStore, optional): 'none', 'compressed' or a store. Defaults to 'none'.
+        options: arguments of CompressedHtmlStore, eg. codec, budget and spill_dir
+
+    Raises:
+        ValueError: unknown retention
+
+    Returns:
+        HtmlStore | None: store for the html of the articles, None if it is not kept
+    """
+    if isinstance(retention, HtmlStore):
+        return retention
+    if retention is None or retention == 'none':
+        return None
+    if retention == 'compressed':
+        return CompressedHtmlStore(**options)
+    raise ValueError(f'Unknown html retention {retention}, expected one of {", ".join(RETENTIONS)}.')
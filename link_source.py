@@ -0,0 +1,47 @@
+class LinkSource:
+    """Interface for sources of article references other than downloading and scanning the article pages,
+    eg. Wikipedia dumps. A WikiGraph with a link source asks it instead of the WikiArticles for references.
+    """
+    # Articles the graph hands to prefetch at once. Sources that answer for many articles in one go raise it.
+    batch_size = 1
+
+    def references(self, url: str) -> list:
+        """References of an article, as the ReferenceExtractor would have found them on its page.
+
+        Args:
+            url (str): url of the article
+
+        Returns:
+            list[str]: urls of the referenced articles
+        """
+        pass
+
+    def prefetch(self, urls: list):
+        """Called with the urls of the articles that are asked for next, so that sources can fetch their references in
+        batches. The default does nothing.
+
+        Args:
+            urls (list[str]): urls of the articles
+        """
+        pass
+
+    def canonical_url(self, url: str) -> str:
+        """
+        Args:
+            url (str): url of an article whose references were asked for
+
+        Returns:
+            str: url of the article the url leads to, if the source knows that it leads elsewhere (eg. a redirect).
+                None otherwise.
+        """
+        return None
+
+    def finished(self):
+        """Called when a crawl or path search that used the source ends, so that sources can drop what they fetched ahead
+        for it and that was never asked for. The default does nothing.
+        """
+        pass
+
+    def close(self):
+        """Releases whatever the source holds open."""
+        pass
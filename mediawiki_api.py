@@ -0,0 +1,143 @@
+"""References of articles from the MediaWiki Action API instead of their rendered pages.
+
+A rendered page is hundreds of KB of html for a few KB of links. The API answers prop=links (or prop=linkshere, the
+articles referencing one) for up to 50 titles per request, filters the namespaces on the server and resolves redirects,
+so the links of a whole frontier batch come in a few small JSON requests:
+
+    api.php?action=query&prop=links&titles=A|B|...&plnamespace=0&pllimit=max&redirects=1&format=json&formatversion=2
+
+Answers that do not fit into one response are continued with the continue parameters of the previous response.
+
+Unlike on a rendered page, links come sorted by title instead of in the order of the page, and links that only come
+from templates are included (as in the rendered page, but unlike in dumps). Links to pages that do not exist are not.
+"""
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from fetcher import Fetcher, FetchError
+from link_source import LinkSource
+from wikidump import title_to_url, url_to_title
+
+API_PATH = '/w/api.php'
+# Parameter prefixes of the supported properties
+PROPS = {'links': 'pl', 'linkshere': 'lh'}
+
+
+class MediaWikiLinkSource(LinkSource):
+    """Link source (see WikiGraph) that asks the Action API of a wiki for the links of articles, in batches."""
+    def __init__(self, api_url: str = 'https://de.wikipedia.org' + API_PATH, fetcher: Fetcher = None, namespaces=(0,),
+                 prop: str = 'links', batch_size: int = 50, host: str = None) -> None:
+        """
+        Args:
+            api_url (str, optional): Url of api.php. Defaults to the one of de.wikipedia.org.
+            fetcher (Fetcher, optional): Fetcher for the requests, with its rate limits and retries. Defaults to None, a new one.
+            namespaces (Iterable[int], optional): Namespaces of the linked pages. Defaults to (0,), the articles.
+            prop (str, optional): 'links' for the articles an article references, 'linkshere' for those referencing it. Defaults to 'links'.
+            batch_size (int, optional): Titles per request. The API allows 50 (500 for bots). Defaults to 50.
+            host (str, optional): Host of the article urls. Defaults to None, the host of the api url.
+
+        Raises:
+            ValueError: unknown prop
+        """
+        if prop not in PROPS:
+            raise ValueError(f'Unknown prop {prop}, expected one of {", ".join(PROPS)}.')
+        self.api_url = api_url
+        self.fetcher = fetcher if fetcher is not None else Fetcher()
+        self.namespaces = tuple(namespaces)
+        self.prop = prop
+        self.batch_size = max(1, batch_size)
+        if host is None:
+            parts = urlsplit(api_url)
+            host = f'{parts.scheme}://{parts.netloc}'
+        self.host = host
+        # Links that were fetched ahead and not asked for yet, and urls that lead elsewhere (redirects), by url
+        self._links = {}
+        self._canonical = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'titles': 0}
+
+    def references(self, url):
+        with self._lock:
+            links = self._links.pop(url, None)
+        if links is None:
+            self._query([url])
+            with self._lock:
+                links = self._links.pop(url, [])
+        return links
+
+    def prefetch(self, urls):
+        with self._lock:
+            missing = list(dict.fromkeys(url for url in urls if url not in self._links))
+        for start in range(0, len(missing), self.batch_size):
+            try:
+                self._query(missing[start:start + self.batch_size])
+            except FetchError as error:
+                # Asked for one by one later on, where the failure is the one of the article.
+                logging.warning(error)
+
+    def canonical_url(self, url):
+        with self._lock:
+            return self._canonical.pop(url, None)
+
+    def finished(self):
+        # Prefetched for articles that were never expanded (eg. once the graph was full). The source outlives the crawl.
+        with self._lock:
+            self._links.clear()
+            self._canonical.clear()
+
+    def _query(self, urls):
+        titles = {url: url_to_title(url) for url in urls}
+        prefix = PROPS[self.prop]
+        params = {'action': 'query', 'format': 'json', 'formatversion': '2', 'prop': self.prop, 'redirects': '1',
+                  'titles': '|'.join(dict.fromkeys(titles.values())), f'{prefix}namespace': '|'.join(map(str, self.namespaces)),
+                  f'{prefix}limit': 'max'}
+        if self.prop == 'linkshere':
+            params['lhprop'] = 'title'
+        normalized, redirects, links = {}, {}, {}
+        continuation = {}
+        while True:
+            data = self._request({**params, **continuation})
+            query = data.get('query', {})
+            normalized.update((entry['from'], entry['to']) for entry in query.get('normalized', ()))
+            redirects.update((entry['from'], entry['to']) for entry in query.get('redirects', ()))
+            for page in query.get('pages', ()):
+                # Continued responses bring more links of the same pages.
+                links.setdefault(page['title'], []).extend(link['title'] for link in page.get(self.prop, ()))
+            continuation = data.get('continue')
+            if not continuation:
+                break
+        with self._lock:
+            for url, title in titles.items():
+                title = normalized.get(title, title)
+                page = redirects.get(title, title)
+                self._links[url] = [title_to_url(link, self.host) for link in links.get(page, ())]
+                canonical = title_to_url(page, self.host)
+                if canonical != url:
+                    self._canonical[url] = canonical
+            self.stats['titles'] += len(titles)
+
+    def _request(self, params):
+        self.stats['requests'] += 1
+        response = self.fetcher.get(self.api_url, params=params)
+        try:
+            data = response.json()
+        except ValueError:
+            raise FetchError(self.api_url, 'the answer is no JSON')
+        if 'error' in data:
+            raise FetchError(self.api_url, f"{data['error'].get('code')}: {data['error'].get('info')}")
+        return data
+
+    def __getstate__(self):
+        # Fetched links belong to the running crawl.
+        state = self.__dict__.copy()
+        for name in ('_links', '_canonical', '_lock', 'stats'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._links = {}
+        self._canonical = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'titles': 0}
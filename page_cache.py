@@ -0,0 +1,254 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from collections import namedtuple
+from time import perf_counter, time
+
+from fetcher import FetchError
+from wikigraph_metrics import REGISTRY
+
+CachedPage = namedtuple('CachedPage', ['url', 'content', 'etag', 'last_modified', 'fetched_at'])
+CachedPage.__doc__ = """A page as it is stored in a page cache. content holds the raw response body."""
+
+
+class PageCache:
+    """Interface for Page-Caches, which keep downloaded pages around for later use.
+    """
+    def lookup(self, url: str):
+        """Looks up the cached version of a page.
+
+        Args:
+            url (str): url of the page
+
+        Returns:
+            CachedPage | None: The cached page, or None if the page is not cached.
+        """
+        pass
+
+    def store(self, url: str, content: bytes, etag: str = None, last_modified: str = None):
+        """Stores a freshly downloaded page.
+
+        Args:
+            url (str): url of the page
+            content (bytes): body of the response
+            etag (str, optional): ETag header of the response. Defaults to None.
+            last_modified (str, optional): Last-Modified header of the response. Defaults to None.
+        """
+        pass
+
+    def revalidated(self, url: str):
+        """Marks a cached page as confirmed to be up to date by the server.
+
+        Args:
+            url (str): url of the page
+        """
+        pass
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        """
+        Returns:
+            bool: Can the page be used without asking the server whether it changed?
+        """
+        return True
+
+
+class DiskPageCache(PageCache):
+    """Page-Cache in a directory on disk. Page bodies are stored zlib-compressed and content addressed (by their sha256),
+    so pages with identical content only take up space once. A small sqlite index maps urls to their content and keeps
+    the validators (ETag/Last-Modified) for conditional revalidation.
+
+    Once the compressed contents exceed max_bytes, the least recently used pages are evicted.
+    Pages older than ttl seconds are revalidated with the server before being used again.
+    """
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3, ttl: float = 7 * 24 * 3600) -> None:
+        """
+        Args:
+            directory (str): Directory in which the cache is kept. Is created if it does not exist.
+            max_bytes (int, optional): Maximum size of the compressed page bodies. Defaults to 1 GiB.
+            ttl (float, optional): Seconds for which a page is used without revalidation. None means forever. Defaults to one week.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._open()
+
+    def _open(self):
+        os.makedirs(os.path.join(self.directory, 'objects'), exist_ok=True)
+        # The cache is shared by the download threads of a graph, so the connection is guarded by a lock instead.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(self.directory, 'index.sqlite3'), check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, digest TEXT NOT NULL, '
+                                     'etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, last_access REAL NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS pages_by_access ON pages (last_access)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS pages_by_digest ON pages (digest)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)')
+        self._total_bytes = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def lookup(self, url):
+        with self._lock:
+            row = self._connection.execute('SELECT digest, etag, last_modified, fetched_at FROM pages WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            with self._connection:
+                self._connection.execute('UPDATE pages SET last_access = ? WHERE url = ?', (time(), url))
+        digest, etag, last_modified, fetched_at = row
+        # Read and decompressed outside the lock, so that the download threads do not wait for each other here.
+        try:
+            with open(self._blob_path(digest), 'rb') as file:
+                content = zlib.decompress(file.read())
+        except (FileNotFoundError, zlib.error):
+            # Someone tidied up the directory behind our back. Forget the page.
+            with self._lock:
+                with self._connection:
+                    self._connection.execute('DELETE FROM pages WHERE url = ? AND digest = ?', (url, digest))
+            return None
+        return CachedPage(url, content, etag, last_modified, fetched_at)
+
+    def store(self, url, content, etag=None, last_modified=None):
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            known = self._connection.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is not None
+        # Compressed and written outside the lock. Only the bookkeeping in the index is done under it.
+        size = None if known else self._write_blob(digest, content)
+        with self._lock:
+            with self._connection:
+                if self._connection.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is None:
+                    if size is None:
+                        # The blob was evicted in the meantime.
+                        size = self._write_blob(digest, content)
+                    self._connection.execute('INSERT INTO blobs (digest, size) VALUES (?, ?)', (digest, size))
+                    self._total_bytes += size
+                previous = self._connection.execute('SELECT digest FROM pages WHERE url = ?', (url,)).fetchone()
+                now = time()
+                self._connection.execute('INSERT OR REPLACE INTO pages (url, digest, etag, last_modified, fetched_at, last_access) '
+                                         'VALUES (?, ?, ?, ?, ?, ?)', (url, digest, etag, last_modified, now, now))
+                if previous is not None and previous[0] != digest:
+                    self._drop_unreferenced_blob(previous[0])
+                self._evict()
+
+    def _write_blob(self, digest, content):
+        compressed = zlib.compress(content)
+        path = self._blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temporary file first, so a crash never leaves a truncated blob behind.
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(compressed)
+        os.replace(temporary, path)
+        return len(compressed)
+
+    def revalidated(self, url):
+        with self._lock:
+            with self._connection:
+                now = time()
+                self._connection.execute('UPDATE pages SET fetched_at = ?, last_access = ? WHERE url = ?', (now, now, url))
+
+    def is_fresh(self, page):
+        return self.ttl is None or time() - page.fetched_at < self.ttl
+
+    def _drop_unreferenced_blob(self, digest):
+        if self._connection.execute('SELECT 1 FROM pages WHERE digest = ? LIMIT 1', (digest,)).fetchone() is not None:
+            return
+        row = self._connection.execute('SELECT size FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            return
+        self._connection.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+        self._total_bytes -= row[0]
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # Least recently used pages go first. Must be called with the lock held, within a transaction.
+        while self._total_bytes > self.max_bytes:
+            row = self._connection.execute('SELECT url, digest FROM pages ORDER BY last_access LIMIT 1').fetchone()
+            if row is None:
+                break
+            self._connection.execute('DELETE FROM pages WHERE url = ?', (row[0],))
+            self._drop_unreferenced_blob(row[1])
+
+    @property
+    def size(self):
+        """
+        Returns:
+            int: Compressed size of all cached page bodies in bytes.
+        """
+        return self._total_bytes
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    # The cache travels with pickled WikiGraphs. Only its configuration is stored, the connection is reopened.
+    def __getstate__(self):
+        return {'directory': self.directory, 'max_bytes': self.max_bytes, 'ttl': self.ttl}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+def fetch_page(url: str, session, cache: PageCache = None) -> bytes:
+    """Downloads a page, making use of the page cache if one is given. Stale cached pages are revalidated
+    with a conditional request, so unchanged pages are not transferred again.
+
+    Args:
+        url (str): url of the page
+        session (requests.Session): Session (or anything with a compatible get method) used for downloading.
+        cache (PageCache, optional): Cache to look the page up in and to store it into. Defaults to None.
+
+    Raises:
+        FetchError: the server answered with an error.
+
+    Returns:
+        bytes: body of the page
+    """
+    start = perf_counter()
+    try:
+        return _fetch_page(url, session, cache)
+    finally:
+        REGISTRY.histogram('wikigraph_fetch_seconds').observe(perf_counter() - start)
+
+
+def _fetch_page(url, session, cache):
+    if cache is None:
+        return _downloaded(_checked(session.get(url)))
+    page = cache.lookup(url)
+    if page is not None and cache.is_fresh(page):
+        REGISTRY.counter('wikigraph_page_cache_total', result='hit').inc()
+        return page.content
+    headers = {}
+    if page is not None:
+        if page.etag:
+            headers['If-None-Match'] = page.etag
+        if page.last_modified:
+            headers['If-Modified-Since'] = page.last_modified
+    response = session.get(url, headers=headers)
+    if page is not None and response.status_code == 304:
+        REGISTRY.counter('wikigraph_page_cache_total', result='revalidated').inc()
+        cache.revalidated(url)
+        return page.content
+    REGISTRY.counter('wikigraph_page_cache_total', result='miss').inc()
+    if response.status_code == 200:
+        cache.store(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return _downloaded(_checked(response))
+
+
+def _downloaded(response):
+    content = response.content
+    REGISTRY.counter('wikigraph_downloaded_bytes_total').inc(len(content))
+    return content
+
+
+def _checked(response):
+    # Error pages are no articles. Fetchers check for themselves, plain sessions do not.
+    if response.status_code >= 400:
+        raise FetchError(response.url, f'status {response.status_code}', response.status_code)
+    return response
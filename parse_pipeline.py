@@ -0,0 +1,151 @@
+"""Pipelined expansion of articles, to use all cores for the extraction of references once downloads are no longer the
+bottleneck (eg. with a warm page cache).
+
+Three stages, connected by bounded queues so that a slow stage holds back the ones before it:
+    fetching    threads download the pages (the GIL is released while waiting for the network)
+    parsing     a pool of processes extracts titles and references, in batches of pages
+    insertion   the thread of the crawl takes the results in the order in which it submitted the articles
+
+Each page crosses into a worker process once, and only the small results come back. Pages that are parsed together
+are sent together, with their extractor pickled once per batch.
+"""
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+
+from wikiarticle import WikiArticle
+from wikigraph_metrics import REGISTRY
+
+
+def _resolve(future, result=None, error=None):
+    # Futures of articles that the crawl does not need anymore are cancelled.
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def _parse_batch(batch):
+    # Runs in the worker processes.
+    results = []
+    for extractor, html in batch:
+        start = perf_counter()
+        result = WikiArticle.extract_page(extractor, html)
+        results.append((result, perf_counter() - start))
+    return results
+
+
+class ParsePipeline:
+    """Fetches articles in threads and extracts their references in worker processes. Use as context manager."""
+    def __init__(self, workers: int = None, fetch_threads: int = 1, batch_size: int = 8) -> None:
+        """
+        Args:
+            workers (int, optional): Worker processes for the extraction. Defaults to None, one per core.
+            fetch_threads (int, optional): Parallel downloads. Defaults to 1.
+            batch_size (int, optional): Pages sent to a worker at once. Defaults to 8.
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.fetch_threads = max(1, fetch_threads)
+        self.batch_size = max(1, batch_size)
+        # Enough downloaded pages waiting to keep every worker busy with the next batch.
+        self.capacity = 2 * self.workers * self.batch_size
+        self.fetch_executor = None
+        self._processes = None
+        self._queue = None
+        self._slots = None
+        self._batcher = None
+
+    def __enter__(self):
+        # Forking while download threads run could copy held locks into the workers.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._processes = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.fetch_executor = ThreadPoolExecutor(max_workers=self.fetch_threads)
+        self._queue = queue.Queue(maxsize=self.capacity)
+        # Batches in the workers or waiting for one. The batcher waits for a slot, the queue fills up, downloads wait.
+        self._slots = threading.Semaphore(2 * self.workers)
+        self._batcher = threading.Thread(target=self._batch, name='parse-batcher', daemon=True)
+        self._batcher.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fetch_executor.shutdown(wait=True, cancel_futures=True)
+        self._queue.put(None)
+        self._batcher.join()
+        self._processes.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def window(self) -> int:
+        """
+        Returns:
+            int: articles that can be in the pipeline at once without anyone waiting
+        """
+        return self.fetch_threads + self.capacity + 2 * self.workers * self.batch_size
+
+    def submit(self, article: WikiArticle) -> Future:
+        """Starts the expansion of an article.
+
+        Returns:
+            Future: resolves to the references of the article, or fails with FetchError
+        """
+        future = Future()
+        if article.references_known:
+            future.set_result(article.references)
+        else:
+            self.fetch_executor.submit(self._fetch, article, future)
+        return future
+
+    def _fetch(self, article, future):
+        if future.cancelled():
+            return
+        try:
+            html = article.html
+        except Exception as error:
+            _resolve(future, error=error)
+            return
+        self._queue.put((article, html, future))
+
+    def _batch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Whatever else is waiting goes along. Under load, batches fill up by themselves.
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._slots.acquire()
+            try:
+                parsed = self._processes.submit(_parse_batch, [(article.reference_extractor, html) for article, html, _ in batch])
+            except RuntimeError as error:
+                # The pool is shutting down.
+                self._slots.release()
+                for _, _, future in batch:
+                    _resolve(future, error=error)
+                continue
+            parsed.add_done_callback(lambda parsed, batch=batch: self._done(batch, parsed))
+
+    def _done(self, batch, parsed):
+        self._slots.release()
+        try:
+            results = parsed.result()
+        except BaseException as error:
+            for _, _, future in batch:
+                _resolve(future, error=error)
+            return
+        histogram = REGISTRY.histogram('wikigraph_extraction_seconds')
+        for (article, _, future), (result, seconds) in zip(batch, results):
+            histogram.observe(seconds)
+            _resolve(future, article.apply_extraction(result))
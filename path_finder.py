@@ -0,0 +1,152 @@
+"""Paths between two articles, found without building the graph around them first.
+
+The search is bidirectional: forwards from the source along the references of articles, backwards from the target along
+the articles that reference it (if a source for those is known, eg. prop=linkshere of the MediaWiki API). Each step
+expands the whole next layer of the side with the smaller frontier, and the search stops with the layer in which the
+sides meet. For a path of length d with b references per article, that are about 2 * b^(d/2) articles instead of the b^d
+of a breadth first crawl. Without backward references, the search only goes forwards.
+
+More than one path are found with Yen's algorithm: every further path deviates from an earlier one at some article, and
+is the shortest path from there that avoids the deviations already found. Every of these searches is again a lazy
+bidirectional one, but the references of articles are only ever asked for once.
+"""
+import heapq
+import logging
+
+
+class PathFinder:
+    """Lazy bidirectional search for shortest paths. Remembers all references it asked for."""
+    def __init__(self, forward, backward=None, max_expansions: int = None) -> None:
+        """
+        Args:
+            forward (callable): takes a list of urls and returns a dict of the urls of the articles each of them references
+            backward (callable, optional): takes a list of urls and returns a dict of the urls of the articles referencing
+                each of them. Defaults to None, searching forwards only.
+            max_expansions (int, optional): Articles whose references are asked for, in both directions, after which the
+                search gives up. Defaults to None, no limit.
+        """
+        self._forward = forward
+        self._backward = backward
+        self.max_expansions = max_expansions
+        self._successors = {}
+        self._predecessors = {}
+        # The search ran out of expansions at least once. Paths found since may not be the shortest.
+        self.exhausted = False
+
+    @property
+    def expansions(self) -> int:
+        """Articles whose references were asked for so far, in both directions."""
+        return len(self._successors) + len(self._predecessors)
+
+    def _neighbours(self, urls, known, fetch):
+        missing = [url for url in dict.fromkeys(urls) if url not in known]
+        if missing:
+            fetched = fetch(missing)
+            known.update((url, list(fetched.get(url, ()))) for url in missing)
+        return known
+
+    def shortest_path(self, source: str, target: str, max_length: int = 6, banned_nodes=frozenset(), banned_edges=frozenset()):
+        """
+        Args:
+            source (str): url of the first article
+            target (str): url of the last article
+            max_length (int, optional): Maximum amount of references in the path. Defaults to 6.
+            banned_nodes (set[str], optional): urls of articles the path must not pass. Defaults to none.
+            banned_edges (set[tuple[str, str]], optional): references the path must not follow. Defaults to none.
+
+        Returns:
+            list[str] | None: urls of the articles on a shortest path, None if there is none within the maximum length
+        """
+        if source == target:
+            return [source]
+        # Distance and predecessor on the path of every article that either side has reached
+        forward = {source: (0, None)}
+        backward = {target: (0, None)}
+        forward_layer, backward_layer = [source], [target]
+        forward_depth = backward_depth = 0
+        while forward_layer and backward_layer and forward_depth + backward_depth < max_length:
+            if self.max_expansions is not None and self.expansions >= self.max_expansions:
+                self.exhausted = True
+                logging.warning(f'The path search gave up after {self.expansions} articles.')
+                return None
+            backwards = self._backward is not None and len(backward_layer) < len(forward_layer)
+            if backwards:
+                layer, reached, other = backward_layer, backward, forward
+                neighbours = self._neighbours(layer, self._predecessors, self._backward)
+                backward_depth += 1
+            else:
+                layer, reached, other = forward_layer, forward, backward
+                neighbours = self._neighbours(layer, self._successors, self._forward)
+                forward_depth += 1
+            depth = forward_depth if not backwards else backward_depth
+            next_layer = []
+            best = None
+            for url in layer:
+                for neighbour in neighbours[url]:
+                    edge = (neighbour, url) if backwards else (url, neighbour)
+                    if neighbour in reached or neighbour in banned_nodes or edge in banned_edges:
+                        continue
+                    reached[neighbour] = (depth, url)
+                    next_layer.append(neighbour)
+                    if neighbour in other:
+                        # The whole layer is treated, the meeting with the shortest path through it wins.
+                        length = depth + other[neighbour][0]
+                        if best is None or length < best[0]:
+                            best = (length, neighbour)
+            if best is not None:
+                return self._join(best[1], forward, backward)
+            if backwards:
+                backward_layer = next_layer
+            else:
+                forward_layer = next_layer
+        return None
+
+    @staticmethod
+    def _join(meeting, forward, backward):
+        path = []
+        url = meeting
+        while url is not None:
+            path.append(url)
+            url = forward[url][1]
+        path.reverse()
+        url = backward[meeting][1]
+        while url is not None:
+            path.append(url)
+            url = backward[url][1]
+        return path
+
+    def shortest_paths(self, source: str, target: str, k: int = 1, max_length: int = 6) -> list:
+        """The k shortest paths without loops (Yen's algorithm). Paths of the same length come in the order of their urls.
+
+        Args:
+            source (str): url of the first article
+            target (str): url of the last article
+            k (int, optional): Amount of paths. Defaults to 1.
+            max_length (int, optional): Maximum amount of references in a path. Defaults to 6.
+
+        Returns:
+            list[list[str]]: up to k paths, shortest first, each as the urls of its articles
+        """
+        first = self.shortest_path(source, target, max_length)
+        if first is None:
+            return []
+        paths = [first]
+        candidates = []
+        seen = {tuple(first)}
+        while len(paths) < k:
+            last = paths[-1]
+            for index in range(len(last) - 1):
+                root = last[:index + 1]
+                # References by which the paths found so far leave the common beginning
+                banned_edges = {(path[index], path[index + 1]) for path in paths if path[:index + 1] == root}
+                spur = self.shortest_path(last[index], target, max_length - index, frozenset(root[:-1]), banned_edges)
+                if spur is None:
+                    continue
+                candidate = tuple(root[:-1] + spur)
+                if candidate not in seen:
+                    seen.add(candidate)
+                    heapq.heappush(candidates, (len(candidate), candidate))
+            if not candidates:
+                break
+            paths.append(list(heapq.heappop(candidates)[1]))
+        return paths
@@ -1,15 +1,42 @@
-import string
-from turtle import onclick
-from reference_extractors.reference_extractor import ReferenceExtractor
+from reference_extractors.reference_extractor import ExtractionResult, ReferenceExtractor
+from html import unescape
 import re
 
-# Known Bug: For unknown reasons, sometimes Wikiarticles are created with urls from this source.
-# Said URLs, for unknown reasons, do not include a protocol extension such as ' https:// '
-# It is not reliably repeatable, but seems to happen at random.
+# Früher wurden Links mit Host (z.B. "de.wikipedia.org/wiki/...") blind mit dem Host verkettet, woraus Urls ohne
+# gültiges Schema entstanden. Jetzt wird nur noch der Pfad erfasst und immer vor den selben Host gesetzt.
 
 class GermanWikipediaArticleReferenceExtractor(ReferenceExtractor):
     """Extraktor für Artikel-Referenzen auf das deutsche Wikipedia 
     """
+    HOST = "https://de.wikipedia.org"
+    # These Keywords (In the german wikipedia space ) signal internal references to Kategorypages, Impressum etc.
+    EXCLUDED_NAMESPACES = frozenset(('Datei', 'Spezial', 'Kategorie', 'Wikipedia', 'Hilfe', 'Portal'))
+
+    # Ein einziges Muster für alles, was uns an einer Seite interessiert. Das gemeinsame '<' steht vor der Alternative,
+    # so dass die Regex-Engine an jedem anderen Zeichen sofort weiter springt und an jedem Tag nur ein Zeichen prüft.
+    # Links mit Hashtag (in Wikipedia für interne Sprünge genutzt) passen absichtlich nicht.
+    # Gruppen: Pfad des Links nach /wiki/, Titel, Grenze des Artikeltextes, kanonische Url der Seite.
+    _TOKENS = re.compile(
+        r'<(?:a\s+href="(?:(?:https?:)?//de\.wikipedia\.org|de\.wikipedia\.org)?/wiki/([^#"\s]+)"'
+        r'|h1 id="firstHeading"[^>]*>(.*?)</h1>'
+        r'|div (id="mw-content-text"|class="printfooter")'
+        r'|link rel="canonical" href="([^"]+)")',
+        re.DOTALL)
+    _TAGS = re.compile(r'<[^>]*>')
+
+    # Class level defaults for extractors from older pickles.
+    content_only = False
+    host = HOST
+
+    def __init__(self, content_only: bool = False, host: str = HOST) -> None:
+        """
+        Args:
+            content_only (bool, optional): Nur Referenzen aus dem Artikeltext selbst, ohne Navigation, Fußzeile und Kategorien. Defaults to False.
+            host (str, optional): Host, vor den die gefundenen Pfade gesetzt werden. Für lokale Nachbildungen von Wikipedia. Defaults to HOST.
+        """
+        self.content_only = content_only
+        self.host = host
+
     def __call__(self, html: str) -> set:
         """Extrahiert alle Referenzen, die auf einen de.wikipedia.org artikel verweisen.
         Vorsicht: Verweise auf den selben Host werden als Verweis auf de.wikipeia.org interpretiert.
@@ -21,15 +48,33 @@ class GermanWikipediaArticleReferenceExtractor(ReferenceExtractor):
         Returns:
             set[str]: referenzen auf Artikel
         """
-        # No hashtags, used in wikipedia for internal referencing
-        wikipediarefs =  re.findall(r'<a\s+href="((?:(?:https?://)?de.wikipedia.org)?/wiki/(?:[^#"\s]|)+?)"[^<>]*', html)
-
-        # These Keywords (In the german wikipedia space ) signal internal references to Kategorypages, Impressum etc.
-        only_article_refs = filter(lambda ref: not re.match(r'/wiki/((Datei)|(Spezial)|(Kategorie)|(Wikipedia)|(Hilfe)|(Portal)):.*?', ref), wikipediarefs)
-        # Using separate collections, as the use of one set was the most likely to be causing the strange Bug described above.g
-        result_set = set()
-        for ref in only_article_refs:
-            # Turn all into absolute paths according to assumption of german wikipedia.
-            if not ref.startswith("https://de.wikipedia.org"):
-                result_set.add("https://de.wikipedia.org" + ref)
-        return result_set
\ No newline at end of file
+        return set(self.extract(html).references)
+
+    def extract(self, html: str) -> ExtractionResult:
+        """Findet Titel und Referenzen in einem einzigen Durchlauf über das html.
+
+        Args:
+            html (str): html der Artikelseite
+
+        Returns:
+            ExtractionResult: Titel (None, falls keiner gefunden wurde), referenzen auf Artikel, ohne Duplikate in der
+                Reihenfolge ihres ersten Auftretens, und die kanonische Url der Seite (None, falls sie keine angibt)
+        """
+        tokens = self._TOKENS.findall(html)
+        raw_title = next((title for _, title, _, _ in tokens if title), None)
+        title = unescape(self._TAGS.sub('', raw_title)).strip() if raw_title is not None else None
+        # Weiterleitungen geben hier ihr Ziel an. Steht im Kopf der Seite, also vor dem Artikeltext.
+        canonical = next((unescape(url) for _, _, _, url in tokens if url), None)
+        if self.content_only:
+            # Nur was zwischen dem Beginn des Artikeltextes und der Fußzeile liegt.
+            boundaries = [index for index, (_, _, boundary, _) in enumerate(tokens) if boundary]
+            start = next((index for index in boundaries if tokens[index][2] == 'id="mw-content-text"'), len(tokens))
+            end = next((index for index in boundaries if index > start), len(tokens))
+            tokens = tokens[start:end]
+        # Dict statt Set: Die Reihenfolge auf der Seite bleibt erhalten, unabhängig vom Hash-Seed des Prozesses.
+        slugs = dict.fromkeys(slug for slug, _, _, _ in tokens if slug)
+        # Namensräume werden nur für die verschiedenen Pfade und nur bei Doppelpunkt nachgeschlagen.
+        excluded = self.EXCLUDED_NAMESPACES
+        prefix = self.host + '/wiki/'
+        references = [prefix + slug for slug in slugs if ':' not in slug or slug.partition(':')[0] not in excluded]
+        return ExtractionResult(title, references, canonical)
@@ -1,3 +1,10 @@
+from collections import namedtuple
+
+# Ergebnis eines einzelnen Durchlaufs über eine Seite.
+ExtractionResult = namedtuple('ExtractionResult', ['title', 'references', 'canonical'], defaults=(None,))
+ExtractionResult.__doc__ = """Everything an extractor found in one pass over a page. title is None if the extractor does not know where to look,
+canonical is the url that the page states as its own (eg. the target of a redirect), None if it states none."""
+
 class ReferenceExtractor:
     # Die großen Unterschiede in der URL-Struktur von z.B. Wikipedia-Seiten erfordert, dass wir Seitenspezifische Extraktoren 
     # implementieren. Dies soll eine Art Interface hierfür darstellen.
@@ -13,4 +20,17 @@ class ReferenceExtractor:
         Returns:
             list[str]: List of references
         """
-        pass
\ No newline at end of file
+        pass
+
+    def extract(self, html:str) -> ExtractionResult:
+        """Extracts the title and the references of a html document. Extractors that can find both in a single pass
+        over the document should override this.
+
+        Args:
+            html (str): Html from which title and references should be extracted
+
+        Returns:
+            ExtractionResult: title (None if unknown), references, preferably as list in the order of the document, and
+                canonical url (None if unknown)
+        """
+        return ExtractionResult(None, self(html))
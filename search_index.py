@@ -0,0 +1,260 @@
+"""Inverted full-text index over the titles and texts of the articles of a graph.
+
+Texts are indexed while the pages are downloaded for the crawl anyway, so searching them later needs no downloads.
+Queries are one or more terms which all have to match (AND). A term ending in * matches every word starting with it.
+Matching is by whole words and case insensitive, not by substring.
+"""
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from html import unescape
+
+import numpy as np
+
+_WORD = re.compile(r'[^\W_]+')
+_INVISIBLE = re.compile(r'<(script|style)\b.*?</\1>', re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+FIELDS = ('title', 'body')
+
+
+def tokenize(text: str):
+    """
+    Returns:
+        list[str]: the lower case words of the text
+    """
+    return _WORD.findall(text.casefold())
+
+
+def html_text(html: str) -> str:
+    """
+    Returns:
+        str: the visible text of the article content of a page, or of the whole page if there is no content section.
+    """
+    start = html.find('id="mw-content-text"')
+    end = html.find('class="printfooter"', max(start, 0))
+    if start != -1:
+        html = html[start:end if end != -1 else len(html)]
+    return unescape(_TAG.sub(' ', _INVISIBLE.sub(' ', html)))
+
+
+class _Postings:
+    """Node ids by term of one field. Either growable (dict of arrays) or frozen (sorted terms with CSR postings),
+    as it comes out of a saved graph. Frozen postings are thawed on the first addition."""
+    def __init__(self) -> None:
+        self._lists = {}
+        self._frozen = None
+        self._sorted_terms = None
+
+    @classmethod
+    def frozen(cls, terms, indptr, ids):
+        postings = cls()
+        postings._lists = None
+        postings._frozen = (terms, indptr, ids)
+        return postings
+
+    def add(self, node_id, terms):
+        if self._frozen is not None:
+            self._thaw()
+        for term in terms:
+            ids = self._lists.get(term)
+            if ids is None:
+                ids = self._lists[term] = array('i')
+                self._sorted_terms = None
+            ids.append(node_id)
+
+    def remove(self, node_id, terms):
+        if self._frozen is not None:
+            self._thaw()
+        for term in terms:
+            ids = self._lists.get(term)
+            if ids is not None and node_id in ids:
+                ids = array('i', (other for other in ids if other != node_id))
+                if ids:
+                    self._lists[term] = ids
+                else:
+                    del self._lists[term]
+                    self._sorted_terms = None
+
+    def _thaw(self):
+        terms, indptr, ids = self._frozen
+        self._lists = {terms[index]: array('i', ids[indptr[index]:indptr[index + 1]].astype(np.int32).tobytes())
+                       for index in range(len(terms))}
+        self._frozen = None
+        self._sorted_terms = None
+
+    def terms(self):
+        # Sorted, for prefix lookups by bisection
+        if self._frozen is not None:
+            return self._frozen[0]
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._lists)
+        return self._sorted_terms
+
+    def ids(self, term) -> np.ndarray:
+        if self._frozen is not None:
+            terms, indptr, ids = self._frozen
+            index = bisect_left(terms, term)
+            if index < len(terms) and terms[index] == term:
+                return np.asarray(ids[indptr[index]:indptr[index + 1]])
+            return np.empty(0, dtype=np.int32)
+        return np.frombuffer(self._lists.get(term, array('i')), dtype=np.int32)
+
+    def prefixed(self, prefix):
+        terms = self.terms()
+        index = bisect_left(terms, prefix)
+        while index < len(terms) and terms[index].startswith(prefix):
+            yield terms[index]
+            index += 1
+
+    def arrays(self):
+        """
+        Returns:
+            tuple[list[str], np.ndarray, np.ndarray]: sorted terms, int64 index pointers and int32 node ids (CSR)
+        """
+        terms = list(self.terms())
+        lists = [np.unique(self.ids(term)) for term in terms]
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in lists], out=indptr[1:])
+        ids = np.concatenate(lists).astype(np.int32) if lists else np.empty(0, dtype=np.int32)
+        return terms, indptr, ids
+
+
+class SearchIndex:
+    """Inverted index over the titles and page texts of the nodes of a graph. Safe to fill from several download threads."""
+    def __init__(self) -> None:
+        self._postings = {field: _Postings() for field in FIELDS}
+        # Amount of nodes (in order of their ids) whose titles are indexed
+        self.titles_indexed = 0
+        # Terms of the titles that nodes may be indexed under, for nodes whose title changed since, by id
+        self._retitled = {}
+        # Which nodes have their page text indexed
+        self._bodies = bytearray()
+        # Pages of articles that are not part of the graph yet (eg. downloaded for eager titles), by url
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_arrays(cls, title, body, bodies, titles_indexed):
+        """Creates an index on top of the arrays written by arrays(), eg. out of a saved graph."""
+        index = cls()
+        index._postings = {'title': _Postings.frozen(*title), 'body': _Postings.frozen(*body)}
+        index._bodies = bodies
+        index.titles_indexed = titles_indexed
+        return index
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('_retitled', {})
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def has_body(self, node_id: int) -> bool:
+        return node_id < len(self._bodies) and self._bodies[node_id] == 1
+
+    def retitle(self, node_id: int, titles):
+        """Marks a node whose title changes (eg. renamed to its canonical url, or stated by its page), so that its title
+        is indexed anew by the next add_titles.
+
+        Args:
+            node_id (int): id of the node
+            titles (Iterable[str]): titles the node may have been indexed under
+        """
+        with self._lock:
+            if node_id < self.titles_indexed:
+                terms = self._retitled.setdefault(node_id, set())
+                for title in titles:
+                    terms.update(tokenize(title))
+
+    def add_titles(self, title_of, count: int):
+        """Indexes the titles of the nodes that were added since the last call, and those of the nodes whose title changed.
+
+        Args:
+            title_of (callable): returns the title of a node by id
+            count (int): amount of nodes in the graph
+        """
+        with self._lock:
+            for node_id, terms in self._retitled.items():
+                self._postings['title'].remove(node_id, terms)
+                self._postings['title'].add(node_id, set(tokenize(title_of(node_id))))
+            self._retitled.clear()
+            for node_id in range(self.titles_indexed, count):
+                self._postings['title'].add(node_id, set(tokenize(title_of(node_id))))
+            self.titles_indexed = max(self.titles_indexed, count)
+
+    def add_page(self, url: str, html: str, id_of):
+        """Indexes the text of a downloaded page.
+
+        Args:
+            url (str): url of the page
+            html (str): html of the page
+            id_of (callable): returns the node id of an url, None if it is not in the graph (yet)
+        """
+        node_id = id_of(url)
+        if node_id is not None and self.has_body(node_id):
+            return
+        terms = set(tokenize(html_text(html)))
+        with self._lock:
+            if node_id is None:
+                self._waiting[url] = terms
+            else:
+                self._add_body(node_id, terms)
+
+    def _add_body(self, node_id, terms):
+        if not isinstance(self._bodies, bytearray):
+            self._bodies = bytearray(np.asarray(self._bodies).tobytes())
+        if len(self._bodies) <= node_id:
+            self._bodies.extend(bytes(node_id + 1 - len(self._bodies)))
+        if self._bodies[node_id]:
+            return
+        self._bodies[node_id] = 1
+        self._postings['body'].add(node_id, terms)
+
+    def settle(self, id_of):
+        """Moves pages that were downloaded before their articles joined the graph to their nodes."""
+        with self._lock:
+            for url in list(self._waiting):
+                node_id = id_of(url)
+                if node_id is not None:
+                    self._add_body(node_id, self._waiting.pop(url))
+
+    def search(self, query: str, fields=FIELDS) -> np.ndarray:
+        """
+        Args:
+            query (str): terms which all have to match. Terms ending in * match every word starting with them.
+            fields (Iterable[str], optional): Fields in which terms may match. Defaults to title and body.
+
+        Returns:
+            np.ndarray: sorted ids of the matching nodes
+        """
+        result = None
+        for raw in query.split():
+            prefix = raw.endswith('*')
+            words = tokenize(raw)
+            if not words:
+                continue
+            # A term consisting of several words (eg. Harry-Potter) needs all of them.
+            for position, word in enumerate(words):
+                matches = []
+                for field in fields:
+                    postings = self._postings[field]
+                    if prefix and position == len(words) - 1:
+                        matches.extend(postings.ids(term) for term in postings.prefixed(word))
+                    else:
+                        matches.append(postings.ids(word))
+                ids = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int32)
+                result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        return result if result is not None else np.empty(0, dtype=np.int32)
+
+    def arrays(self):
+        """
+        Returns:
+            dict: CSR postings of every field, and the flags of the nodes whose text is indexed
+        """
+        with self._lock:
+            return {'title': self._postings['title'].arrays(), 'body': self._postings['body'].arrays(),
+                    'bodies': np.frombuffer(bytes(self._bodies), dtype=np.uint8)}
@@ -0,0 +1,174 @@
+"""Tests of the retries and the adaptive rate limit of the Fetcher, against the synthetic wiki of the benchmarks as a
+server that answers with errors.
+
+    python -m pytest test_fetcher.py
+"""
+import os
+import sys
+import unittest
+from time import monotonic
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from synthetic_wiki import SyntheticWiki, WikiServer, session_for
+
+from fetcher import Fetcher, FetchError
+from graph_core import EXPANDED, FAILED
+from wikigraph import WikiGraph
+
+WIKI = SyntheticWiki(50, 4, 'fixed', page_bytes=2000)
+URL = WIKI.url(0)
+
+
+def _fetcher(server, session=None, **kwargs):
+    # Short backoff, so that the tests do not wait for it
+    return Fetcher(session or session_for(server), **{'backoff': 0.01, 'max_backoff': 5.0, **kwargs})
+
+
+class _RaisingSession:
+    # Raises an error for the first requests of every url, like a connection that breaks off
+    def __init__(self, session, error, times) -> None:
+        self.session = session
+        self.error = error
+        self.times = times
+        self.seen = {}
+
+    def get(self, url, **kwargs):
+        self.seen[url] = self.seen.get(url, 0) + 1
+        if self.seen[url] <= self.times:
+            raise self.error('boom')
+        return self.session.get(url, **kwargs)
+
+
+class FetcherTest(unittest.TestCase):
+    def test_retries_until_success(self):
+        with WikiServer(WIKI, failures=2) as server:
+            fetcher = _fetcher(server)
+            self.assertEqual(fetcher.get(URL).status_code, 200)
+        self.assertEqual(fetcher.stats, {'requests': 3, 'retries': 2, 'throttled': 2, 'failures': 0})
+
+    def test_gives_up_after_the_retries(self):
+        with WikiServer(WIKI, failures=10, retry_after=2) as server:
+            fetcher = _fetcher(server, retries=2)
+            start = monotonic()
+            with self.assertRaises(FetchError) as raised:
+                fetcher.get(URL)
+            elapsed = monotonic() - start
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(fetcher.stats['requests'], 3)
+        self.assertEqual(fetcher.stats['failures'], 1)
+        # Retry-After is obeyed between the attempts, but there is no waiting after the last one.
+        self.assertGreaterEqual(elapsed, 4.0)
+        self.assertLess(elapsed, 5.5)
+
+    def test_broken_responses_are_retried(self):
+        for error in (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError, requests.ConnectionError):
+            with self.subTest(error=error.__name__), WikiServer(WIKI) as server:
+                fetcher = _fetcher(server, _RaisingSession(session_for(server), error, 2))
+                self.assertEqual(fetcher.get(URL).status_code, 200)
+                self.assertEqual(fetcher.stats['retries'], 2)
+
+    def test_broken_responses_fail_after_the_retries(self):
+        with WikiServer(WIKI) as server:
+            fetcher = _fetcher(server, _RaisingSession(session_for(server), requests.exceptions.ChunkedEncodingError, 10), retries=2)
+            with self.assertRaises(FetchError) as raised:
+                fetcher.get(URL)
+        self.assertIn('ChunkedEncodingError', str(raised.exception))
+        self.assertEqual(fetcher.stats['requests'], 3)
+        self.assertEqual(fetcher.stats['failures'], 1)
+
+    def test_lasting_request_errors_are_not_retried(self):
+        with WikiServer(WIKI) as server:
+            fetcher = _fetcher(server, _RaisingSession(session_for(server), requests.TooManyRedirects, 10))
+            with self.assertRaises(FetchError) as raised:
+                fetcher.get(URL)
+        self.assertIn('TooManyRedirects', str(raised.exception))
+        self.assertEqual(fetcher.stats['requests'], 1)
+
+    def test_client_errors_are_not_retried(self):
+        with WikiServer(WIKI) as server:
+            fetcher = _fetcher(server)
+            with self.assertRaises(FetchError) as raised:
+                fetcher.get(WIKI.url(0).replace('Artikel_0', 'Gibt_es_nicht'))
+        self.assertEqual(raised.exception.status, 404)
+        self.assertEqual(fetcher.stats['requests'], 1)
+
+    def test_retry_after_pauses_the_host(self):
+        with WikiServer(WIKI, error_status=429, failures=1, retry_after=1) as server:
+            fetcher = _fetcher(server)
+            start = monotonic()
+            fetcher.get(URL)
+            self.assertGreaterEqual(monotonic() - start, 1.0)
+            # The pause is one of the host, for all its pages. It is over now.
+            self.assertGreater(fetcher._host(WIKI.url(1)).paused_until, start + 1.0)
+            start = monotonic()
+            fetcher.get(URL)
+            self.assertLess(monotonic() - start, 0.5)
+        self.assertEqual(fetcher.stats['throttled'], 1)
+
+    def test_retry_after_is_capped(self):
+        with WikiServer(WIKI, error_status=429, failures=1, retry_after=3600) as server:
+            fetcher = _fetcher(server, max_backoff=0.5)
+            start = monotonic()
+            fetcher.get(URL)
+            self.assertLess(monotonic() - start, 5.0)
+
+    def test_slow_start_increases_the_rate(self):
+        with WikiServer(WIKI) as server:
+            fetcher = _fetcher(server, rate=10.0)
+            for number in range(3):
+                fetcher.get(WIKI.url(number))
+        self.assertEqual(fetcher.host_rate(URL), 13.0)
+
+    def test_errors_halve_the_rate(self):
+        with WikiServer(WIKI, failures=1) as server:
+            fetcher = _fetcher(server, rate=8.0)
+            fetcher.get(URL)
+            # Halved by the 503, then the additive increase of the successful response
+            self.assertAlmostEqual(fetcher.host_rate(URL), 4.0 + 1 / 4.0)
+            fetcher.get(WIKI.url(1))
+            self.assertGreater(fetcher.host_rate(URL), 4.25)
+            self.assertLess(fetcher.host_rate(URL), 5.0)
+
+    def test_rate_stays_within_its_bounds(self):
+        with WikiServer(WIKI, failures=1) as server:
+            fetcher = _fetcher(server, rate=1.0, min_rate=0.8, max_rate=1.2)
+            fetcher.get(URL)
+            self.assertGreaterEqual(fetcher.host_rate(URL), 0.8)
+            fetcher.get(WIKI.url(1))
+            self.assertLessEqual(fetcher.host_rate(URL), 1.2)
+
+    def test_not_adaptive(self):
+        with WikiServer(WIKI, failures=1) as server:
+            fetcher = _fetcher(server, adaptive=False)
+            fetcher.get(URL)
+        self.assertEqual(fetcher.host_rate(URL), 10.0)
+
+
+class FailedNodesTest(unittest.TestCase):
+    def test_failed_downloads_are_marked_and_retried(self):
+        # Every page fails twice, so the first attempt and its retry fail. Extending tries once more.
+        with WikiServer(WIKI, failures=2) as server:
+            graph = WikiGraph(URL, 1, 10, fetcher=_fetcher(server, retries=1))
+            self.assertEqual(graph.failed_nodes, [graph.root])
+            self.assertEqual(graph._core.expansion[graph.root._id], FAILED)
+            self.assertEqual(len(graph.nodes), 1)
+            graph.extend()
+            self.assertEqual(graph.failed_nodes, [])
+            self.assertEqual(graph._core.expansion[graph.root._id], EXPANDED)
+            self.assertEqual(len(graph.nodes), 1 + len(WIKI.links(0)))
+
+    def test_broken_responses_fail_nodes_not_the_crawl(self):
+        with WikiServer(WIKI) as server:
+            session = _RaisingSession(session_for(server), requests.exceptions.ChunkedEncodingError, 2)
+            graph = WikiGraph(URL, 2, 30, fetcher=_fetcher(server, session, retries=1))
+            self.assertEqual(graph.failed_nodes, [graph.root])
+            graph.extend()
+            # Now it is the turn of the neighbours of the root to fail.
+            self.assertEqual(graph._core.expansion[graph.root._id], EXPANDED)
+            self.assertEqual(len(graph.failed_nodes), len(WIKI.links(0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
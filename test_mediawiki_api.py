@@ -0,0 +1,130 @@
+"""Tests of the MediaWiki API backend, against the stand-in for the Action API of the synthetic wiki of the benchmarks.
+
+    python -m pytest test_mediawiki_api.py
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from synthetic_wiki import API_LIMIT, HOST, SyntheticWiki, WikiServer, session_for
+
+from fetcher import Fetcher, FetchError
+from mediawiki_api import API_PATH, MediaWikiLinkSource
+from wikigraph import WikiGraph
+
+WIKI = SyntheticWiki(300, 20, 'fixed', page_bytes=2000)
+
+
+def _links(number):
+    return {WIKI.url(target) for target in WIKI.links(number)}
+
+
+def _answers(numbers):
+    # Requests for the links of a batch, continued whenever the answer is full
+    return max(1, -(-sum(len(WIKI.links(number)) for number in numbers) // API_LIMIT))
+
+
+def _graph_state(graph):
+    core = graph._core
+    urls = core.urls
+    nodes = {urls[node_id]: (core.depths[node_id], core.expansion[node_id]) for node_id in range(len(core))}
+    sources, targets = core.edges()
+    return nodes, {(urls[source], urls[target]) for source, target in zip(sources.tolist(), targets.tolist())}
+
+
+class MediaWikiLinkSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.server = WikiServer(WIKI).start()
+        self.addCleanup(self.server.stop)
+
+    def _source(self, **kwargs):
+        return MediaWikiLinkSource(HOST + API_PATH, Fetcher(session_for(self.server), backoff=0.01), **kwargs)
+
+    def test_batches(self):
+        source = self._source(batch_size=50)
+        urls = [WIKI.url(number) for number in range(120)]
+        source.prefetch(urls)
+        self.assertEqual(source.stats['titles'], 120)
+        requests = source.stats['requests']
+        self.assertEqual(requests, _answers(range(50)) + _answers(range(50, 100)) + _answers(range(100, 120)))
+        for number, url in enumerate(urls):
+            self.assertEqual(set(source.references(url)), _links(number))
+        self.assertEqual(source.stats['requests'], requests)
+
+    def test_continuation(self):
+        source = self._source()
+        urls = [WIKI.url(number) for number in range(50)]
+        self.assertGreater(_answers(range(50)), 1)
+        source.prefetch(urls)
+        self.assertEqual(source.stats['requests'], _answers(range(50)))
+        for number, url in enumerate(urls):
+            references = source.references(url)
+            # Sorted by title, like the real API answers
+            self.assertEqual(references, sorted(references, key=lambda url: url.replace('_', ' ')))
+            self.assertEqual(set(references), _links(number))
+
+    def test_normalized_and_redirected_titles(self):
+        source = self._source()
+        normalized, redirect = f'{HOST}/wiki/artikel_3', f'{HOST}/wiki/Weiterleitung_4'
+        source.prefetch([normalized, redirect, WIKI.url(4)])
+        self.assertEqual(source.stats['requests'], 1)
+        self.assertEqual(set(source.references(normalized)), _links(3))
+        self.assertEqual(source.canonical_url(normalized), WIKI.url(3))
+        self.assertEqual(set(source.references(redirect)), _links(4))
+        self.assertEqual(source.canonical_url(redirect), WIKI.url(4))
+        self.assertEqual(set(source.references(WIKI.url(4))), _links(4))
+        self.assertIsNone(source.canonical_url(WIKI.url(4)))
+
+    def test_missing_pages_have_no_links(self):
+        source = self._source()
+        self.assertEqual(source.references(f'{HOST}/wiki/Gibt_es_nicht'), [])
+
+    def test_error_answers(self):
+        source = self._source()
+        with self.assertRaises(FetchError) as raised:
+            source._request({'action': 'parse', 'format': 'json'})
+        self.assertIn('badvalue', str(raised.exception))
+        # Too many titles per request: The batch fails, and the articles are asked for one by one.
+        source = self._source(batch_size=60)
+        with self.assertLogs(level='WARNING') as logs:
+            source.prefetch([WIKI.url(number) for number in range(60)])
+        self.assertIn('toomanyvalues', logs.output[0])
+        self.assertEqual(set(source.references(WIKI.url(7))), _links(7))
+
+    def test_answers_that_are_no_json(self):
+        source = MediaWikiLinkSource(f'{HOST}/wiki/{WIKI.title(0)}', Fetcher(session_for(self.server)))
+        with self.assertRaises(FetchError):
+            source.references(WIKI.url(1))
+
+    def test_crawl_equals_html_crawl(self):
+        # Without a limit on the nodes, the order of the links (by title in the API) does not matter.
+        html = WikiGraph(WIKI.url(0), 2, 10000, fetcher=Fetcher(session_for(self.server)))
+        api = WikiGraph(WIKI.url(0), 2, 10000, link_source=self._source())
+        self.assertGreater(len(html.nodes), 100)
+        self.assertEqual(_graph_state(api), _graph_state(html))
+
+
+    def test_nothing_is_kept_after_a_crawl(self):
+        source = self._source()
+        # The limit on the nodes stops the crawl with prefetched links of articles that are never expanded.
+        graph = WikiGraph(WIKI.url(0), 3, 40, link_source=source)
+        self.assertEqual(len(graph.nodes), 40)
+        self.assertEqual((source._links, source._canonical), ({}, {}))
+
+    def test_nothing_is_kept_after_a_path_search(self):
+        source = self._source()
+        graph = WikiGraph(WIKI.url(0), 1, 10, link_source=source)
+        backward = self._source(prop='linkshere')
+        graph.find_path(f'{HOST}/wiki/Weiterleitung_5', WIKI.url(9), backward=backward)
+        for used in (source, backward):
+            self.assertEqual((used._links, used._canonical), ({}, {}))
+        # Backwards, a redirect whose references are asked for on their own leaves nothing behind either.
+        backward.references(f'{HOST}/wiki/Weiterleitung_5')
+        self.assertEqual(backward.canonical_url(f'{HOST}/wiki/Weiterleitung_5'), WIKI.url(5))
+        graph._backward_references(backward)([f'{HOST}/wiki/Weiterleitung_6'])
+        self.assertEqual((backward._links, backward._canonical), ({}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
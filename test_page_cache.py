@@ -0,0 +1,99 @@
+"""Tests of the revalidation of cached pages, against the synthetic wiki of the benchmarks, which sends validators.
+
+    python -m pytest test_page_cache.py
+"""
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from synthetic_wiki import LAST_MODIFIED, SyntheticWiki, WikiServer, session_for
+
+from fetcher import Fetcher
+from page_cache import DiskPageCache, fetch_page
+
+WIKI = SyntheticWiki(50, 4, 'fixed', page_bytes=2000)
+URL = WIKI.url(0)
+
+
+class _RecordingSession:
+    # Remembers the status of every response and the conditional headers of every request
+    def __init__(self, session) -> None:
+        self.session = session
+        self.statuses = []
+        self.headers = []
+
+    def get(self, url, headers=None, **kwargs):
+        response = self.session.get(url, headers=headers, **kwargs)
+        self.statuses.append(response.status_code)
+        self.headers.append(dict(headers or {}))
+        return response
+
+
+class RevalidationTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self._directory.cleanup)
+        self.server = WikiServer(WIKI).start()
+        self.addCleanup(self.server.stop)
+        self.session = _RecordingSession(Fetcher(session_for(self.server)))
+
+    def test_stale_pages_are_revalidated(self):
+        # Without a ttl every page is stale right away and has to be revalidated.
+        cache = DiskPageCache(self._directory.name, ttl=0)
+        page = WIKI.page(0).encode('utf-8')
+        for _ in range(3):
+            self.assertEqual(fetch_page(URL, self.session, cache), page)
+        self.assertEqual(self.session.statuses, [200, 304, 304])
+        self.assertEqual(self.session.headers[0], {})
+        cached = cache.lookup(URL)
+        self.assertEqual(self.session.headers[1], {'If-None-Match': cached.etag, 'If-Modified-Since': LAST_MODIFIED})
+        self.assertEqual(cached.last_modified, LAST_MODIFIED)
+        self.assertEqual(len(cache), 1)
+
+    def test_revalidation_by_date(self):
+        cache = DiskPageCache(self._directory.name, ttl=0)
+        cache.store(URL, b'cached', last_modified=LAST_MODIFIED)
+        self.assertEqual(fetch_page(URL, self.session, cache), b'cached')
+        self.assertEqual(self.session.statuses, [304])
+        self.assertEqual(self.session.headers, [{'If-Modified-Since': LAST_MODIFIED}])
+
+    def test_changed_pages_are_downloaded_again(self):
+        cache = DiskPageCache(self._directory.name, ttl=0)
+        cache.store(URL, b'outdated', etag='"outdated"')
+        page = WIKI.page(0).encode('utf-8')
+        self.assertEqual(fetch_page(URL, self.session, cache), page)
+        self.assertEqual(self.session.statuses, [200])
+        self.assertEqual(cache.lookup(URL).content, page)
+
+    def test_fresh_pages_are_not_requested(self):
+        cache = DiskPageCache(self._directory.name)
+        fetch_page(URL, self.session, cache)
+        fetch_page(URL, self.session, cache)
+        self.assertEqual(self.session.statuses, [200])
+
+
+class ConcurrencyTest(unittest.TestCase):
+    def test_threads_sharing_a_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Small enough to evict while the threads store and look up pages, some of them with the same content
+            cache = DiskPageCache(directory, max_bytes=20000)
+            pages = {f'https://de.wikipedia.org/wiki/Seite_{number}': WIKI.page(number % 30).encode('utf-8') for number in range(60)}
+            def work(url):
+                cache.store(url, pages[url])
+                page = cache.lookup(url)
+                return page is None or page.content == pages[url]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                self.assertTrue(all(executor.map(work, list(pages) * 3)))
+            self.assertLessEqual(cache.size, 20000)
+            sizes = cache._connection.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+            self.assertEqual(cache.size, sizes)
+            for url, content in pages.items():
+                page = cache.lookup(url)
+                self.assertTrue(page is None or page.content == content)
+
+
+if __name__ == '__main__':
+    unittest.main()
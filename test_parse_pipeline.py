@@ -0,0 +1,44 @@
+"""Tests that extracting the references in worker processes builds the same graph as extracting them in the crawl.
+
+    python -m pytest test_parse_pipeline.py
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from synthetic_wiki import SyntheticWiki, WikiServer, session_for
+
+from fetcher import Fetcher
+from wikigraph import WikiGraph
+
+WIKI = SyntheticWiki(2000, 8, 'powerlaw', page_bytes=5000)
+
+
+def _graph_state(graph):
+    core = graph._core
+    urls = core.urls
+    nodes = {urls[node_id]: (core.depths[node_id], core.expansion[node_id]) for node_id in range(len(core))}
+    sources, targets = core.edges()
+    return nodes, {(urls[source], urls[target]) for source, target in zip(sources.tolist(), targets.tolist())}
+
+
+class ParseWorkersTest(unittest.TestCase):
+    def setUp(self):
+        self.server = WikiServer(WIKI).start()
+        self.addCleanup(self.server.stop)
+
+    def _graph(self, **kwargs):
+        # The limit on the nodes cuts the graph off in the middle of a layer, where the order of the expansions counts.
+        return WikiGraph(WIKI.url(0), 3, 120, fetcher=Fetcher(session_for(self.server)), **kwargs)
+
+    def test_same_graph_as_sequential(self):
+        sequential = _graph_state(self._graph())
+        self.assertEqual(len(sequential[0]), 120)
+        for options in ({'parse_workers': 2}, {'parse_workers': 2, 'concurrency': 8}, {'parse_workers': 2, 'eager_titles': True}):
+            with self.subTest(**options):
+                self.assertEqual(_graph_state(self._graph(**options)), sequential)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Tests of the full-text index of graphs, in particular of titles that change after they were indexed.
+
+    python -m pytest test_search_index.py
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from synthetic_wiki import HOST, SyntheticWiki, WikiServer, session_for
+
+from fetcher import Fetcher
+from search_index import SearchIndex
+from wikigraph import WikiGraph
+
+WIKI = SyntheticWiki(50, 4, 'fixed', page_bytes=2000)
+
+
+class _EditingSession:
+    # Replaces text in the pages of some urls, eg. to give them another title or canonical url
+    def __init__(self, session, edits) -> None:
+        self.session = session
+        self.edits = edits
+
+    def get(self, url, **kwargs):
+        response = self.session.get(url, **kwargs)
+        for old, new in self.edits.get(url, ()):
+            response._content = response.content.replace(old.encode('utf-8'), new.encode('utf-8'))
+        return response
+
+
+class SearchIndexTest(unittest.TestCase):
+    def test_retitled_nodes_are_indexed_anew(self):
+        titles = ['Alter Titel', 'Anderer Artikel']
+        index = SearchIndex()
+        index.add_titles(titles.__getitem__, 2)
+        self.assertEqual(index.search('titel').tolist(), [0])
+        index.retitle(0, [titles[0]])
+        titles[0] = 'Neuer Name'
+        index.add_titles(titles.__getitem__, 2)
+        self.assertEqual(index.search('titel').tolist(), [])
+        self.assertEqual(index.search('neuer').tolist(), [0])
+        self.assertEqual(index.search('anderer').tolist(), [1])
+
+    def test_retitled_nodes_of_loaded_indexes(self):
+        titles = ['Alter Titel', 'Anderer Titel']
+        index = SearchIndex()
+        index.add_titles(titles.__getitem__, 2)
+        arrays = index.arrays()
+        index = SearchIndex.from_arrays(arrays['title'], arrays['body'], arrays['bodies'], 2)
+        index.retitle(1, [titles[1]])
+        titles[1] = 'Neuer Name'
+        index.add_titles(titles.__getitem__, 2)
+        self.assertEqual(index.search('titel').tolist(), [0])
+        self.assertEqual(index.search('name').tolist(), [1])
+
+    def test_nodes_not_indexed_yet_need_no_marks(self):
+        index = SearchIndex()
+        index.retitle(0, ['Alter Titel'])
+        index.add_titles(lambda node_id: 'Neuer Name', 1)
+        self.assertEqual(index.search('titel').tolist(), [])
+        self.assertEqual(index.search('name').tolist(), [0])
+
+
+class GraphTitlesTest(unittest.TestCase):
+    def test_titles_that_change_after_searching(self):
+        first, second = WIKI.links(0)[:2]
+        edits = {
+            # The page states another title than its url
+            WIKI.url(first): [(f'<span class="mw-page-title-main">Artikel {first}</span>',
+                               '<span class="mw-page-title-main">Umbenannter Artikel</span>')],
+            # The page was moved: It states another url as its canonical one, to which its node is renamed, and its title
+            WIKI.url(second): [(f'<link rel="canonical" href="{WIKI.url(second)}">', f'<link rel="canonical" href="{HOST}/wiki/Verschoben">'),
+                               (f'<span class="mw-page-title-main">Artikel {second}</span>', '<span class="mw-page-title-main">Verschoben</span>')],
+        }
+        with WikiServer(WIKI) as server:
+            session = _EditingSession(session_for(server), {})
+            graph = WikiGraph(WIKI.url(0), 1, 1000, search_index=True, fetcher=Fetcher(session, backoff=0.01))
+            # Indexes the titles of the unexpanded neighbours of the root, as they are derived from their urls
+            self.assertEqual([node.article.url for node in graph.search(f'Artikel {first}', html=False)], [WIKI.url(first)])
+            session.edits.update(edits)
+            graph.extend(2)
+        self.assertEqual([node.article.url for node in graph.search('Umbenannter Artikel', html=False)], [WIKI.url(first)])
+        self.assertEqual(graph.search(f'Artikel {first}', html=False), [])
+        self.assertEqual([graph._core.urls[node._id] for node in graph.search('Verschoben', html=False)], [f'{HOST}/wiki/Verschoben'])
+        self.assertEqual(graph.search(f'Artikel {second}', html=False), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
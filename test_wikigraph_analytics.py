@@ -0,0 +1,43 @@
+"""Tests of the graph analytics on graphs with tombstones of merged nodes.
+
+    python -m pytest test_wikigraph_analytics.py
+"""
+import unittest
+
+from graph_core import GraphCore
+from wikigraph_analytics import GraphAnalytics
+
+
+def _core():
+    # 3 is a redirect to 2 and merged into it, which leaves 0 -> 1, 0 -> 2, 1 -> 2 and 2 -> 0
+    core = GraphCore()
+    for number in range(4):
+        core.add_node(f'https://de.wikipedia.org/wiki/Artikel_{number}', 0)
+    core.add_edges(0, [1, 3])
+    core.add_edges(1, [2])
+    core.add_edges(3, [0])
+    core.merge(3, 2)
+    core.compact()
+    return core
+
+
+class TombstonesTest(unittest.TestCase):
+    def test_degree_histogram(self):
+        analytics = GraphAnalytics(_core())
+        self.assertEqual(analytics.degree_histogram('out').tolist(), [0, 2, 1])
+        self.assertEqual(analytics.degree_histogram('in').tolist(), [0, 2, 1])
+
+    def test_strongly_connected_components(self):
+        count, labels = GraphAnalytics(_core()).strongly_connected_components()
+        self.assertEqual(count, 1)
+        self.assertEqual(labels.tolist(), [0, 0, 0, -1])
+
+    def test_rankings(self):
+        analytics = GraphAnalytics(_core())
+        self.assertEqual(analytics.pagerank()[3], 0)
+        self.assertAlmostEqual(analytics.pagerank().sum(), 1)
+        self.assertNotIn(3, analytics.top_k('pagerank', 4).tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Tests of writing binary graph files.
+
+    python -m pytest test_wikigraph_format.py
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from wikigraph_format import GraphFile, write_sections
+
+
+def _write(writer):
+    writer.write('indptr', np.zeros(2, dtype=np.int64))
+
+
+class WriteSectionsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'g.wgraph')
+
+    def test_failures_leave_no_file_behind(self):
+        def failing(writer):
+            _write(writer)
+            raise OSError(28, 'No space left on device')
+        with self.assertRaises(OSError):
+            write_sections(self.path, 'https://de.wikipedia.org/wiki/A', 0, 1, 0, {}, failing)
+        self.assertEqual(os.listdir(self.directory), [])
+        # The next attempt is not blocked by the failed one.
+        write_sections(self.path, 'https://de.wikipedia.org/wiki/A', 0, 1, 0, {}, _write)
+        self.assertEqual(os.listdir(self.directory), ['g.wgraph'])
+        self.assertEqual(GraphFile(self.path).header['root'], 'https://de.wikipedia.org/wiki/A')
+
+    def test_header_too_large(self):
+        with self.assertRaises(ValueError):
+            write_sections(self.path, 'https://de.wikipedia.org/wiki/A', 0, 1, 0, {'x': 'x' * 10 ** 7}, _write)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_no_overwriting(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'other')
+        with self.assertRaises(FileExistsError):
+            write_sections(self.path, 'https://de.wikipedia.org/wiki/A', 0, 1, 0, {}, _write)
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), b'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,11 @@
-import requests
 import re
 import time
+from urllib.parse import unquote
 
 from reference_extractors.german_wiki_article_extractor import GermanWikipediaArticleReferenceExtractor
-from reference_extractors.reference_extractor import ReferenceExtractor
+from reference_extractors.reference_extractor import ExtractionResult, ReferenceExtractor
+from page_cache import PageCache, fetch_page
+from wikigraph_metrics import REGISTRY
 
 class WikiArticle:
     '''
@@ -13,22 +15,147 @@ class WikiArticle:
     # Vision for Extension: Implement static factory method that selects the appropriate extractor for an Article based on url.
     # Eg: de.wikipedia.org/* -> German extractor
     # en.wikipedia.org/* -> English extractor
-    def __init__(self, url, reference_extractor: ReferenceExtractor = GermanWikipediaArticleReferenceExtractor(), session = None) -> None:
-        """Initializes the WikiArticle
+
+    # Class level defaults, so that articles from older pickles also know that they have no cache.
+    page_cache: PageCache = None
+    # Anything with a get(url) method returning stored html or None. Consulted before downloading.
+    html_store = None
+    # Called with url and html of every downloaded page, eg. to index it for searching.
+    html_listener = None
+
+    def __init__(self, url, reference_extractor: ReferenceExtractor = GermanWikipediaArticleReferenceExtractor(), session = None, page_cache: PageCache = None, eager_title: bool = False, title: str = None) -> None:
+        """Initializes the WikiArticle. Nothing is downloaded, unless eager_title is set. Until the page is downloaded,
+        the title is derived from the url.
 
         Args:
             url (str): Url to the represented wikipedia article
             session (requests.Session, optional): Optional: The Request Session within which the articles contents are retrieved. Accelarates mass creation of WikiArticle objects. Defaults to None.
+            page_cache (PageCache, optional): Cache in which downloaded pages are kept, so they do not have to be downloaded again. Defaults to None.
+            eager_title (bool, optional): Download the page right away, to know the title as the page states it. Defaults to False.
+            title (str, optional): Title of the article, if it is already known from elsewhere. Defaults to None.
         """
         self.__session = session
         self.__reference_extractor = reference_extractor
+        self.page_cache = page_cache
         self.url = url
-        if not url.startswith("https://"):
+        # Plain http is accepted for local stand-ins of wikipedia.
+        if not url.startswith(("https://", "http://")):
             raise ValueError(f'Article creation with Schema-less url: {url} was attempted.')
-        # Filling the html cache. Needs to be initialized, as html method is accessing it.
-        self.__html_cache = None
-        self.__html_cache = self.html      
-        self.title = re.search(r'<h1 id="firstHeading" .*?>(.*?)</h1>', self.html).group(1)
+        # References found while resolving the title, kept until they are requested.
+        self.__extracted_references = None
+        self._title = title
+        # Url that the page states as its own, once it is downloaded
+        self._canonical = None
+        if eager_title:
+            self.resolve_title()
+
+    def __getstate__(self):
+        # Html stores and listeners belong to the graph the article is used in, not to the article.
+        state = self.__dict__.copy()
+        state.pop('html_store', None)
+        state.pop('html_listener', None)
+        return state
+
+    def __setstate__(self, state):
+        # Articles from older pickles had the title as plain attribute, which is now hidden behind the property.
+        if 'title' in state:
+            state['_title'] = state.pop('title')
+        state.setdefault('_title', None)
+        state.setdefault('_WikiArticle__extracted_references', None)
+        state.setdefault('_canonical', None)
+        self.__dict__.update(state)
+
+    @property
+    def title(self):
+        """Title of the article. As long as the page has not been downloaded, it is taken from the url.
+
+        Returns:
+            str: title of the article
+        """
+        if self._title is None:
+            return self.title_from_url(self.url)
+        return self._title
+
+    @staticmethod
+    def title_from_url(url):
+        """
+        Returns:
+            str: title of an article as derived from its url
+        """
+        return unquote(url.rsplit('/wiki/', 1)[-1]).replace('_', ' ')
+
+    @property
+    def resolved_title(self):
+        """
+        Returns:
+            str | None: Title as stated on the page itself, or None if the page has not been downloaded yet.
+        """
+        return self._title
+
+    def resolve_title(self):
+        """Downloads the page (if that has not happened yet) to know the title as stated on the page itself.
+
+        Returns:
+            str: title of the article
+        """
+        if self._title is None:
+            # The references are found in the same pass and kept, as it is more than likely that they are requested next.
+            self.__extracted_references = self._extract(self.html)
+        return self.title
+
+    def _extract(self, html):
+        start = time.perf_counter()
+        result = self.extract_page(self.__reference_extractor, html)
+        REGISTRY.histogram('wikigraph_extraction_seconds').observe(time.perf_counter() - start)
+        return self.apply_extraction(result)
+
+    @staticmethod
+    def extract_page(reference_extractor: ReferenceExtractor, html: str) -> ExtractionResult:
+        """Title and references of a page in one pass over it. Needs no article, so it can run in other processes.
+
+        Returns:
+            ExtractionResult: title (None if there is none on the page) and references
+        """
+        result = reference_extractor.extract(html)
+        if result.title is None:
+            result = result._replace(title=WikiArticle._title_from_html(html))
+        return result
+
+    def apply_extraction(self, result: ExtractionResult):
+        """Takes over title and canonical url from the extraction of the page of this article, which may have happened elsewhere.
+
+        Returns:
+            list[str]: the references of the extraction
+        """
+        if self._title is None:
+            self._title = result.title
+        if result.canonical is not None:
+            self._canonical = result.canonical
+        return result.references
+
+    @property
+    def canonical_url(self):
+        """
+        Returns:
+            str | None: Url that the page states as its own (for redirects, the url of the article they lead to), or None if
+                the page has not been downloaded yet or states none.
+        """
+        return self._canonical
+
+    @property
+    def reference_extractor(self) -> ReferenceExtractor:
+        return self.__reference_extractor
+
+    @property
+    def references_known(self) -> bool:
+        """Whether the references were extracted already (eg. while resolving the title), so requesting them downloads nothing."""
+        return self.__extracted_references is not None
+
+    @staticmethod
+    def _title_from_html(html):
+        # Fallback for extractors that do not look for the title themselves.
+        match = re.search(r'<h1 id="firstHeading" .*?>(.*?)</h1>', html)
+        return match.group(1) if match else None
     @property
     def html(self):
         """Html of the article page
@@ -36,13 +163,20 @@ class WikiArticle:
         Returns:
             str: Html of the wikipedia page
         """                                                                                                                                         
-        if self.__html_cache:
-            return self.__html_cache
-        elif self.__session != None:
-            response = self.__session.get(self.url)
+        if self.html_store is not None:
+            html = self.html_store.get(self.url)
+            if html is not None:
+                return html
+        # Without a session, the module level functions of requests do the job.
+        if self.__session != None:
+            getter = self.__session
         else:
-            response = requests.get(self.url)
-        return response.content.decode("UTF_8")
+            import requests
+            getter = requests
+        html = fetch_page(self.url, getter, self.page_cache).decode("UTF_8")
+        if self.html_listener is not None:
+            self.html_listener(self.url, html)
+        return html
     @property
     def references(self):
         """Contains all references, attemptedly filtered to only include references to articles.
@@ -50,12 +184,13 @@ class WikiArticle:
         Returns:
             list[str]: reference urls to wikipedia articles referenced within this one.
         """
-        html = self.html
-        # Apply the Reference extractor to the html.
-        references = self.__reference_extractor(html)
-        # In the graph creation process, this is the last time that html is needed. Therefore, the cache is dropped.
-        self.__html_cache = None
-        return references
+        if self.__extracted_references is not None:
+            references, self.__extracted_references = self.__extracted_references, None
+            return references
+        # Apply the Reference extractor to the html. The title comes for free.
+        # In the graph creation process, this is the last time that html is needed. Therefore, it is not kept.
+        # If the page is needed again later on, the page cache (if there is one) spares us the download.
+        return self._extract(self.html)
     
     def __eq__(self, __o: object) -> bool:
         return isinstance(__o, WikiArticle) and self.url == __o.url
@@ -63,15 +198,3 @@ class WikiArticle:
         return not self == __o
     def __str__(self) -> str:
         return f'<WikiArticle: title = {self.title}; url= {self.url}> '
-if __name__ == "__main__":
-    """Test is run if the module is executed.
-    """
-    session = requests.Session()
-    article =WikiArticle("https://de.wikipedia.org/wiki/Harry_Potter_%28Filmreihe%29", session=session)
-    start = time.time()
-    references = article.references
-    for reference in article.references:
-        WikiArticle(reference, session)
-    ex_time = time.time() - start
-    print(f"took {ex_time} to get {len(references)} refs and create articles.")
-    
\ No newline at end of file
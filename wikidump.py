@@ -0,0 +1,403 @@
+"""Building WikiGraphs offline from Wikipedia dump files instead of crawling over HTTP.
+
+Supported are the pages-articles XML dumps and the SQL dumps of the page, pagelinks, linktarget and redirect tables,
+plain or compressed with bz2 or gzip. Dumps are streamed into a DumpLinkIndex, a sqlite database on disk, so even
+multi-GB dumps are imported in bounded memory. The index then answers which articles an article references, which is
+all a WikiGraph needs (see DumpLinkSource).
+
+Links are filtered like GermanWikipediaArticleReferenceExtractor filters them: Links into its excluded namespaces,
+interwiki links and links to pages that do not exist (red links) are dropped. Unlike on a rendered page, links that
+only come from templates are not part of the wikitext, and therefore missing.
+"""
+import bz2
+import gzip
+import os
+import re
+import sqlite3
+import threading
+import xml.etree.ElementTree as ElementTree
+from html import unescape
+from urllib.parse import quote, unquote
+
+from link_source import LinkSource
+from reference_extractors.german_wiki_article_extractor import GermanWikipediaArticleReferenceExtractor
+
+HOST = GermanWikipediaArticleReferenceExtractor.HOST
+
+# Namespaces of the german Wikipedia, for SQL dumps which only contain their numbers.
+# XML dumps bring their own list in the siteinfo.
+GERMAN_NAMESPACES = {
+    -2: 'Medium', -1: 'Spezial', 0: '', 1: 'Diskussion', 2: 'Benutzer', 3: 'Benutzer Diskussion', 4: 'Wikipedia',
+    5: 'Wikipedia Diskussion', 6: 'Datei', 7: 'Datei Diskussion', 8: 'MediaWiki', 9: 'MediaWiki Diskussion',
+    10: 'Vorlage', 11: 'Vorlage Diskussion', 12: 'Hilfe', 13: 'Hilfe Diskussion', 14: 'Kategorie',
+    15: 'Kategorie Diskussion', 100: 'Portal', 101: 'Portal Diskussion',
+}
+# Alternative names under which MediaWiki accepts namespaces in links. They end up as the canonical name in the url.
+NAMESPACE_ALIASES = {'bild': 'Datei', 'image': 'Datei', 'file': 'Datei', 'media': 'Medium', 'category': 'Kategorie',
+                     'special': 'Spezial', 'wp': 'Wikipedia', 'project': 'Wikipedia', 'help': 'Hilfe', 'user': 'Benutzer',
+                     'template': 'Vorlage', 'talk': 'Diskussion'}
+# Medium links point to the file itself on the upload server, not to a /wiki/ page.
+EXCLUDED_NAMESPACES = GermanWikipediaArticleReferenceExtractor.EXCLUDED_NAMESPACES | {'Medium'}
+# Interwiki and language prefixes are lower case (en:, wikt:, commons:), namespace names are not.
+_INTERWIKI = re.compile(r'^[a-z][a-z0-9-]*$')
+# Everything up to the first |, # or ] of a link. Unclosed brackets are ignored, nested links (eg. in image captions) are found.
+_WIKILINK = re.compile(r'\[\[([^\[\]\|#\n]*)')
+_WHITESPACE = re.compile(r'[\s_]+')
+
+
+def open_dump(path: str):
+    """Opens a dump file for binary streaming, decompressing it on the fly according to its extension."""
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def title_to_url(title: str, host: str = HOST) -> str:
+    """
+    Returns:
+        str: url of the article with this title, encoded like MediaWiki encodes its links.
+    """
+    return f"{host}/wiki/{quote(title.replace(' ', '_'), safe=';@$!*(),/~:')}"
+
+
+def url_to_title(url: str) -> str:
+    """
+    Returns:
+        str: title of the article at this url
+    """
+    return unquote(url.rsplit('/wiki/', 1)[-1]).replace('_', ' ')
+
+
+def _upper_first(text):
+    return text[:1].upper() + text[1:]
+
+
+class _Namespaces:
+    """Maps namespace prefixes of titles to their canonical names."""
+    def __init__(self, names: dict) -> None:
+        self.names = dict(names)
+        self._by_lower = {name.lower(): name for name in self.names.values() if name}
+        for alias, name in NAMESPACE_ALIASES.items():
+            self._by_lower.setdefault(alias, name)
+
+    def full_title(self, namespace: int, title: str) -> str:
+        name = self.names.get(namespace, '')
+        title = title.replace('_', ' ')
+        return f'{name}:{title}' if name else title
+
+    def normalize(self, raw: str):
+        """Normalizes the target of a wikitext link into a full title.
+
+        Returns:
+            str | None: The title, or None if the link does not lead to a page within the wiki.
+        """
+        title = _WHITESPACE.sub(' ', unescape(raw)).strip().lstrip(':').strip()
+        if not title:
+            return None
+        prefix, colon, rest = title.partition(':')
+        if colon:
+            name = self._by_lower.get(prefix.strip().lower())
+            if name is not None:
+                rest = rest.strip()
+                return f'{name}:{_upper_first(rest)}' if rest else None
+            if _INTERWIKI.match(prefix):
+                return None
+        return _upper_first(title)
+
+    @staticmethod
+    def is_excluded(title: str) -> bool:
+        prefix, colon, _ = title.partition(':')
+        return bool(colon) and prefix in EXCLUDED_NAMESPACES
+
+
+def iter_xml_pages(path: str):
+    """Streams the pages of a pages-articles XML dump. Elements are dropped as soon as they are read.
+
+    Yields:
+        tuple: (page id, namespace, full title, redirect target or None, wikitext, namespace names)
+    """
+    names = dict(GERMAN_NAMESPACES)
+    with open_dump(path) as file:
+        context = ElementTree.iterparse(file, events=('start', 'end'))
+        root = None
+        for event, element in context:
+            tag = element.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+            if tag == 'namespace':
+                names[int(element.get('key'))] = element.text or ''
+            elif tag == 'page':
+                fields = {child.tag.rsplit('}', 1)[-1]: child for child in element}
+                redirect = fields.get('redirect')
+                text = None
+                revision = fields.get('revision')
+                if revision is not None:
+                    for child in revision:
+                        if child.tag.endswith('text'):
+                            text = child.text
+                yield (int(fields['id'].text), int(fields['ns'].text), fields['title'].text,
+                       redirect.get('title') if redirect is not None else None, text or '', names)
+                # Without this, the tree would keep every page read so far.
+                root.clear()
+
+
+# MySQL INSERT statements: tuples of quoted strings, numbers and NULL.
+_SQL_TUPLE = re.compile(r"\(((?:'(?:[^'\\]|\\.)*'|[^'()])*)\)", re.DOTALL)
+_SQL_VALUE = re.compile(r"'((?:[^'\\]|\\.)*)'|(NULL)|([^,\s]+)", re.DOTALL)
+_SQL_ESCAPE = re.compile(r'\\(.)', re.DOTALL)
+_SQL_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0', 'Z': '\x1a'}
+_SQL_CREATE = re.compile(r'CREATE TABLE `(\w+)`')
+_SQL_COLUMN = re.compile(r'^\s+`(\w+)`')
+
+
+def _sql_value(match):
+    string, null, other = match.groups()
+    if string is not None:
+        return _SQL_ESCAPE.sub(lambda escape: _SQL_ESCAPES.get(escape.group(1), escape.group(1)), string)
+    if null is not None:
+        return None
+    return int(other) if other.lstrip('-').isdigit() else other
+
+
+def iter_sql_rows(path: str):
+    """Streams the rows of a MySQL table dump, one INSERT statement (line) at a time.
+
+    Yields:
+        tuple[str, dict]: name of the table and the row by column name
+    """
+    table, columns = None, []
+    with open_dump(path) as file:
+        for raw_line in file:
+            line = raw_line.decode('utf-8', errors='replace')
+            if line.startswith('INSERT INTO'):
+                for values in _SQL_TUPLE.finditer(line):
+                    row = [_sql_value(value) for value in _SQL_VALUE.finditer(values.group(1))]
+                    yield table, dict(zip(columns, row))
+            elif line.startswith('CREATE TABLE'):
+                table, columns = _SQL_CREATE.match(line).group(1), []
+            elif table is not None:
+                # Keys of the CREATE TABLE statement start with a keyword, not with a backticked column name.
+                column = _SQL_COLUMN.match(line)
+                if column:
+                    columns.append(column.group(1))
+
+
+class DumpLinkIndex:
+    """Sqlite index of the pages and links of Wikipedia dumps. Lives on disk, so its size is not bounded by memory."""
+    _BATCH = 10000
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): path of the sqlite database. Is created if it does not exist.
+        """
+        self.path = path
+        # Crawls with concurrency ask from several threads.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._connection.executescript('''
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY, namespace INTEGER NOT NULL, title TEXT NOT NULL, redirect TEXT,
+                                              is_redirect INTEGER NOT NULL DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS links (source INTEGER NOT NULL, target TEXT, target_id INTEGER);
+            CREATE TABLE IF NOT EXISTS linktargets (id INTEGER PRIMARY KEY, title TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS redirects (id INTEGER PRIMARY KEY, target TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS imported (path TEXT PRIMARY KEY);
+        ''')
+        # Indexes of earlier versions
+        if 'is_redirect' not in {row[1] for row in self._connection.execute('PRAGMA table_info(pages)')}:
+            self._connection.execute('ALTER TABLE pages ADD COLUMN is_redirect INTEGER NOT NULL DEFAULT 0')
+            self._connection.execute('UPDATE pages SET is_redirect = 1 WHERE redirect IS NOT NULL')
+            self._connection.commit()
+        self._namespaces = _Namespaces(GERMAN_NAMESPACES)
+
+    def is_imported(self, path: str) -> bool:
+        return self._connection.execute('SELECT 1 FROM imported WHERE path = ?', (os.path.abspath(path),)).fetchone() is not None
+
+    def add_dump(self, path: str):
+        """Imports an XML or SQL dump (recognized by its name), unless it has been imported before."""
+        if self.is_imported(path):
+            return
+        name = os.path.basename(path)
+        if '.sql' in name:
+            self._add_sql_dump(path)
+        else:
+            self._add_xml_dump(path)
+        with self._connection:
+            # Redirect targets are applied after every import, as the redirect dump may come before or after the page dump.
+            self._connection.execute('''
+                UPDATE pages SET redirect = (SELECT target FROM redirects WHERE redirects.id = pages.id), is_redirect = 1
+                WHERE redirect IS NULL AND id IN (SELECT id FROM redirects)''')
+            self._connection.execute('INSERT INTO imported (path) VALUES (?)', (os.path.abspath(path),))
+            self._connection.execute('CREATE INDEX IF NOT EXISTS links_by_source ON links (source)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS pages_by_title ON pages (title)')
+
+    def _flush(self, pages, links):
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO pages (id, namespace, title, redirect, is_redirect) VALUES (?, ?, ?, ?, ?)', pages)
+            self._connection.executemany('INSERT INTO links (source, target, target_id) VALUES (?, ?, ?)', links)
+        pages.clear()
+        links.clear()
+
+    def _add_xml_dump(self, path):
+        pages, links = [], []
+        namespaces = None
+        for page_id, namespace, title, redirect, text, names in iter_xml_pages(path):
+            if namespaces is None or namespaces.names is not names:
+                namespaces = self._namespaces = _Namespaces(names)
+            redirect = namespaces.normalize(redirect) if redirect else None
+            pages.append((page_id, namespace, title, redirect, redirect is not None))
+            if redirect is None:
+                seen = set()
+                for raw in _WIKILINK.findall(text):
+                    target = namespaces.normalize(raw)
+                    if target is not None and target not in seen and not namespaces.is_excluded(target):
+                        seen.add(target)
+                        links.append((page_id, target, None))
+            if len(links) >= self._BATCH or len(pages) >= self._BATCH:
+                self._flush(pages, links)
+        self._flush(pages, links)
+
+    def _add_sql_dump(self, path):
+        pages, links, targets, redirects = [], [], [], []
+        namespaces = self._namespaces
+        def flush():
+            self._flush(pages, links)
+            with self._connection:
+                self._connection.executemany('INSERT OR REPLACE INTO linktargets (id, title) VALUES (?, ?)', targets)
+                self._connection.executemany('INSERT OR REPLACE INTO redirects (id, target) VALUES (?, ?)', redirects)
+            targets.clear()
+            redirects.clear()
+        for table, row in iter_sql_rows(path):
+            if table == 'page':
+                pages.append((row['page_id'], row['page_namespace'], namespaces.full_title(row['page_namespace'], row['page_title']), None,
+                              bool(row.get('page_is_redirect'))))
+            elif table == 'pagelinks':
+                if 'pl_target_id' in row:
+                    links.append((row['pl_from'], None, row['pl_target_id']))
+                else:
+                    target = namespaces.full_title(row['pl_namespace'], row['pl_title'])
+                    if not namespaces.is_excluded(target):
+                        links.append((row['pl_from'], target, None))
+            elif table == 'linktarget':
+                target = namespaces.full_title(row['lt_namespace'], row['lt_title'])
+                if not namespaces.is_excluded(target):
+                    targets.append((row['lt_id'], target))
+            elif table == 'redirect':
+                redirects.append((row['rd_from'], namespaces.full_title(row['rd_namespace'], row['rd_title'])))
+            if len(pages) + len(links) + len(targets) + len(redirects) >= self._BATCH:
+                flush()
+        flush()
+
+    def page(self, title: str):
+        """
+        Returns:
+            tuple | None: (id, namespace, redirect target or None, whether the page is a redirect) of the page with this title,
+                None if there is none. Redirects can lack a target when the redirect dump is not imported.
+        """
+        return self._connection.execute('SELECT id, namespace, redirect, is_redirect FROM pages WHERE title = ?', (title,)).fetchone()
+
+    def resolve(self, title: str, max_hops: int = 5):
+        """Follows redirects from a title.
+
+        Returns:
+            tuple | None: (id, namespace, title) of the page the title leads to, None if it leads nowhere.
+        """
+        for _ in range(max_hops):
+            page = self.page(title)
+            if page is None:
+                return None
+            if page[2] is None:
+                # A redirect of unknown target is no article either.
+                return None if page[3] else (page[0], page[1], title)
+            title = page[2]
+        return None
+
+    def links(self, page_id: int) -> list:
+        """
+        Returns:
+            list[str]: titles of the existing pages that a page links to, in the order of the dump.
+        """
+        with self._lock:
+            return self._links(page_id)
+
+    def _links(self, page_id):
+        rows = self._connection.execute('''
+            SELECT COALESCE(links.target, linktargets.title) AS title FROM links
+            LEFT JOIN linktargets ON linktargets.id = links.target_id
+            WHERE links.source = ? ORDER BY links.rowid''', (page_id,))
+        titles = []
+        seen = set()
+        for (title,) in rows:
+            if title is not None and title not in seen:
+                seen.add(title)
+                titles.append(title)
+        # Red links are not links on a rendered page. Looked up in one go.
+        existing = set()
+        for start in range(0, len(titles), 500):
+            chunk = titles[start:start + 500]
+            existing.update(row[0] for row in self._connection.execute(
+                f'SELECT title FROM pages WHERE title IN ({",".join("?" * len(chunk))})', chunk))
+        return [title for title in titles if title in existing]
+
+    def pages(self, namespace: int = 0):
+        """
+        Yields:
+            tuple[int, str]: id and title of every page of the namespace that is no redirect
+        """
+        yield from self._connection.execute('SELECT id, title FROM pages WHERE namespace = ? AND NOT is_redirect ORDER BY id', (namespace,))
+
+    def close(self):
+        self._connection.close()
+
+
+class DumpLinkSource(LinkSource):
+    """Link source (see WikiGraph) that answers from a DumpLinkIndex instead of downloading articles.
+    Redirect pages have the references of the article they redirect to, as they would when downloaded.
+    """
+    def __init__(self, index: DumpLinkIndex, host: str = HOST) -> None:
+        self.index = index
+        self.host = host
+
+    def references(self, url):
+        with self.index._lock:
+            page = self.index.resolve(url_to_title(url))
+        if page is None:
+            return []
+        return [title_to_url(title, self.host) for title in self.index.links(page[0])]
+
+    def canonical_url(self, url):
+        # Redirects of the dump lead to the article, so that they are merged into its node like downloaded ones.
+        title = url_to_title(url)
+        with self.index._lock:
+            page = self.index.resolve(title)
+        if page is None or page[2] == title:
+            return None
+        return title_to_url(page[2], self.host)
+
+    def close(self):
+        self.index.close()
+
+
+def open_index(dumps, index_path: str = None) -> DumpLinkIndex:
+    """Opens the index for a set of dumps, importing those that are not in it yet.
+
+    Args:
+        dumps (Iterable[str]): paths of XML or SQL dumps
+        index_path (str, optional): path of the sqlite index. Defaults to None, next to the first dump.
+
+    Returns:
+        DumpLinkIndex: index containing all the dumps
+    """
+    dumps = list(dumps)
+    index = DumpLinkIndex(index_path or f'{dumps[0]}.index.sqlite3')
+    for dump in dumps:
+        if not index.is_imported(dump):
+            print(f'Importing {dump} into {index.path}...')
+            index.add_dump(dump)
+    return index
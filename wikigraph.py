@@ -1,17 +1,37 @@
 import wikiarticle
 import pickle
 import logging
-from time import time
-from pyvis.network import Network
-import requests
-import networkx as nx
-from wikigraph_misc import debug_timing
+from time import monotonic
+import numpy as np
+from array import array
+from collections import Counter, deque
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from wikigraph_misc import debug_timing, ordered_prefetch
+from wikigraph_metrics import REGISTRY as METRICS
+from wikigraph_progress import Progress, ProgressReporter, ConsoleProgress, nodes_per_second
+from graph_core import GraphCore, NOT_EXPANDED, EXPANDED, PARTIALLY_EXPANDED, FAILED, MERGED
+from checkpoint import CheckpointWriter, read_checkpoint
+import wikigraph_format
+import wikidump
+from fetcher import Fetcher, FetchError
+import wikigraph_analytics
+import wikigraph_export
+import wikigraph_draw
+from search_index import SearchIndex
+from html_store import HtmlStore, make_html_store
+from link_source import LinkSource
+from wikiurl import canonical_url
+from frontier import Frontier, BreadthFirstFrontier
+from parse_pipeline import ParsePipeline
+from path_finder import PathFinder
 
 class WikiNode:
-    """Representation of a Node within a graph of referencing wikipedia articles
+    """Representation of a Node within a graph of referencing wikipedia articles.
+    The node itself is only a view on an id within a GraphCore, where articles, depths and edges are stored.
     """
     def __init__(self, article, depth, session = None) -> None:
-        """Initializes a wikipedia node
+        """Initializes a wikipedia node, which is not part of a graph yet.
 
         Args:
             article (str | WikiArticle): The url to a wikpedia article, or an WikiArticle object wrapping one
@@ -22,17 +42,51 @@ class WikiNode:
             TypeError: The wikiarticle parameter is no url or WikiArticle object.
         """
         if type(article) == str: #Can init with url
-            self.article = wikiarticle.WikiArticle(article, session=session)
-        elif type(article) == wikiarticle.WikiArticle:
-            self.article = article
-        else:
+            article = wikiarticle.WikiArticle(article, session=session)
+        elif type(article) != wikiarticle.WikiArticle:
             raise TypeError('Can only initialize with url or WikiArticle object.')
-        self._outgoing = set()
-        self._incoming = set()
-        # Consideration: Add field of the graph itself to allow node-function of gathering adjacencies
-        # For now, adjacencies need to be added externally.
+        # A node on its own lives in a core of its own. Edges can only be added between nodes of the same core.
+        self._core = GraphCore()
+        self._id = self._core.add_node(article.url, depth, article)
+
+    @classmethod
+    def _view(cls, core: GraphCore, node_id: int):
+        node = cls.__new__(cls)
+        node._core = core
+        node._id = node_id
+        return node
+
+    def __setstate__(self, state):
+        # Nodes from older pickles carried their article, depth and edge sets themselves.
+        # They are kept aside until the WikiGraph they belong to converts them.
+        if '_core' not in state:
+            self._legacy = state
+        else:
+            self.__dict__.update(state)
+
+    @property
+    def article(self):
+        """
+        Returns:
+            WikiArticle: The article wrapped by the node
+        """
+        return self._core.article(self._id)
+
+    @property
+    def depth(self):
+        """
+        Returns:
+            int: Depth in which the node is located within the Graph.
+        """
+        return int(self._core.depths[self._id])
+
+    @depth.setter
+    def depth(self, depth):
+        self._core.set_depth(self._id, depth)
 
-        self.depth = depth
+    def _same_core(self, other):
+        if other._core is not self._core:
+            raise ValueError('Edges can only be added between nodes of the same graph.')
 
     def add_outgoing_reference(self, referenced_node):
         """Adds a directed edge from the node to another, ensuring that the other node is aware of this new incoming edge.
@@ -40,8 +94,8 @@ class WikiNode:
         Args:
             referenced_node (WikiNode): The node to which the edge should be directed.
         """ 
-        self._outgoing.add(referenced_node)
-        referenced_node._incoming.add(self)
+        self._same_core(referenced_node)
+        self._core.add_edge(self._id, referenced_node._id)
     
     def add_incoming_reference(self, referencing_node):
         """Adds a directed edge from another node to this one, ensuring that the other node is aware of this new outgoing edge.
@@ -49,8 +103,8 @@ class WikiNode:
         Args:
             referencing_node (WikiNode): The node from which the edge should be incoming.
         """
-        self._incoming.add(referencing_node)
-        referencing_node._outgoing.add(self)
+        self._same_core(referencing_node)
+        self._core.add_edge(referencing_node._id, self._id)
 
     @property
     def out_degree(self):
@@ -59,7 +113,7 @@ class WikiNode:
         Returns:
             int: out degree of the node
         """                 
-        return len(self._outgoing)
+        return self._core.out_degree(self._id)
 
     @property
     def in_degree(self):
@@ -68,78 +122,511 @@ class WikiNode:
         Returns:
             int: in degree of the node
         """                 
-        return len(self._incoming)
+        return self._core.in_degree(self._id)
 
-    #These are returning tuple versions to prevent editing of the set.
+    #These are returning tuple versions to prevent editing of the graph.
     @property
     def referencing_nodes(self):
         """
         Returns:
-            referenced nodes: nodes that are connected to this one by outgoing edges
+            referencing nodes: nodes that are connected to this one by incoming edges
         """
-        return tuple(self._incoming)
+        return tuple(WikiNode._view(self._core, int(node_id)) for node_id in self._core.predecessors(self._id))
 
     @property
     def referenced_nodes(self):
         """
         Returns:
-            referencing nodes: nodes that are connected to this one by incoming edges
+            referenced nodes: nodes that are connected to this one by outgoing edges
         """
-        return tuple(self._outgoing)
+        return tuple(WikiNode._view(self._core, int(node_id)) for node_id in self._core.successors(self._id))
+
+    def __eq__(self, __o: object) -> bool:
+        return isinstance(__o, WikiNode) and '_core' in self.__dict__ and '_core' in __o.__dict__ \
+            and self._core is __o._core and self._id == __o._id
+
+    def __hash__(self) -> int:
+        # Legacy nodes are hashed while being unpickled into sets, before they know anything.
+        if '_core' not in self.__dict__:
+            return id(self)
+        return hash((id(self._core), self._id))
+
     def __str__(self) -> str:
         return f'< WikiNode Object wrapping article {self.article} > '
 
+
+class _NodeMapping(Mapping):
+    """Read only mapping of urls to the nodes of a GraphCore, in the order in which they were added."""
+    def __init__(self, core: GraphCore) -> None:
+        self._core = core
+
+    def __getitem__(self, url):
+        node_id = self._core.id_of(url)
+        if node_id is None:
+            raise KeyError(url)
+        return WikiNode._view(self._core, node_id)
+
+    def __contains__(self, url):
+        return self._core.id_of(url) is not None
+
+    def __iter__(self):
+        core = self._core
+        if not core.merged:
+            return iter(core.urls)
+        # Tombstones of merged nodes are no nodes anymore.
+        return (url for url, state in zip(core.urls, core.expansion) if state != MERGED)
+
+    def __len__(self):
+        return self._core.node_count
+
+    def __repr__(self) -> str:
+        return f'<WikiGraph nodes: {len(self)} urls>'
+
 class WikiGraph:
     """Graph representation of a wikipedia article and its surrounding references
     """
-    def __init__(self, root, depth=10, max_nodes=500) -> None:
+    # Class level defaults for graphs from older pickles, which did not know these options yet.
+    _page_cache = None
+    _eager_titles = False
+    _concurrency = 1
+    _depth = None
+    _stored_html = None
+    _html_store: HtmlStore = None
+    _checkpoint = None
+    _link_source = None
+    _analytics = None
+    _search_index = None
+    _progress: ProgressReporter = ConsoleProgress()
+    _strategy: Frontier = None
+    _frontier: Frontier = None
+    _parse_workers = 0
+    _session = None
+
+    def __init__(self, root, depth=10, max_nodes=500, concurrency=1, page_cache=None, eager_titles=False,
+                 checkpoint=None, checkpoint_every=100, link_source: LinkSource = None, search_index=False, fetcher: Fetcher = None,
+                 progress: ProgressReporter = None, strategy: Frontier = None, parse_workers: int = 0,
+                 html_retention='none') -> None:
         """
 
         Args:
             root (url | WikiNode): Article around which the graph should be constructed.
             depth (int, optional): Maximum amount of references across which an article added to the graph may be away from the root. Defaults to 10.
             max_nodes (int, optional): Maximum amount of nodes that the graph is allowed to contain. Defaults to 500.
+            concurrency (int, optional): Maximum amount of articles that are downloaded at the same time. Defaults to 1, downloading one after another.
+            page_cache (PageCache, optional): Cache through which all articles of the graph are downloaded. Defaults to None.
+            eager_titles (bool, optional): Download every added article right away to know its real title, instead of only downloading
+                the articles whose references are followed. Defaults to False.
+            checkpoint (str, optional): Path of a checkpoint file, to which the progress of the crawl is appended, so that
+                it can be continued with WikiGraph.resume if it dies. Defaults to None.
+            checkpoint_every (int, optional): Expansions of nodes after which the checkpoint is written. Defaults to 100.
+            link_source (LinkSource, optional): Source of the references of the articles, eg. a Wikipedia dump.
+                Defaults to None, downloading the articles.
+            search_index (bool, optional): Index the text of every downloaded article for WikiGraph.search. Defaults to False.
+            fetcher (Fetcher, optional): Fetcher through which the articles are downloaded, with its rate limits, timeouts and
+                retries. Defaults to None, a Fetcher with default settings and a connection pool for the concurrency.
+            progress (ProgressReporter, optional): Reporter of the progress of the crawl (see wikigraph_progress).
+                Defaults to None, a line on the console.
+            strategy (Frontier, optional): Order in which the nodes are expanded, which decides what part of the neighbourhood
+                of the root makes it into the graph once it is full (see frontier). Defaults to None, width-first.
+            parse_workers (int, optional): Extract the references in this many worker processes, pipelined with the downloads
+                (see parse_pipeline). Worth it when the pages come from a cache. The graph is the same as without.
+                Defaults to 0, extracting in the downloading threads.
+            html_retention (str | HtmlStore, optional): Keep the html of the downloaded articles for searching and exporting
+                it later: 'none', 'compressed' (in memory) or a store, eg. a CompressedHtmlStore with a memory budget
+                beyond which pages are spilled to disk (see html_store). Defaults to 'none'.
 
         Raises:
             TypeError: root parameter is not a string and therefore no url, or no Wiki
+            FileExistsError: there is already a file in the checkpoint path.
         """
-        #The session prevents unneccessary Handshakes, thus reducing the time
-        #To download hundreds to thousands of Wikipedia-Pages by a factor of around 2
-        self._getter_session = requests.Session()
-
-        self._max_nodes = max_nodes
+        self._setup(depth, max_nodes, concurrency, page_cache, eager_titles, link_source, search_index, fetcher, progress, strategy,
+                    parse_workers, html_retention)
         if type(root) == str:
-            self.root = WikiNode(root, depth=0, session = self._getter_session)
+            root_article = self._make_article(canonical_url(root))
         elif type(root) == WikiNode:
-            self.root = root
+            root_article = root.article
         elif type(root) == wikiarticle.WikiArticle:
-            self.root = WikiNode(root, 0, self._getter_session)
+            root_article = root
         else:
             raise TypeError('Can only initialize Graph with root node or url.')
 
-        self.nodes : dict[str, WikiNode] = {}
-        self.nodes[self.root.article.url] = self.root
+        self._core = GraphCore()
+        self._core.article_factory = self._make_article
+        self.root = WikiNode._view(self._core, self._core.add_node(root_article.url, 0, root_article))
+        if type(root) == str:
+            self._core.add_alias(root, self.root._id)
+        if checkpoint is not None:
+            self._checkpoint = CheckpointWriter(checkpoint, every=checkpoint_every)
+            self._checkpoint.start(root_article.url, depth, max_nodes)
         self.width_first_completion(depth)
+        self._core.compact()
+
+    def _setup(self, depth, max_nodes, concurrency=1, page_cache=None, eager_titles=False, link_source=None, search_index=False,
+               fetcher=None, progress=None, strategy=None, parse_workers=0, html_retention='none'):
+        # Everything but the nodes themselves. Shared by all the ways a graph comes into existence.
+        self._concurrency = max(1, concurrency)
+        # Created once the first article is, so that loaded graphs that download nothing do not need requests.
+        self._session = fetcher
+        self._page_cache = page_cache
+        self._eager_titles = eager_titles
+        self._depth = depth
+        self._max_nodes = max_nodes
+        # References of partially expanded nodes, that did not fit into the graph anymore. By node id.
+        self._pending_references = {}
+        self._checkpoint = None
+        self._link_source = link_source
+        self._search_index = SearchIndex() if search_index else None
+        self._progress = progress if progress is not None else ConsoleProgress()
+        self._strategy = strategy
+        self._frontier = None
+        self._parse_workers = parse_workers
+        self._html_store = make_html_store(html_retention)
+
+    @classmethod
+    def from_dump(cls, dumps, root=None, depth=10, max_nodes=500, index_path=None, full=False, namespace=0, progress=None,
+                  strategy=None):
+        """Builds a graph from Wikipedia dump files instead of downloading articles (see wikidump).
+
+        Args:
+            dumps (Iterable[str]): Paths of pages-articles XML dumps or page/pagelinks/linktarget/redirect SQL dumps, optionally bz2 or gzip compressed.
+            root (str, optional): Url of the root article. Required, unless the full graph is built. Defaults to None.
+            depth (int, optional): Same as for creating a WikiGraph. Defaults to 10.
+            max_nodes (int, optional): Same as for creating a WikiGraph. Defaults to 500.
+            index_path (str, optional): Path of the sqlite index into which the dumps are imported. An existing index is reused.
+                Defaults to None, next to the first dump.
+            full (bool, optional): Build the complete link graph of a namespace, instead of the surroundings of the root.
+                Depths are then the distances from the root (the first page if there is none), -1 for unreachable articles. Defaults to False.
+            namespace (int, optional): Namespace of the full graph. Defaults to 0, the articles.
+            progress (ProgressReporter, optional): Same as for creating a WikiGraph. Defaults to None.
+            strategy (Frontier, optional): Same as for creating a WikiGraph. Defaults to None.
+
+        Raises:
+            ValueError: there is neither a root nor is the full graph requested.
+
+        Returns:
+            WikiGraph: the graph
+        """
+        index = wikidump.open_index(dumps, index_path)
+        if not full:
+            if root is None:
+                raise ValueError('A root is required, unless the full graph is built.')
+            # The graph keeps the dumps as source, so extending it does not download anything either.
+            return cls(root, depth, max_nodes, link_source=wikidump.DumpLinkSource(index), progress=progress,
+                       strategy=strategy)
+        try:
+            return cls._full_dump_graph(index, root, namespace)
+        finally:
+            index.close()
+
+    @classmethod
+    def crawl_to_disk(cls, root, path, depth=10, max_nodes=1000000, memory=256 * 1024 ** 2, work_dir=None, concurrency=1,
+                      page_cache=None, link_source: LinkSource = None, fetcher: Fetcher = None, progress: ProgressReporter = None):
+        """Builds a graph that does not need to fit into memory: visited set, frontier and edges are kept on disk while
+        crawling, in a fixed memory budget, and the graph is written straight into a binary file (see disk_crawl).
+        The graph is then loaded from that file, memory mapped.
+
+        Args:
+            root (str): Url of the article around which the graph is built.
+            path (str): Path of the binary file of the graph. Must not exist yet.
+            depth (int, optional): Same as for creating a WikiGraph. Defaults to 10.
+            max_nodes (int, optional): Same as for creating a WikiGraph. Defaults to 1000000.
+            memory (int, optional): Bytes of memory for the crawl. Defaults to 256 MB.
+            work_dir (str, optional): Directory for the files of the crawl, which are deleted once it is done. Defaults to None,
+                the temporary directory.
+            concurrency (int, optional): Same as for creating a WikiGraph. Defaults to 1.
+            page_cache (PageCache, optional): Same as for creating a WikiGraph. Defaults to None.
+            link_source (LinkSource, optional): Same as for creating a WikiGraph. Defaults to None.
+            fetcher (Fetcher, optional): Same as for creating a WikiGraph. Defaults to None.
+            progress (ProgressReporter, optional): Same as for creating a WikiGraph. Defaults to None.
+
+        Raises:
+            FileExistsError: there is already a file in the path.
+
+        Returns:
+            WikiGraph: the graph, loaded from the written file
+        """
+        from disk_crawl import DiskCrawl
+        DiskCrawl(root, path, depth, max_nodes, memory, work_dir, concurrency, page_cache, link_source, fetcher, progress).run()
+        return cls.load(path)
+
+    @classmethod
+    def _full_dump_graph(cls, index, root, namespace):
+        graph = cls.__new__(cls)
+        graph._setup(None, None)
+        core = GraphCore()
+        core.article_factory = graph._make_article
+        graph._core = core
+        page_ids = []
+        for page_id, title in index.pages(namespace):
+            core.add_node(wikidump.title_to_url(title), -1)
+            page_ids.append(page_id)
+        if not page_ids:
+            raise ValueError(f'The dumps contain no pages in namespace {namespace}.')
+        print(f'Linking {len(page_ids)} pages...')
+        for node_id, page_id in enumerate(page_ids):
+            targets = []
+            for title in index.links(page_id):
+                target = core.id_of(wikidump.title_to_url(title))
+                if target is None:
+                    # Redirects are no nodes of their own here, their links lead to the article they redirect to.
+                    page = index.resolve(title)
+                    target = core.id_of(wikidump.title_to_url(page[2])) if page is not None and page[1] == namespace else None
+                if target is not None:
+                    targets.append(target)
+            core.add_edges(node_id, targets)
+            core.set_expansion(node_id, EXPANDED)
+        core.compact()
+        root_id = core.id_of(root) if root is not None else 0
+        if root_id is None:
+            raise ValueError(f'{root} is not in the dumps.')
+        graph.root = WikiNode._view(core, root_id)
+        core.depths = array('i', wikigraph_analytics.distances(core, root_id).tobytes())
+        graph._depth = int(core.depth_array().max())
+        graph._max_nodes = len(core)
+        return graph
+
+    @classmethod
+    def resume(cls, checkpoint, depth=None, max_nodes=None, concurrency=1, page_cache=None, eager_titles=False, checkpoint_every=100,
+               search_index=False, fetcher=None, progress=None, strategy=None, parse_workers=0, html_retention='none',
+               link_source=None):
+        """Continues a crawl from its checkpoint file. Nothing that is recorded in the checkpoint is downloaded again.
+        The continued crawl is appended to the same checkpoint.
+
+        Args:
+            checkpoint (str): Path of the checkpoint file
+            depth (int, optional): Depth up to which the crawl should continue. Defaults to None, the depth of the original crawl.
+            max_nodes (int, optional): Maximum amount of nodes. Defaults to None, the maximum of the original crawl.
+            The other arguments are the same as for creating a WikiGraph.
+
+        Raises:
+            ValueError: the file is no checkpoint.
 
-    def _add_node(self, url, parent: WikiNode):
+        Returns:
+            WikiGraph: the completed graph
+        """
+        header, records = read_checkpoint(checkpoint)
+        graph = cls.__new__(cls)
+        graph._setup(header['depth'] if depth is None else depth, header['max_nodes'] if max_nodes is None else max_nodes,
+                     concurrency, page_cache, eager_titles, link_source, search_index=search_index, fetcher=fetcher, progress=progress,
+                     strategy=strategy, parse_workers=parse_workers, html_retention=html_retention)
+        core = GraphCore()
+        core.article_factory = graph._make_article
+        graph._core = core
+        graph.root = WikiNode._view(core, core.add_node(header['root'], 0))
+        for record in records:
+            node_id = record['node']
+            if 'canonical' in record:
+                graph._merge_alias(node_id, record['canonical'])
+                continue
+            for url in record['new']:
+                core.add_node(url, core.depths[node_id] + 1)
+            core.add_edges(node_id, record['targets'])
+            graph._shorten_depths(node_id, record['targets'])
+            graph._set_expanded(node_id, record['rest'])
+        print(f'Resuming crawl with {len(core)} nodes and {core.edge_count} edges from {len(records)} recorded expansions.')
+        graph._checkpoint = CheckpointWriter(checkpoint, every=checkpoint_every)
+        graph.width_first_completion(graph._depth)
+        core.compact()
+        return graph
+
+    def extend(self, depth=None, max_nodes=None):
+        """Continues building the graph to a larger depth or maximum amount of nodes. Articles whose references have been
+        added already are not downloaded again, not even those that were only partially added because the graph was full.
+
+        Args:
+            depth (int, optional): New maximum depth. Defaults to None, keeping the current one.
+            max_nodes (int, optional): New maximum amount of nodes. Defaults to None, keeping the current one.
+
+        Returns:
+            int: Number of nodes that were added.
+        """
+        if depth is not None:
+            self._depth = depth
+        if max_nodes is not None:
+            self._max_nodes = max_nodes
+        added_nodes = self.width_first_completion(self._depth)
+        self._core.compact()
+        return added_nodes
+
+    @property
+    def progress(self) -> ProgressReporter:
+        """Reporter of the progress of crawls, eg. when the graph is extended (see wikigraph_progress)."""
+        return self._progress
+
+    @progress.setter
+    def progress(self, reporter: ProgressReporter):
+        self._progress = reporter if reporter is not None else ConsoleProgress()
+
+    @property
+    def parse_workers(self) -> int:
+        """Worker processes that extract references during crawls, 0 to extract in the downloading threads (see parse_pipeline)."""
+        return self._parse_workers
+
+    @parse_workers.setter
+    def parse_workers(self, workers: int):
+        self._parse_workers = max(0, workers)
+
+    @property
+    def html_retention(self) -> HtmlStore:
+        """Store in which the html of downloaded articles is kept (see html_store), None if it is not kept."""
+        return self._html_store
+
+    @html_retention.setter
+    def html_retention(self, retention):
+        # Also used to equip loaded graphs with a store, so all existing articles need to learn about it.
+        self._html_store = make_html_store(retention)
+        for article in self._core.articles.values():
+            self._equip_article(article)
+
+    @property
+    def link_source(self) -> LinkSource:
+        """Source of the references of articles, eg. a dump or the MediaWiki API (see link_source). None to download the articles."""
+        return self._link_source
+
+    @link_source.setter
+    def link_source(self, source: LinkSource):
+        self._link_source = source
+
+    @property
+    def strategy(self) -> Frontier:
+        """Crawl strategy: the frontier that decides in which order nodes are expanded (see frontier)."""
+        if self._strategy is None:
+            self._strategy = BreadthFirstFrontier()
+        return self._strategy
+
+    @strategy.setter
+    def strategy(self, frontier: Frontier):
+        self._strategy = frontier
+
+    def _shorten_depths(self, node_id, targets):
+        # Strategies other than width-first may find a node on a longer path first. Its depth follows the shortest one found.
+        core = self._core
+        depth = core.depths[node_id] + 1
+        shortened = []
+        for target in targets:
+            if core.depths[target] > depth:
+                core.set_depth(target, depth)
+                shortened.append(target)
+        return shortened
+
+    def _resolve_canonical(self, node: WikiNode) -> WikiNode:
+        """Once the page of a node is downloaded, it states its canonical url. If that is not the url of the node (eg. for
+        redirects), the node is renamed to it, or merged into the node that has it already.
+
+        Returns:
+            WikiNode: the node under the canonical url, whose references the page holds
+        """
+        article = self._core.articles.get(node._id)
+        canonical = article.canonical_url if article is not None else None
+        if canonical is None and self._link_source is not None:
+            # Sources like the MediaWiki API resolve redirects without a page.
+            canonical = self._link_source.canonical_url(node.article.url)
+        if canonical is None:
+            return node
+        return WikiNode._view(self._core, self._merge_alias(node._id, canonical_url(canonical)))
+
+    def _merge_alias(self, node_id, canonical):
+        core = self._core
+        if core.urls[node_id] == canonical:
+            return node_id
+        self._retitle(node_id)
+        target = core.id_of(canonical)
+        if target is None or target == node_id:
+            core.rename(node_id, canonical)
+            target = node_id
+        else:
+            core.merge(node_id, target)
+            self._pending_references.pop(node_id, None)
+            # The depth of the merged node may be the smaller one.
+            shortened = self._shorten_depths(target, core.successors(target).tolist())
+            if self._frontier is not None:
+                for successor in shortened:
+                    if core.expansion[successor] != EXPANDED:
+                        self._frontier.push(successor, core.depths[successor])
+        if self._checkpoint is not None:
+            self._checkpoint.record_canonical(node_id, canonical)
+        return target
+
+    def _set_expanded(self, node_id, rest):
+        if rest:
+            self._core.set_expansion(node_id, PARTIALLY_EXPANDED)
+            self._pending_references[node_id] = list(rest)
+        else:
+            self._core.set_expansion(node_id, EXPANDED)
+            self._pending_references.pop(node_id, None)
+
+    @property
+    def _getter_session(self):
+        if self._session is None:
+            self._session = self._new_session()
+        return self._session
+
+    def _new_session(self):
+        #The session prevents unneccessary Handshakes, thus reducing the time
+        #To download hundreds to thousands of Wikipedia-Pages by a factor of around 2
+        # The fetcher around it keeps a connection for every parallel download, and the request rate bearable for the server.
+        return Fetcher(pool_size=max(10, self._concurrency))
+
+    @property
+    def nodes(self) -> Mapping:
+        """
+        Returns:
+            Mapping[str, WikiNode]: All nodes of the graph by the url of their article, in the order in which they were added.
+        """
+        return _NodeMapping(self._core)
+
+    def __getstate__(self):
+        # A memory mapped file can not be pickled. Its contents are pickled by the core.
+        state = self.__dict__.copy()
+        state.pop('_graph_file', None)
+        state.pop('_stored_html', None)
+        state.pop('_html_store', None)
+        state.pop('_checkpoint', None)
+        state.pop('_link_source', None)
+        state.pop('_analytics', None)
+        state.pop('_progress', None)
+        state.pop('_frontier', None)
+        if self._search_index is not None:
+            self._search_index.settle(self._core.id_of)
+        return state
+
+    def __setstate__(self, state):
+        # Older pickles kept the session under another name.
+        if '_getter_session' in state:
+            state['_session'] = state.pop('_getter_session')
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_pending_references', {})
+        if '_core' not in state:
+            self._convert_legacy_nodes(state.pop('nodes'))
+        self._core.article_factory = self._make_article
+
+    def _convert_legacy_nodes(self, nodes):
+        # Older pickles stored a dict of nodes which referenced each other through sets.
+        self._core = GraphCore()
+        for url, node in nodes.items():
+            self._core.add_node(url, node._legacy['depth'], node._legacy['article'])
+        for url, node in nodes.items():
+            self._core.add_edges(self._core.id_of(url), [self._core.id_of(target._legacy['article'].url) for target in node._legacy['_outgoing']])
+        self._core.compact()
+        self._core.expansion = self._core.guess_expansion()
+        self.root = WikiNode._view(self._core, self._core.id_of(self.root._legacy['article'].url))
+
+    def _add_node(self, url, parent: WikiNode, article=None):
         """Adds a node to the graph.
 
         Args:
             url (str): url of the new article to be added
             parent (WikiNode): Node with Article that referenced this one
+            article (WikiArticle, optional): Already created article for the url. Defaults to None, creating it on demand.
         Returns:
             boolean: Was the node already Present, and only references needed to be updated?
         """
-        if url not in self.nodes.keys():
-            # slightly more resistant against bad WikiNode implementations
-            # with bad equals implementation
-            new_Node = WikiNode(url, parent.depth+1, self._getter_session)
-            parent.add_outgoing_reference(new_Node)
-            self.nodes[url] = new_Node
-            return False
-        else:
-            parent.add_outgoing_reference(self.nodes[url])
-            return True
+        node_id = self._core.id_of(url)
+        present = node_id is not None
+        if not present:
+            node_id = self._core.add_node(url, parent.depth + 1, article)
+        self._core.add_edge(parent._id, node_id)
+        return present
 
     def add_referenced(self, node: WikiNode):
         """Overflow-safe attempt of adding all articles to the graph, which are referenced by one article
@@ -147,73 +634,353 @@ class WikiGraph:
         Args:
             node (WikiNode): Source of the references
         """
-        if node not in self.nodes.values():
+        if node._core is not self._core:
             raise ValueError("Only References of Articles within the graph may be added!")
-        size = len(self.nodes)
-        added_nodes = 0
-        for reference in node.article.references:
-            if not self._add_node(reference, node):
+        return self._add_references(node, self._fetch_references(node))
+
+    def _add_references(self, node: WikiNode, references, executor=None):
+        """Adds the given references of a node to the graph, without exceeding the maximum amount of nodes.
+
+        Args:
+            node (WikiNode): Source of the references
+            references (Iterable[str]): urls referenced by the node, in the order in which they should be added.
+            executor (Executor, optional): If set, the articles of new nodes are created within it. Defaults to None.
+
+        Returns:
+            int: Number of nodes that were added.
+        """
+        core = self._core
+        size = core.node_count
+        references = list(references)
+        if size >= self._max_nodes:
+            if core.expansion[node._id] in (NOT_EXPANDED, FAILED):
+                # The references are known now, so there is no need to download them again when the graph is extended.
+                self._set_expanded(node._id, references)
+            return 0
+        # First decide which references make it into the graph. The cutoff is the same as if the nodes were added one by one:
+        # Stop right after the reference that filled the graph up.
+        # Urls of nodes and their known variants are hits in the index of the core. Only the others are canonicalized.
+        accepted = []
+        new_urls = {} # Used as ordered set
+        for reference in references:
+            url = reference if core.id_of(reference) is not None else canonical_url(reference)
+            accepted.append((url, reference))
+            if core.id_of(url) is None and url not in new_urls:
+                new_urls[url] = None
                 size += 1
-                added_nodes += 1
-            if size >= self._max_nodes: return added_nodes
-        return added_nodes
+            if size >= self._max_nodes:
+                break
+        # Only then create the new articles. With eager titles, this is where the downloads happen.
+        articles = {}
+        if self._eager_titles:
+            if executor is not None and len(new_urls) > 1:
+                articles = dict(ordered_prefetch(self._make_article, list(new_urls), executor, self._concurrency))
+            else:
+                articles = {url: self._make_article(url) for url in new_urls}
+        depth = node.depth + 1
+        first_new = len(core)
+        targets = []
+        for url, reference in accepted:
+            target = core.add_node(url, depth, articles.get(url))
+            if reference != url:
+                # The next reference to the same variant is a hit.
+                core.add_alias(reference, target)
+            targets.append(target)
+        core.add_edges(node._id, targets)
+        shortened = self._shorten_depths(node._id, targets)
+        frontier = self._frontier
+        if frontier is not None:
+            for target in shortened:
+                if core.expansion[target] != EXPANDED:
+                    frontier.push(target, depth)
+            for target in targets:
+                if target >= first_new:
+                    frontier.push(target, depth)
+                frontier.referenced(target, node._id)
+        rest = references[len(accepted):]
+        self._set_expanded(node._id, rest)
+        if self._checkpoint is not None:
+            self._checkpoint.record(node._id, new_urls, targets, rest)
+        return len(new_urls)
+
+    def _make_article(self, url, title=None):
+        article = wikiarticle.WikiArticle(url, session=self._getter_session, page_cache=self.page_cache, title=title)
+        self._equip_article(article)
+        # Only now, so that the download for the title already passes the listener.
+        if self._eager_titles and title is None:
+            try:
+                article.resolve_title()
+            except FetchError as error:
+                # The title from the url has to do.
+                logging.warning(error)
+        return article
+
+    def _equip_article(self, article):
+        store = self._html_store
+        if store is not None:
+            # Html stored with a loaded graph is still found through the retention store.
+            if getattr(store, 'fallback', None) is None and self._stored_html is not None:
+                store.fallback = self._stored_html
+            article.html_store = store
+        else:
+            article.html_store = self._stored_html
+        if store is not None or self._search_index is not None:
+            article.html_listener = self._page_downloaded
+
+    def _page_downloaded(self, url, html):
+        if self._html_store is not None:
+            self._html_store.put(url, html)
+        if self._search_index is not None:
+            self._search_index.add_page(url, html, self._core.id_of)
+            # The page is about to state the title of the article.
+            node_id = self._core.id_of(url)
+            if node_id is not None:
+                self._retitle(node_id)
+
+    def _retitle(self, node_id):
+        # Before the title of a node changes: Its title is indexed anew, instead of under any title it may have had so far.
+        if self._search_index is None:
+            return
+        core = self._core
+        titles = [wikiarticle.WikiArticle.title_from_url(core.urls[node_id])]
+        article = core.articles.get(node_id)
+        if article is not None and article.resolved_title is not None:
+            titles.append(article.resolved_title)
+        if core.titles is not None and core.titles[node_id]:
+            titles.append(core.titles[node_id])
+        self._search_index.retitle(node_id, titles)
+
+    def _title_of(self, node_id):
+        # Without creating articles for nodes that have none yet
+        article = self._core.articles.get(node_id)
+        if article is not None:
+            return article.title
+        if self._core.titles is not None and self._core.titles[node_id]:
+            return self._core.titles[node_id]
+        return wikiarticle.WikiArticle.title_from_url(self._core.urls[node_id])
+
+    @property
+    def page_cache(self):
+        """
+        Returns:
+            PageCache | None: Cache through which the articles of the graph are downloaded.
+        """
+        return self._page_cache
+
+    @page_cache.setter
+    def page_cache(self, cache):
+        # Also used to equip loaded graphs with a cache, so all existing articles need to learn about it.
+        self._page_cache = cache
+        for node in self.nodes.values():
+            node.article.page_cache = cache
+
+    def _known_references(self, node: WikiNode):
+        # Partially expanded nodes continue where they stopped, without downloading anything.
+        pending = self._pending_references.get(node._id)
+        if pending is not None:
+            return pending
+        if self._link_source is not None:
+            return list(self._link_source.references(node.article.url))
+        return None
+
+    def _fetch_references(self, node: WikiNode):
+        # References are returned as list, so that their order is fixed between deciding and adding.
+        try:
+            known = self._known_references(node)
+            if known is not None:
+                return known
+            return list(node.article.references)
+        except FetchError as error:
+            logging.warning(error)
+            return None
+
+    def _submit_expansion(self, node: WikiNode, pipeline: ParsePipeline) -> Future:
+        future = Future()
+        try:
+            known = self._known_references(node)
+        except FetchError as error:
+            future.set_exception(error)
+            return future
+        if known is None:
+            return pipeline.submit(node.article)
+        future.set_result(known)
+        return future
+
+    def _expansions(self, frontier, executor=None, pipeline: ParsePipeline = None):
+        """Takes nodes from the frontier and yields each with its references, in the order in which they were taken.
+        With an executor, up to concurrency nodes are taken ahead and downloaded in the background while the current one
+        is treated. With a pipeline, as many as keep it busy are taken ahead, and parsed in its worker processes.
+        Link sources that answer for many articles at once get the urls of batch_size nodes ahead to prefetch.
+        """
+        # Nodes may be expanded under another url of theirs (a redirect) while they wait in the frontier.
+        def pop():
+            node_id = frontier.pop()
+            while node_id is not None and self._core.expansion[node_id] in (EXPANDED, MERGED):
+                node_id = frontier.pop()
+            return node_id
+
+        batch = self._link_source.batch_size if self._link_source is not None else 1
+
+        def take(count):
+            nodes = []
+            while len(nodes) < count:
+                node_id = pop()
+                if node_id is None:
+                    break
+                nodes.append(WikiNode._view(self._core, node_id))
+            if batch > 1:
+                # Partially expanded nodes know their references already.
+                urls = [node.article.url for node in nodes if node._id not in self._pending_references]
+                if urls:
+                    self._link_source.prefetch(urls)
+            return nodes
+        if executor is None:
+            nodes = take(batch)
+            while nodes:
+                for node in nodes:
+                    # The same node may have been taken twice, or merged into another one of the batch.
+                    if self._core.expansion[node._id] not in (EXPANDED, MERGED):
+                        yield node, self._fetch_references(node)
+                nodes = take(batch)
+            return
+        pending = deque()
+        # Whole batches are taken once enough of the last one is treated to keep the downloads busy.
+        window = (pipeline.window if pipeline is not None else self._concurrency) + batch - 1
+        try:
+            while True:
+                while len(pending) + batch <= window:
+                    nodes = take(batch)
+                    for node in nodes:
+                        if pipeline is not None:
+                            pending.append((node, self._submit_expansion(node, pipeline)))
+                        else:
+                            pending.append((node, executor.submit(self._fetch_references, node)))
+                    if len(nodes) < batch:
+                        break
+                if not pending:
+                    return
+                node, future = pending.popleft()
+                try:
+                    references = future.result()
+                except FetchError as error:
+                    logging.warning(error)
+                    references = None
+                yield node, references
+        finally:
+            # If the graph is full, the nodes that were taken ahead stay unexpanded for the next extension.
+            for _, future in pending:
+                future.cancel()
 
     @debug_timing
-    def width_first_completion(self, depth: int):
-        """Width-First approach to constructing the graph. All references from within one depth will be added before proceeding
-        to the next depth.
+    def width_first_completion(self, depth: int, concurrency: int = None):
+        """Constructs the graph up to a depth, expanding the nodes in the order of the crawl strategy of the graph.
+        With the default strategy, that is width-first: All references from within one depth will be added before
+        proceeding to the next depth.
 
         Args:
             depth (int): depth up to which references will be added to the graph
+            concurrency (int, optional): Maximum amount of parallel downloads. Defaults to None, using the one of the graph.
 
         Returns:
             int: Number of nodes that were added in this step.
         """
+        if concurrency is not None:
+            self._concurrency = max(1, concurrency)
+        try:
+            if self._parse_workers:
+                with ParsePipeline(self._parse_workers, self._concurrency) as pipeline:
+                    return self._crawl(depth, pipeline.fetch_executor, pipeline)
+            if self._concurrency > 1:
+                with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+                    return self._crawl(depth, executor)
+            return self._crawl(depth)
+        finally:
+            self._frontier = None
+            if self._link_source is not None:
+                self._link_source.finished()
+            if self._checkpoint is not None:
+                self._checkpoint.flush()
+
+    def _crawl(self, depth: int, executor=None, pipeline=None):
+        start_time = monotonic()
         size = len(self.nodes)
-        start_size = size
-        start_time = time()
-        print(f'Completing Graph to a depth of up to {depth} or a maximum of {self._max_nodes} wikinodes...')
         total_added_nodes = 0
         completed_nodes = 0
-        avg_treatment_time = 0
-        avg_additions = 0
-        for i in range(depth):
-            # Workaround: The nodes that will be added per round are not relevant, so decouple iteration from graph.
-            # Otherwise we will receive a 'Dict changed Size' runtime error.
-            to_be_completed_this_round = list(filter(lambda node: node.depth == i, self.nodes.values()))
-            layer_start = time()
-
-            for node in to_be_completed_this_round:
-                    node_start = time()
-                    added_nodes = self.add_referenced(node)
-                    total_added_nodes += added_nodes
-                    node_done = time() - node_start
-                    completed_nodes += 1
-
-                    # Update of progress.
-                    # Calculation per treated node averages
-                    avg_treatment_time = ((completed_nodes -1) * avg_treatment_time + node_done)/completed_nodes
-                    avg_additions = ((completed_nodes -1 ) * avg_additions + added_nodes ) /completed_nodes
-                    # Time until all layers would be completed
-                    eta_layer_limit = (avg_additions ** (depth)) * avg_treatment_time
-                    # Time until maximum nodes are reached (with estimate of single node creation time)
-                    eta_node_limit = (avg_treatment_time / avg_additions) * (self._max_nodes - start_size)
-                    # Output of estimated waiting time. ETA only grows somewhat reliable for very large graphs...
-                    print(f'Treating level {i}; total to be treated:{len(to_be_completed_this_round)}; Finished treatment for: {completed_nodes}.; nodes added:{total_added_nodes}; Estimated remaining time: {min(eta_layer_limit, eta_node_limit) - (time() - start_time):.2f}s', end='\r')
-                    size = len(self.nodes)
-                    if size>= self._max_nodes:
-                        break
-            layer_time = time() - layer_start
+        failed = 0
+        layer_index, layer_size, layer_done = 0, 0, 0
+        reporter = self._progress
+        frontier = self._frontier = self.strategy
+        frontier.start(self._core, self._title_of, depth)
+        # The only scan over all nodes: Everything within the depth that has not been expanded yet (eg. in an earlier run).
+        depths = self._core.depth_array()
+        expansion = self._core.expansion_array()
+        waiting = np.flatnonzero((depths >= 0) & (depths < depth) & (expansion != EXPANDED) & (expansion != MERGED))
+        for node_id in waiting[np.argsort(depths[waiting], kind='stable')].tolist():
+            frontier.push(node_id, int(depths[node_id]))
+
+        def progress():
+            return Progress(layer_index, depth, layer_size, layer_done, completed_nodes, total_added_nodes, failed, size,
+                            self._max_nodes, monotonic() - start_time)
+
+        reporter.started(progress())
+        done_per_depth = Counter()
+        deepest = -1
+        for node, references in self._expansions(frontier, executor, pipeline):
+            node_depth = node.depth
+            if node_depth > deepest:
+                # Strategies other than width-first do not go layer by layer. A layer starts when it is first reached.
+                deepest = node_depth
+                layer_index, layer_done = node_depth, done_per_depth[node_depth]
+                layer_size = layer_done + frontier.queued(node_depth) + 1
+                reporter.layer_started(progress())
+            if references is None:
+                # Download failed. The node stays in the graph, marked, and is tried again on the next extension.
+                self._core.set_expansion(node._id, FAILED)
+                added_nodes = 0
+                failed += 1
+            else:
+                node = self._resolve_canonical(node)
+                if self._core.expansion[node._id] == EXPANDED:
+                    # A redirect to an article that was expanded already
+                    added_nodes = 0
+                else:
+                    added_nodes = self._add_references(node, references, executor)
+                METRICS.counter('wikigraph_expansions_total').inc()
+            total_added_nodes += added_nodes
+            completed_nodes += 1
+            done_per_depth[node_depth] += 1
+            layer_index, layer_done = node_depth, done_per_depth[node_depth]
+            layer_size = layer_done + frontier.queued(node_depth)
+            size = len(self.nodes)
+            METRICS.counter('wikigraph_nodes_added_total').inc(added_nodes)
+            METRICS.gauge('wikigraph_nodes').set(size)
+            METRICS.gauge('wikigraph_frontier_size', depth=node_depth).set(frontier.queued(node_depth))
+            METRICS.gauge('wikigraph_frontier_size', depth=node_depth + 1).set(frontier.queued(node_depth + 1))
+            current = progress()
+            METRICS.gauge('wikigraph_nodes_per_second').set(nodes_per_second(current))
+            reporter.update(current)
             if size >= self._max_nodes:
                 break
-        print("\nCompleted.") # Terminating the self overriding progress line
+        reporter.finished(progress())
+        failed = int((self._core.expansion_array() == FAILED).sum())
+        if failed:
+            print(f'{failed} articles could not be downloaded. Extending the graph tries them again.')
+        return total_added_nodes
+    @property
+    def failed_nodes(self):
+        """
+        Returns:
+            list[WikiNode]: Nodes whose articles could not be downloaded. Extending the graph tries them again.
+        """
+        return [WikiNode._view(self._core, int(node_id)) for node_id in np.flatnonzero(self._core.expansion_array() == FAILED)]
+
     @property
     def node_with_max_out_degree(self):
         """
         Returns:
             WikiNode: Node with the most outgoing references aka. highest out degree
         """
-        return max(self.nodes.values(), key=lambda node: node.out_degree)
+        return WikiNode._view(self._core, int(np.argmax(self._core.out_degrees())))
 
     @property
     def node_with_max_in_degree(self):
@@ -221,17 +988,14 @@ class WikiGraph:
         Returns:
             WikiNode: Node with the most incoming references aka. highest in degree
         """
-        return max(self.nodes.values(), key=lambda node: node.in_degree)
+        return WikiNode._view(self._core, int(np.argmax(self._core.in_degrees())))
 
     def _count_edges(self):
         """
         Returns:
             int: amount of edges within the graph
         """
-        counter = 0
-        for i in self.nodes.values():
-            counter += len(i.referenced_nodes)
-        return counter
+        return self._core.edge_count
     @property
     def density(self):
         """
@@ -242,24 +1006,179 @@ class WikiGraph:
         """
         return self._count_edges() / (len(self.nodes) * (len(self.nodes) -1))
 
-    def save(self, path=None):
-        """Saves the wikigraph to a pickle file.
+    @property
+    def analytics(self) -> wikigraph_analytics.GraphAnalytics:
+        """
+        Returns:
+            GraphAnalytics: PageRank, HITS, distances, degree statistics and components of the graph, by node id.
+                Results are kept until the graph changes.
+        """
+        if self._analytics is None or self._analytics.core is not self._core:
+            self._analytics = wikigraph_analytics.GraphAnalytics(self._core, self.root._id)
+        self._analytics.root_id = self.root._id
+        return self._analytics
+
+    def top_nodes(self, metric: str = 'pagerank', k: int = 10):
+        """
+        Args:
+            metric (str, optional): pagerank, hubs, authorities, in_degree, out_degree or root_distance. Defaults to 'pagerank'.
+            k (int, optional): Defaults to 10.
+
+        Returns:
+            list[tuple[WikiNode, float]]: the k nodes with the highest value of the metric and their values, highest first
+        """
+        values = self.analytics.metric(metric)
+        return [(WikiNode._view(self._core, int(node_id)), values[node_id].item()) for node_id in self.analytics.top_k(values, k)]
+
+    def find_path(self, source: str, target: str, k: int = 1, max_length: int = 6, backward=None, max_expansions: int = None):
+        """Finds the shortest paths between two articles by a bidirectional search that only asks for the references of
+        the articles it needs (see path_finder). Neither article has to be in the graph. References of expanded nodes
+        are taken from the graph, the others come from the link source of the graph or are downloaded. The graph itself
+        does not change.
 
         Args:
-            path (str, optional): Path under which the file should be stored. Defaults to . Defaults to ./{root-title}-Wikigraph.pickle
+            source (str): url of the first article
+            target (str): url of the last article
+            k (int, optional): Amount of paths. Defaults to 1, the shortest one.
+            max_length (int, optional): Maximum amount of references in a path. Defaults to 6.
+            backward (str | LinkSource, optional): Where the articles referencing an article come from: a link source that
+                answers with them (eg. a MediaWikiLinkSource with prop='linkshere'), or 'graph' for the references within
+                this graph (complete for graphs of whole dumps). Defaults to None, searching forwards only.
+            max_expansions (int, optional): Articles whose references are asked for, after which the search gives up.
+                Defaults to None, no limit.
+
+        Raises:
+            ValueError: unknown backward source
+
+        Returns:
+            list[list[str]]: up to k paths, shortest first, each as the urls of its articles. Redirects are replaced by
+                the articles they lead to.
+        """
+        if backward is not None and backward != 'graph' and not isinstance(backward, LinkSource):
+            raise ValueError(f'Unknown backward source {backward}. Use a LinkSource or graph.')
+        # Urls that turned out to be redirects, to the url they lead to
+        aliases = {}
+        backward_source = backward if isinstance(backward, LinkSource) else None
+        forward = lambda urls: self._path_references(urls, self._forward_references, self._link_source, aliases)
+        if backward == 'graph':
+            backward = lambda urls: {url: self._graph_predecessors(url) for url in urls}
+        elif backward is not None:
+            backward = self._backward_references(backward)
+        finder = PathFinder(forward, backward, max_expansions)
+        try:
+            paths = finder.shortest_paths(self._path_url(source), self._path_url(target), k, max_length)
+        finally:
+            for link_source in (self._link_source, backward_source):
+                if link_source is not None:
+                    link_source.finished()
+        result = []
+        for path in paths:
+            # A redirect on the path is followed by the article it leads to.
+            path = [aliases.get(url, url) for url in path]
+            result.append([url for index, url in enumerate(path) if index == 0 or path[index - 1] != url])
+        return result
+
+    def _path_url(self, url):
+        node_id = self._core.id_of(url)
+        return self._core.urls[node_id] if node_id is not None else canonical_url(url)
+
+    def _graph_predecessors(self, url):
+        node_id = self._core.id_of(url)
+        return [self._core.urls[source] for source in self._core.predecessors(node_id).tolist()] if node_id is not None else []
+
+    def _backward_references(self, link_source):
+        def fetch(url):
+            references = link_source.references(url)
+            # Sources that resolve redirects answer for the article the redirect leads to. The redirect stays on the path.
+            # Asked for all the same, after the references that may have fetched it, so that the source does not keep it.
+            link_source.canonical_url(url)
+            return references
+        return lambda urls: self._path_references(urls, fetch, link_source)
+
+    def _forward_references(self, url):
+        # Returns the references and the canonical url the page states, like a link source.
+        if self._link_source is not None:
+            return self._link_source.references(url), self._link_source.canonical_url(url)
+        node_id = self._core.id_of(url)
+        article = self._core.articles.get(node_id) if node_id is not None else None
+        if article is None:
+            article = wikiarticle.WikiArticle(url, session=self._getter_session, page_cache=self.page_cache)
+            self._equip_article(article)
+        return article.references, article.canonical_url
+
+    def _path_references(self, urls, fetch, link_source, aliases=None):
+        """References of articles for the path search, fetched in batches (link sources) or in parallel (downloads).
+        Forwards (with aliases), the graph is asked first, and a redirect only references the article it leads to.
+        """
+        core = self._core
+        result, missing = {}, []
+        for url in urls:
+            node_id = core.id_of(url) if aliases is not None else None
+            if node_id is not None and core.expansion[node_id] in (EXPANDED, PARTIALLY_EXPANDED):
+                pending = self._pending_references.get(node_id, ())
+                result[url] = [core.urls[target] for target in core.successors(node_id).tolist()] + [canonical_url(reference) for reference in pending]
+            else:
+                missing.append(url)
+        if not missing:
+            return result
+        if link_source is not None:
+            link_source.prefetch(missing)
+
+        def references(url):
+            try:
+                if aliases is None:
+                    return [canonical_url(reference) for reference in fetch(url)]
+                found, canonical = fetch(url)
+            except FetchError as error:
+                logging.warning(error)
+                return []
+            if canonical is not None and canonical_url(canonical) != url:
+                aliases[url] = canonical_url(canonical)
+                return [aliases[url]]
+            return [canonical_url(reference) for reference in found]
+        if self._concurrency > 1 and link_source is None and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+                result.update(zip(missing, executor.map(references, missing)))
+        else:
+            result.update((url, references(url)) for url in missing)
+        return result
+
+    @property
+    def parameters(self):
+        """
+        Returns:
+            dict: Parameters with which the graph was built.
+        """
+        return {'depth': self._depth, 'max_nodes': self._max_nodes, 'concurrency': self._concurrency,
+                'eager_titles': self._eager_titles}
+
+    def save(self, path=None, format='binary', with_html=False):
+        """Saves the wikigraph to a file.
+
+        Args:
+            path (str, optional): Path under which the file should be stored. Defaults to ./{root-title}-Wikigraph.wgraph (or .pickle)
+            format (str, optional): 'binary' for the compact binary format (see wikigraph_format), 'pickle' for a pickle file. Defaults to 'binary'.
+            with_html (bool, optional): Also store the compressed html of every article in a binary file. Downloads all articles
+                that have not been downloaded yet. Defaults to False.
 
         Raises:
             FileNotFoundError: the path does not exist.
             FileExistsError: there is already a file in this path. No overwriting.
+            ValueError: unknown format
         """
+        if format not in ('binary', 'pickle'):
+            raise ValueError(f'Unknown format {format}. Use binary or pickle.')
         if path == None:
-            path = f'./{self.root.article.title}-Wikigraph.pickle'
-            path.replace(' ', '_')
+            extension = 'wgraph' if format == 'binary' else 'pickle'
+            path = f'./{self.root.article.title}-Wikigraph.{extension}'.replace(' ', '_')
         
         try:
-            file = open(path, mode='xb')
-            pickle.dump(self, file)
-            file.close()
+            if format == 'binary':
+                self._save_binary(path, with_html)
+            else:
+                file = open(path, mode='xb')
+                pickle.dump(self, file)
+                file.close()
         except FileNotFoundError:
             errormessage = f'The path {path} does appearently not point to a file.'
             logging.error(errormessage)
@@ -268,9 +1187,26 @@ class WikiGraph:
             errormessage=f'{path} points to an existing file. We are not overwriting!'
             logging.error(errormessage)
             raise FileExistsError(errormessage)
+
+    def _save_binary(self, path, with_html):
+        core = self._core
+        def title(node_id):
+            # Only titles stated by the pages are worth storing, the others are derived from the url anyways.
+            article = core.articles.get(node_id)
+            if article is not None and article.resolved_title is not None:
+                return article.resolved_title
+            return core.titles[node_id] if core.titles is not None else None
+        html_of = (lambda node_id: core.article(node_id).html) if with_html else None
+        if self._search_index is not None:
+            self._search_index.settle(core.id_of)
+            self._search_index.add_titles(self._title_of, len(core))
+        wikigraph_format.write_graph(path, core, self.root._id, self.parameters,
+                                     titles=(title(node_id) for node_id in range(len(core))), html_of=html_of,
+                                     pending=self._pending_references, search_index=self._search_index)
+
     @staticmethod
     def load(path):
-        """Loads a wikigraph from a file
+        """Loads a wikigraph from a file. Binary files are memory mapped, pickle files are read completely.
 
         Args:
             path (str): Path to the file in which the Wikigraph is stored
@@ -281,85 +1217,225 @@ class WikiGraph:
         Returns:
             WikiGraph: wikigraph that was stored inside the file.
         """
+        if wikigraph_format.is_graph_file(path):
+            return WikiGraph._load_binary(path)
         with open(path, mode='rb') as file:
             wikigraph: WikiGraph =  pickle.load(file) # Should secure that this is a wikigraph we are loading.
             if not isinstance(wikigraph, WikiGraph):
                 raise TypeError(f'{path} does not point to a WikiGraph-File!')
             return wikigraph
-            
+
+    @staticmethod
+    def _load_binary(path):
+        graph_file = wikigraph_format.GraphFile(path)
+        parameters = graph_file.header['parameters']
+        graph = WikiGraph.__new__(WikiGraph)
+        graph._setup(parameters['depth'], parameters['max_nodes'], parameters.get('concurrency', 1),
+                     eager_titles=parameters.get('eager_titles', False))
+        graph._pending_references = graph_file.pending_references()
+        graph._graph_file = graph_file
+        graph._core = graph_file.core()
+        graph._core.article_factory = graph._make_article
+        graph._search_index = graph_file.search_index()
+        if graph_file.has_html:
+            graph._stored_html = wikigraph_format.StoredHtml(graph_file, graph._core)
+        graph.root = WikiNode._view(graph._core, graph_file.header['root_id'])
+        return graph
+
+    def search(self, query: str, html: bool = True, fetch_missing: bool = False):
+        """Searches the titles and texts of the articles through the search index. Graphs without one get one on the
+        first search, which indexes the titles and from then on every downloaded article.
+
+        Args:
+            query (str): Words which all have to occur (case insensitive). Words ending in * match every word starting with them.
+            html (bool, optional): Also search the texts of the articles, not only their titles. Defaults to True.
+            fetch_missing (bool, optional): Download the articles whose text is not indexed yet (eg. those which
+                were never expanded), so that all of them are searched. Defaults to False, searching only indexed texts.
+
+        Returns:
+            list[WikiNode]: the matching nodes, in order of addition
+        """
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            for article in self._core.articles.values():
+                self._equip_article(article)
+        index = self._search_index
+        if html and fetch_missing:
+            missing = [WikiNode._view(self._core, node_id) for node_id in self._node_ids() if not index.has_body(node_id)]
+            def fetch(node):
+                try:
+                    html = node.article.html
+                except FetchError as error:
+                    logging.warning(error)
+                    return
+                # Stored html does not pass the listener.
+                index.add_page(node.article.url, html, self._core.id_of)
+            if self._concurrency > 1 and len(missing) > 1:
+                with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+                    for _ in ordered_prefetch(fetch, missing, executor, self._concurrency):
+                        pass
+            else:
+                for node in missing:
+                    fetch(node)
+        index.settle(self._core.id_of)
+        index.add_titles(self._title_of, len(self._core))
+        fields = ('title', 'body') if html else ('title',)
+        expansion = self._core.expansion
+        return [WikiNode._view(self._core, int(node_id)) for node_id in index.search(query, fields) if expansion[node_id] != MERGED]
+
+    # Above this amount of nodes, draw switches to the large graph mode.
+    LARGE_DRAWING = 2000
 
     @debug_timing
-    def draw(self, search_term:str=None, search_html:bool=False, height:int=1000, width:int=800):
+    def draw(self, search_term:str=None, search_html:bool=False, height:int=1000, width:int=800, large:bool=None,
+             reduction:str='collapse', max_drawn:int=3000):
         """Creates an html file with a visualization of the graph, and opens it in the standard browser.
 
         Args:
-            search_term (str, optional): If set, all nodes containing the search term will be highlighted in the graph depiction. Defaults to None.
-            search_html (bool, optional): If set, html will be searched for the search term.
+            search_term (str, optional): If set, all nodes matching the search term (see search) will be highlighted in the graph depiction. Defaults to None.
+            search_html (bool, optional): If set, the texts of the articles will be searched as well. Articles whose text is
+                not in the search index yet are downloaded once.
             height (int, optional): Height of the graph depiction in px. Defaults to 1000
             width(int, optional): Width of the graph depiction in px. Defaults to 800
+            large (bool, optional): Large graph mode (see wikigraph_draw): The graph is reduced to max_drawn nodes and laid out
+                in advance, the browser does no physics and loads the drawing in chunks. Defaults to None, for graphs of more
+                than LARGE_DRAWING nodes.
+            reduction (str, optional): How the graph is reduced in large graph mode: top, collapse or sample. Defaults to 'collapse'.
+            max_drawn (int, optional): Amount of nodes drawn in large graph mode, next to aggregates and search results. Defaults to 3000.
         """
+        found = set()
+        if search_term:
+            found = {node._id for node in self.search(search_term, html=search_html, fetch_missing=True)}
+        name = self.root.article.title.replace(" ", "_")
+        if large or (large is None and len(self._core) > self.LARGE_DRAWING):
+            reduced = wikigraph_draw.reduce_graph(self._core, self.analytics, self.root._id, max_drawn, reduction, keep=found)
+            page = wikigraph_draw.write_drawing(f'{name}_graph', self._core, reduced, self._title_of, self.analytics.pagerank(),
+                                                highlighted=found, height=f'{height}px', width=f'{width}px')
+            wikigraph_draw.show(page)
+            return
+        # pyvis (and networkx and IPython with it) takes longer to import than most graphs take to load.
+        from pyvis.network import Network
         network = Network(directed=True, height=f'{height}px', width=f'{width}px')
-        for node_key in self.nodes:
-            article = self.nodes[node_key].article
-            found_search=False
-            if search_term:
-                found_search = search_term in article.title
-                # Only look in HTML if required, and if title did not yield result.
-                if not found_search and search_html:
-                    found_search = search_term in article.html
-            if found_search:
-                network.add_node(node_key, label=article.title, color="red")
+        urls = self._core.urls
+        for node_id in self._node_ids():
+            node_key = urls[node_id]
+            if node_id in found:
+                network.add_node(node_key, label=self._title_of(node_id), color="red")
             else:
-                network.add_node(node_key, label=article.title)
-        for node_key in self.nodes.values():
-            for referenced in node_key.referenced_nodes:
-                network.add_edge(node_key.article.url, referenced.article.url)
+                network.add_node(node_key, label=self._title_of(node_id))
+        for source, target in zip(*self._core.edges()):
+            network.add_edge(urls[source], urls[target])
         network.force_atlas_2based()
         network.show_buttons(filter_=["physics"])
-        network.show(name=f'{self.root.article.title.replace(" ", "_")}_graph.html')
+        network.show(name=f'{name}_graph.html')
 
-    def __make_nx_digraph(self, with_html=False):
-        """Creates nx graph for its file writing capabilities
-
-        Args:
-            with_html (bool, optional): Includes html as a node property. Massively increases size. Defaults to False.
-
-        Returns:
-            Digraph: nx digraph equivalent of this wikigraph.
+    def _export_nodes(self, with_html=False):
+        """Yields id, title and html (None without with_html) of every node, in order of ids. Html is taken from the
+        retained html (see html_retention), the stored html or the page cache where possible. With concurrency, the next
+        pages are downloaded in the background. Articles that are created for this are not kept, so memory does not grow
+        with the graph.
         """
-        
-        digraph = nx.DiGraph()
-        # Add nodes first, with title-Property and possibly html
-        if with_html:
-            for node in self.nodes.values():
-                digraph.add_node(node.article.url, title=node.article.title, html=node.article.html)
+        core = self._core
+        node_ids = self._node_ids()
+        if not with_html:
+            for node_id in node_ids:
+                yield node_id, self._title_of(node_id), None
+            return
+        def html_of(node_id):
+            article = core.articles.get(node_id) or self._make_article(core.urls[node_id])
+            try:
+                return article.html
+            except FetchError as error:
+                logging.warning(error)
+                return None
+        if self._concurrency > 1:
+            with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+                for node_id, html in ordered_prefetch(html_of, node_ids, executor, self._concurrency):
+                    yield node_id, self._title_of(node_id), html
         else:
-            for node in self.nodes.values():
-                digraph.add_node(node.article.url, title=node.article.title)
-        # Add all edges
-        for node in self.nodes.values():
-            for target_node in node.referenced_nodes:
-                digraph.add_edge(node.article.url, target_node.article.url)
-     
-        return digraph
+            for node_id in node_ids:
+                yield node_id, self._title_of(node_id), html_of(node_id)
+
+    def _node_ids(self):
+        # Ids of all nodes, without the tombstones of merged ones
+        core = self._core
+        if not core.merged:
+            return range(len(core))
+        return np.flatnonzero(core.expansion_array() != MERGED).tolist()
+
     def write_to_gml(self, path, with_html = False):
         """Writes the Graph into the gml format. This allows for better investigation options in interactive
-        graph-exploration software.
+        graph-exploration software. Paths ending in .gz or .zst are compressed.
 
         Args:
             path (str): path to the wished for file location
             with_html (bool, optional): If True, the html is added as a property to each node. Massively increases size. Defaults to False.
+
+        Raises:
+            FileExistsError: there is already a file in this path.
         """
-        nx.write_gml(self.__make_nx_digraph(with_html=with_html), path=path)
+        wikigraph_export.write_gml(path, self._core, self._export_nodes(with_html))
 
     def write_adjacency_list(self, path):
         """Writes the Graph into an adjacency-list format. This allows for better investigation options in interactive
-        graph-exploration software.
+        graph-exploration software. Paths ending in .gz or .zst are compressed.
 
         Args:
             path (str): path to the wished for file location
+
+        Raises:
+            FileExistsError: there is already a file in this path.
         """
-        nx.write_adjlist(self.__make_nx_digraph(with_html=with_html), path=path)
+        wikigraph_export.write_adjacency_list(path, self._core)
+
+    def write_edge_list(self, path, delimiter=','):
+        """Writes the edges of the Graph as CSV (or TSV) with a source and a target column. Paths ending in .gz or .zst are compressed.
+
+        Args:
+            path (str): path to the wished for file location
+            delimiter (str, optional): Column delimiter. Defaults to ','.
+
+        Raises:
+            FileExistsError: there is already a file in this path.
+        """
+        wikigraph_export.write_edge_list(path, self._core, delimiter)
+
+    def write_graphml(self, path, with_html=False):
+        """Writes the Graph into the GraphML format. Paths ending in .gz or .zst are compressed.
+
+        Args:
+            path (str): path to the wished for file location
+            with_html (bool, optional): If True, the html is added as a property to each node. Massively increases size. Defaults to False.
+
+        Raises:
+            FileExistsError: there is already a file in this path.
+        """
+        wikigraph_export.write_graphml(path, self._core, self._export_nodes(with_html), with_html)
+
+    def export(self, path, format=None, with_html=False):
+        """Writes the Graph in one of the formats of wikigraph_export.
+
+        Args:
+            path (str): path to the wished for file location
+            format (str, optional): gml, adjlist, csv, tsv or graphml. Defaults to None, according to the extension of the path.
+            with_html (bool, optional): Add the html of every node, where the format allows for it. Defaults to False.
+
+        Raises:
+            ValueError: the format is unknown, or could not be derived from the path.
+            FileExistsError: there is already a file in this path.
+        """
+        format = format or wikigraph_export.format_of(path)
+        if format == 'gml':
+            self.write_to_gml(path, with_html)
+        elif format == 'adjlist':
+            self.write_adjacency_list(path)
+        elif format in ('csv', 'tsv'):
+            self.write_edge_list(path, ',' if format == 'csv' else '\t')
+        elif format == 'graphml':
+            self.write_graphml(path, with_html)
+        else:
+            raise ValueError(f'Unknown export format for {path}. Use one of {", ".join(wikigraph_export.FORMATS)}.')
+
     def __str__(self) -> str:
         return f'<WikiGraph Object with {len(self.nodes)} nodes: root = {self.root}>'
 
@@ -0,0 +1,221 @@
+"""Vectorized analytics on the sparse adjacency matrix of a graph.
+
+All results are arrays indexed by node id. They are cached until the graph is mutated. scipy is only imported by the
+analytics that need the matrix.
+"""
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from graph_core import GraphCore, MERGED
+
+if TYPE_CHECKING:
+    import scipy.sparse
+
+
+def distances(core: GraphCore, source: int) -> np.ndarray:
+    """Breadth first search from one node over the CSR arrays, one layer per step.
+
+    Args:
+        core (GraphCore): the graph
+        source (int): id of the node from which the distances are measured
+
+    Returns:
+        np.ndarray: amount of references by which each node is away from the source, -1 if it can not be reached.
+    """
+    indptr, indices = core.csr()
+    result = np.full(len(core), -1, dtype=np.int32)
+    result[source] = 0
+    frontier = np.array([source])
+    distance = 0
+    while frontier.size:
+        distance += 1
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        # Positions of all successors of the layer in the indices array
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        successors = indices[positions]
+        frontier = np.unique(successors[result[successors] == -1])
+        result[frontier] = distance
+    return result
+
+
+class GraphAnalytics:
+    """Analytics of one GraphCore. Results are kept until the version of the core changes."""
+    METRICS = ('pagerank', 'hubs', 'authorities', 'in_degree', 'out_degree', 'root_distance')
+
+    def __init__(self, core: GraphCore, root_id: int = 0) -> None:
+        self.core = core
+        self.root_id = root_id
+        self._cache = {}
+        self._version = None
+
+    def _cached(self, key, compute):
+        if self._version != self.core.version:
+            self._cache.clear()
+            self._version = self.core.version
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def live(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: whether each id is a node, and not the tombstone of a node that was merged into another one
+        """
+        return self._cached('live', lambda: self.core.expansion_array() != MERGED)
+
+    def matrix(self) -> 'scipy.sparse.csr_matrix':
+        """
+        Returns:
+            scipy.sparse.csr_matrix: adjacency matrix, with a 1 in row i and column j if node i references node j.
+        """
+        def compute():
+            import scipy.sparse as sparse
+            indptr, indices = self.core.csr()
+            size = len(self.core)
+            return sparse.csr_matrix((np.ones(len(indices), dtype=np.float64), indices, indptr), shape=(size, size))
+        return self._cached('matrix', compute)
+
+    def pagerank(self, damping: float = 0.85, tolerance: float = 1e-10, max_iterations: int = 100) -> np.ndarray:
+        """PageRank by power iteration. Nodes without references distribute their rank over all nodes.
+        Tombstones of merged nodes are no nodes, they get no rank.
+
+        Args:
+            damping (float, optional): Probability of following a reference instead of jumping anywhere. Defaults to 0.85.
+            tolerance (float, optional): Iteration stops once the ranks change by less than this (L1). Defaults to 1e-10.
+            max_iterations (int, optional): Defaults to 100.
+
+        Returns:
+            np.ndarray: rank of every node, summing up to 1
+        """
+        def compute():
+            size = len(self.core)
+            live = self.live()
+            # Jumps only lead to nodes.
+            jump = live / live.sum()
+            out_degrees = self.core.out_degrees().astype(np.float64)
+            dangling = (out_degrees == 0) & live
+            import scipy.sparse as sparse
+            # Transposed and normalized by the out degree of the source, so that ranks flow along the references.
+            transition = (sparse.diags(np.divide(1, out_degrees, out=np.zeros(size), where=out_degrees > 0)) @ self.matrix()).T.tocsr()
+            ranks = jump
+            for _ in range(max_iterations):
+                previous = ranks
+                ranks = damping * (transition @ ranks + ranks[dangling].sum() * jump) + (1 - damping) * jump
+                if np.abs(ranks - previous).sum() < tolerance:
+                    break
+            return ranks / ranks.sum()
+        return self._cached(('pagerank', damping, tolerance, max_iterations), compute)
+
+    def hits(self, tolerance: float = 1e-10, max_iterations: int = 100):
+        """Hubs and authorities. Good hubs reference good authorities, good authorities are referenced by good hubs.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: hub and authority score of every node, each summing up to 1
+        """
+        def compute():
+            matrix = self.matrix()
+            transposed = matrix.T.tocsr()
+            live = self.live()
+            hubs = live / live.sum()
+            authorities = hubs
+            for _ in range(max_iterations):
+                previous = hubs
+                authorities = transposed @ hubs
+                authorities /= authorities.sum() or 1
+                hubs = matrix @ authorities
+                hubs /= hubs.sum() or 1
+                if np.abs(hubs - previous).sum() < tolerance:
+                    break
+            return hubs, authorities
+        return self._cached(('hits', tolerance, max_iterations), compute)
+
+    def root_distances(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: amount of references by which each node is away from the root, -1 if it can not be reached.
+        """
+        return self._cached(('distances', self.root_id), lambda: distances(self.core, self.root_id))
+
+    def degree_histogram(self, direction: str = 'out') -> np.ndarray:
+        """
+        Args:
+            direction (str, optional): 'out' for references, 'in' for being referenced. Defaults to 'out'.
+
+        Returns:
+            np.ndarray: amount of nodes with each degree, indexed by degree. Tombstones of merged nodes are not counted.
+        """
+        if direction not in ('out', 'in'):
+            raise ValueError(f'Unknown direction {direction}, use out or in.')
+        def compute():
+            degrees = self.core.out_degrees() if direction == 'out' else self.core.in_degrees()
+            return np.bincount(degrees[self.live()], minlength=1)
+        return self._cached(('histogram', direction), compute)
+
+    def strongly_connected_components(self):
+        """
+        Returns:
+            tuple[int, np.ndarray]: amount of strongly connected components and the component label of every node.
+                Tombstones of merged nodes belong to no component, their label is -1.
+        """
+        from scipy.sparse import csgraph
+        def compute():
+            count, labels = csgraph.connected_components(self.matrix(), directed=True, connection='strong')
+            live = self.live()
+            if live.all():
+                return count, labels
+            # Without edges, every tombstone would be a component of its own.
+            components, live_labels = np.unique(labels[live], return_inverse=True)
+            labels = np.full(len(labels), -1, dtype=labels.dtype)
+            labels[live] = live_labels
+            return len(components), labels
+        return self._cached('scc', compute)
+
+    def metric(self, name: str) -> np.ndarray:
+        """
+        Args:
+            name (str): one of METRICS
+
+        Raises:
+            ValueError: there is no metric with that name
+
+        Returns:
+            np.ndarray: the metric of every node
+        """
+        if name == 'pagerank':
+            return self.pagerank()
+        if name == 'hubs':
+            return self.hits()[0]
+        if name == 'authorities':
+            return self.hits()[1]
+        if name == 'in_degree':
+            return self.core.in_degrees()
+        if name == 'out_degree':
+            return self.core.out_degrees()
+        if name == 'root_distance':
+            return self.root_distances()
+        raise ValueError(f'Unknown metric {name}, choose from {", ".join(self.METRICS)}.')
+
+    def top_k(self, metric, k: int = 10) -> np.ndarray:
+        """
+        Args:
+            metric (str | np.ndarray): name of a metric (see METRICS) or a value for every node
+            k (int, optional): Defaults to 10.
+
+        Returns:
+            np.ndarray: ids of the k nodes with the highest values, highest first. Tombstones of merged nodes are left out.
+        """
+        values = self.metric(metric) if isinstance(metric, str) else np.asarray(metric)
+        ids = np.flatnonzero(self.live())
+        if len(ids) < len(values):
+            values = values[ids]
+        else:
+            ids = None
+        k = min(k, len(values))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        # Only the top k are sorted, not all nodes.
+        candidates = np.argpartition(-values, k - 1)[:k]
+        candidates = candidates[np.argsort(-values[candidates], kind='stable')]
+        return ids[candidates] if ids is not None else candidates
@@ -1,35 +1,274 @@
 #!/usr/bin/env python3
+import atexit
+import json
+import logging
 import os.path
-from wikigraph import WikiGraph
+import sys
 from argparse import ArgumentParser
+from urllib.parse import urlsplit
 """CLI for the Wikigraph, with commandline options.
+
+Subcommands for saved graphs, which only import what they need:
+    info PATH...        what the headers of binary graph files say, without loading nodes or edges
+    stats PATH          numbers of a graph: nodes, edges, depths, expansion, most referenced and most important articles
+    export PATH OUT     writes a graph into an export format
+Everything else is done with the options of the crawl, with or without the subcommand crawl in front.
 """
 
-if __name__=='__main__':
+COMMANDS = ('info', 'stats', 'export', 'crawl')
+
+
+def _megabytes(path):
+    return os.path.getsize(path) / 1024 ** 2
+
+
+def info(args):
+    import wikigraph_format
+    status = 0
+    for path in args.paths:
+        try:
+            if not wikigraph_format.is_graph_file(path):
+                # Pickles can not be read in parts.
+                summary = {'path': path, 'format': 'pickle', 'bytes': os.path.getsize(path)}
+                print(json.dumps(summary) if args.json else f'{path}: pickle file, {_megabytes(path):.1f} MB. Load it (eg. with stats) for details.')
+                continue
+            header = wikigraph_format.read_header(path)
+        except (OSError, ValueError) as e:
+            print(f'{path}: {e}', file=sys.stderr)
+            status = 1
+            continue
+        sections = header['sections']
+        summary = {'path': path, 'format': 'binary', 'version': header['version'], 'bytes': os.path.getsize(path),
+                   'root': header['root'], 'nodes': header['node_count'] - header.get('merged', 0), 'edges': header['edge_count'],
+                   'parameters': header['parameters'], 'html': 'html_data' in sections,
+                   'search_index': any(name.startswith('search_') for name in sections), 'pending': 'pending' in sections}
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False))
+            continue
+        parameters = header['parameters']
+        extras = [name for name in ('html', 'search_index', 'pending') if summary[name]]
+        print(f'{path}: binary graph file (version {summary["version"]}), {_megabytes(path):.1f} MB')
+        print(f'  root:  {summary["root"]}')
+        print(f'  size:  {summary["nodes"]} nodes, {summary["edges"]} edges')
+        print(f'  built: depth {parameters.get("depth")}, max. {parameters.get("max_nodes")} nodes')
+        if extras:
+            print(f'  with:  {", ".join(extras).replace("_", " ")}')
+    return status
+
+
+def _load(path):
+    from wikigraph import WikiGraph
+    try:
+        return WikiGraph.load(path)
+    except (FileNotFoundError, TypeError, ValueError) as e:
+        print(f'{path} could not be loaded: {e}', file=sys.stderr)
+        return None
+
+
+def stats(args):
+    from graph_core import EXPANDED, FAILED, MERGED, NOT_EXPANDED, PARTIALLY_EXPANDED
+    import numpy as np
+    graph = _load(args.path)
+    if graph is None:
+        return 1
+    core = graph._core
+    nodes = len(graph.nodes)
+    print(f'{args.path}: {nodes} nodes, {graph._count_edges()} edges, root {graph.root.article.url}')
+    if nodes > 1:
+        print(f'  density:   {graph.density:.6f}')
+    expansion = np.bincount(core.expansion_array(), minlength=MERGED + 1)
+    states = ((EXPANDED, 'expanded'), (PARTIALLY_EXPANDED, 'partially expanded'), (NOT_EXPANDED, 'not expanded'), (FAILED, 'failed'),
+              (MERGED, 'merged redirects'))
+    print('  articles:  ' + ', '.join(f'{expansion[state]} {name}' for state, name in states if expansion[state]))
+    depths = core.depth_array()
+    # Merged redirects are no nodes anymore.
+    counts = np.bincount(depths[(depths >= 0) & (core.expansion_array() != MERGED)])
+    print('  per depth: ' + ', '.join(f'{depth}: {count}' for depth, count in enumerate(counts.tolist())))
+    if nodes:
+        most_referencing, most_referenced = graph.node_with_max_out_degree, graph.node_with_max_in_degree
+        print(f'  most references:  {most_referencing.article.title} ({most_referencing.out_degree})')
+        print(f'  most referenced:  {most_referenced.article.title} ({most_referenced.in_degree})')
+    if args.top and nodes:
+        print('  highest PageRank: ' + ', '.join(f'{node.article.title} ({value:.4f})' for node, value in graph.top_nodes('pagerank', args.top)))
+    return 0
+
+
+def export(args):
+    graph = _load(args.path)
+    if graph is None:
+        return 1
+    try:
+        graph.export(args.out, args.format, args.with_html)
+    except (FileExistsError, FileNotFoundError, ValueError, ImportError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f'{args.path} exported to {args.out}')
+    return 0
+
+
+def command_parser():
+    parser = ArgumentParser(description='Inspects and exports saved graphs. Graphs are created with the crawl options (see crawl --help).')
+    commands = parser.add_subparsers(dest='command', required=True)
+    info_parser = commands.add_parser('info', help='Print what the headers of saved graphs say, without loading them')
+    info_parser.add_argument('paths', metavar='PATH', nargs='+', help='saved graphs')
+    info_parser.add_argument('--json', action='store_true', help='one JSON object per graph and line')
+    info_parser.set_defaults(run=info)
+    stats_parser = commands.add_parser('stats', help='Load a saved graph and print its numbers')
+    stats_parser.add_argument('path', metavar='PATH', help='saved graph')
+    stats_parser.add_argument('--top', metavar='K', type=int, default=5, help='print the K articles with the highest PageRank, 0 for none')
+    stats_parser.set_defaults(run=stats)
+    export_parser = commands.add_parser('export', help='Write a saved graph into an export format')
+    export_parser.add_argument('path', metavar='PATH', help='saved graph')
+    export_parser.add_argument('out', metavar='OUT', help='path of the export. .gz or .zst compress it.')
+    export_parser.add_argument('--format', type=str, help='gml, adjlist, csv, tsv or graphml (default: according to the extension of OUT)', default=None)
+    export_parser.add_argument('--with_html', action='store_true', help='also write the html of every article, where the format allows for it')
+    export_parser.set_defaults(run=export)
+    commands.add_parser('crawl', help='Create, resume, extend, search, draw or save a graph (the options without subcommand)')
+    return parser
 
 
-    parser = ArgumentParser(description="Creates a Graph of referenced articles in Wikipedia")
+if __name__=='__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS[:-1]:
+        args = command_parser().parse_args()
+        exit(args.run(args))
+    if sys.argv[1:2] == ['crawl']:
+        del sys.argv[1]
+    # Only the crawl needs all of it.
+    from wikigraph import WikiGraph
+    from page_cache import DiskPageCache
+    from wikigraph_export import format_of
+    from wikiarticle import WikiArticle
+    from frontier import STRATEGIES, make_frontier
+    from html_store import CODECS, RETENTIONS, make_html_store
+    from wikigraph_progress import ConsoleProgress, LogProgress, MetricsProgress, ProgressReporter, Reporters
+    import wikigraph_metrics
+
+    parser = ArgumentParser(description="Creates a Graph of referenced articles in Wikipedia",
+                            epilog='Saved graphs can also be inspected and exported with the subcommands info PATH..., stats PATH and export PATH OUT (eg. info --help).')
     source_group = parser.add_mutually_exclusive_group()
     source_group.add_argument('--url', type=str, help='The url of the starting article', default=None)
     source_group.add_argument('--infile', metavar= 'PATH', type=str, help='Instead of creating, use the graph that is stored under this path', default=None)
-    parser.add_argument('--depth', type=int, help='The maximum amount of references that will be followed from the starting article', default=10, dest='depth')
-    parser.add_argument('--size', type=int, help='The maximum amount of articles that the graph will include', default=500, dest='size')
+    source_group.add_argument('--resume', metavar='PATH', type=str, help='Continue the crawl that was checkpointed in this file', default=None)
+    parser.add_argument('--dump', metavar='PATH', type=str, action='append', help='Build the graph around --url from this Wikipedia dump (pages-articles XML or page/pagelinks/linktarget/redirect SQL, optionally .bz2/.gz) instead of downloading articles. Can be given several times.', default=None)
+    parser.add_argument('--dump_index', metavar='PATH', type=str, help='Import the dumps into this index, or reuse it if it exists (default: next to the first dump)', default=None)
+    parser.add_argument('--full', action='store_true', help='With --dump: build the complete link graph of all articles in the dumps. --url is optional then.')
+    parser.add_argument('--depth', type=int, help='The maximum amount of references that will be followed from the starting article (default: 10, or that of the resumed/loaded graph)', default=None, dest='depth')
+    parser.add_argument('--size', type=int, help='The maximum amount of articles that the graph will include (default: 500, or that of the resumed/loaded graph)', default=None, dest='size')
+    parser.add_argument('--extend', action='store_true', help='With --infile: continue building the loaded graph up to --depth and --size. Articles that were expanded already are not downloaded again.')
+    parser.add_argument('--out_of_core', action='store_true', help='With --url: keep visited articles, frontier and edges on disk while crawling and write the graph straight into --save (binary), in the memory of --memory. For graphs of millions of articles. Crawls width-first only.')
+    parser.add_argument('--memory', metavar='MB', type=float, help='With --out_of_core: memory for the crawl', default=256)
+    parser.add_argument('--work_dir', metavar='PATH', type=str, help='With --out_of_core: directory for the files of the crawl, which need about twice the space of the graph (default: the temporary directory)', default=None)
+    parser.add_argument('--checkpoint', metavar='PATH', type=str, help='Append the progress of the crawl to this file, so it can be continued with --resume if it dies', default=None)
+    parser.add_argument('--checkpoint_every', metavar='N', type=int, help='Write the checkpoint after every N expanded articles', default=100)
+    parser.add_argument('--concurrency', type=int, help='The maximum amount of articles that are downloaded at the same time', default=1, dest='concurrency')
+    parser.add_argument('--parse_workers', metavar='N', type=int, help='Extract the references of the articles in N worker processes, pipelined with the downloads. Worth it with many cores and a warm --cache. The graph is the same as without.', default=0)
+    parser.add_argument('--backend', choices=['html', 'api'], help='Where the references of articles come from: their downloaded pages, or the MediaWiki Action API, which answers for 50 articles per request and resolves redirects without downloading pages', default='html')
+    parser.add_argument('--api_url', metavar='URL', type=str, help='Url of api.php for --backend api (default: /w/api.php on the host of --url, or of de.wikipedia.org)', default=None)
+    parser.add_argument('--rate', type=float, help='Initial requests per second to a server. Adapts to how fast and how willingly the server answers.', default=10.0)
+    parser.add_argument('--max_rate', type=float, help='Upper bound of requests per second to a server', default=100.0)
+    parser.add_argument('--retries', type=int, help='Retries of a failed download, with growing pauses in between', default=4)
+    parser.add_argument('--timeout', metavar='SECONDS', type=float, help='Give up on a response after this many seconds (and retry)', default=30.0)
+    parser.add_argument('--strategy', choices=list(STRATEGIES), help='Order in which articles are expanded, which decides what makes it into a graph of limited --size: width-first, most referenced first, or most relevant to --strategy_term first', default='bfs')
+    parser.add_argument('--strategy_term', metavar='TERM', type=str, help='Search term or url of a target article for --strategy relevance', default=None)
+    parser.add_argument('--eager_titles', action='store_true', help='Download every article that is added to the graph to know its real title. Otherwise, only articles whose references are followed are downloaded.')
+    parser.add_argument('--search_index', action='store_true', help='Index the text of every downloaded article while crawling, so --search with --html needs no further downloads. Saved with the graph.')
+    parser.add_argument('--keep_html', choices=list(RETENTIONS), help='Keep the html of the downloaded articles after the crawl, compressed in memory, so --html searches and --write_with_html exports need no further downloads', default='none')
+    parser.add_argument('--html_codec', choices=list(CODECS), help='Compression of the kept html. zstd requires zstandard.', default='zlib')
+    parser.add_argument('--html_budget', metavar='MB', type=float, help='Memory for the kept html. Beyond, the oldest articles are spilled to a file on disk.', default=None)
+    parser.add_argument('--html_spill_dir', metavar='PATH', type=str, help='Directory of the file to which kept html beyond --html_budget is spilled (default: the temporary directory)', default=None)
+    parser.add_argument('--cache', metavar='PATH', type=str, help='Keep downloaded articles in this directory, so later runs do not download them again', default=None)
+    parser.add_argument('--cache_size', metavar='MB', type=int, help='Maximum size of the article cache. Least recently used articles are dropped first.', default=1024)
+    parser.add_argument('--cache_ttl', metavar='HOURS', type=float, help='Cached articles older than this are checked for changes before use', default=7*24)
+    parser.add_argument('--find_path', nargs=2, metavar=('SOURCE', 'TARGET'), type=str, help='Print the shortest paths of references from one article to another. Searches from both ends and only fetches the references it needs. Works on its own, or on the graph of --infile, whose references need no fetching.', default=None)
+    parser.add_argument('--paths', metavar='K', type=int, help='With --find_path: print the K shortest paths', default=1)
+    parser.add_argument('--path_max_length', metavar='N', type=int, help='With --find_path: paths of at most N references', default=6)
+    parser.add_argument('--path_backward', choices=['none', 'graph', 'api'], help='With --find_path: where the articles referencing the target come from: nowhere (search forwards only), the graph of --infile (complete for --full dump graphs), or "what links here" of the MediaWiki API at --api_url', default='none')
+    parser.add_argument('--path_max_articles', metavar='N', type=int, help='With --find_path: give up after asking for the references of N articles', default=None)
     parser.add_argument('--draw', action='store_true', help='Create and open an HTML-File with a visualization of the graph. Additional draw options are --search and --html.')
-    parser.add_argument('--search', type=str, help='Highlight articles with this string in it. (per default, only in Title)', default=None, dest='search_string')
-    parser.add_argument('--html', help='Also look through html to find the search term', action="store_true")
+    parser.add_argument('--draw_large', action='store_true', help='Draw in large graph mode: reduced, laid out in advance and loaded in chunks. Default for graphs of more than 2000 articles.')
+    parser.add_argument('--draw_reduction', choices=['top', 'collapse', 'sample'], help='How large graphs are reduced for drawing: articles with the highest PageRank, collapsing leaves into aggregates, or sampling', default='collapse')
+    parser.add_argument('--draw_max_nodes', metavar='N', type=int, help='Maximum amount of articles drawn in large graph mode', default=3000)
+    parser.add_argument('--search', type=str, help='Highlight articles containing all these words. Words ending in * match every word starting with them. (per default, only in Title)', default=None, dest='search_string')
+    parser.add_argument('--html', help='Also look through the article texts to find the search term', action="store_true")
     parser.add_argument('--write_adj_list', metavar='PATH', type=str, help='graph adjacency list file will be stored in this path.', default=None)
     parser.add_argument('--write_gml', metavar='PATH', type=str, help='graph will be stored in this path in gml format. Good for analysis in other graph exploration tools.', default=None)
-    parser.add_argument('--write_with_html', help='also save html into the output file into the export format. Not compatible with adjacency lists.', action='store_true')
+    parser.add_argument('--write_edge_list', metavar='PATH', type=str, help='edges of the graph will be stored in this path, as TSV if it ends in .tsv, otherwise as CSV.', default=None)
+    parser.add_argument('--write_graphml', metavar='PATH', type=str, help='graph will be stored in this path in GraphML format.', default=None)
+    parser.add_argument('--write_with_html', help='also save html into the output file into the export format. Only for gml and GraphML.', action='store_true')
+    # All --write_* files are compressed if their path ends in .gz (gzip) or .zst (zstd, requires zstandard).
     parser.add_argument('--save', type=str, metavar='PATH', help='Save the graph in this path', default=None)
+    parser.add_argument('--save_format', choices=['binary', 'pickle'], help='File format of the saved graph. Binary files load much faster. Both can be loaded with --infile.', default='binary')
+    parser.add_argument('--save_with_html', help='also store the compressed html of all articles in the saved graph (binary format only)', action='store_true')
+    parser.add_argument('--progress', choices=['line', 'log', 'none'], help='How the progress of the crawl is shown: a line on the console, log messages every 10 seconds, or not at all', default='line')
+    parser.add_argument('--metrics', metavar='PATH', type=str, help='Write crawl metrics (download latencies and sizes, extraction times, cache hits, frontier sizes, nodes per second) to this file: in Prometheus text format if it ends in .prom, otherwise appended as JSON lines.', default=None)
+    parser.add_argument('--metrics_interval', metavar='SECONDS', type=float, help='Write the metrics this often during the crawl', default=10.0)
+    parser.add_argument('--profile', metavar='PATH', type=str, help='Profile the run with cProfile and write the stats to this file (readable with pstats or snakeviz)', default=None)
     args = parser.parse_args()
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        def dump_profile():
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f'Profile written to {args.profile}. The most expensive calls:')
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+        # Also written when the run ends early.
+        atexit.register(dump_profile)
+        profiler.enable()
+    reporters = []
+    if args.progress == 'line':
+        reporters.append(ConsoleProgress())
+    elif args.progress == 'log':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+        reporters.append(LogProgress())
+    if args.metrics:
+        reporters.append(MetricsProgress(args.metrics, args.metrics_interval))
+        atexit.register(wikigraph_metrics.write_metrics, args.metrics)
+    progress = Reporters(*reporters) if reporters else ProgressReporter()
+    term = args.strategy_term
+    if term and term.startswith(('https://', 'http://')):
+        term = WikiArticle.title_from_url(term)
+    try:
+        strategy = make_frontier(args.strategy, term)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    try:
+        html_retention = make_html_store(args.keep_html, codec=args.html_codec, spill_dir=args.html_spill_dir,
+                                         budget=int(args.html_budget * 1024 ** 2) if args.html_budget is not None else None)
+    except ImportError as e:
+        print(e)
+        exit(1)
+    # The fetcher (and requests with it) is only set up for runs that download something, not eg. for exports of saved graphs.
+    fetcher = link_source = api_url = None
+    if (args.url and not args.dump) or args.resume or args.extend or args.find_path or args.backend == 'api':
+        from fetcher import Fetcher
+        fetcher = Fetcher(pool_size=max(10, args.concurrency), rate=args.rate, max_rate=max(args.rate, args.max_rate),
+                          retries=args.retries, timeout=(min(5, args.timeout), args.timeout))
+    if args.backend == 'api' or (args.find_path and args.path_backward == 'api'):
+        from mediawiki_api import API_PATH, MediaWikiLinkSource
+        api_url = args.api_url
+        if api_url is None:
+            start = args.url or (args.find_path[0] if args.find_path else None)
+            host = urlsplit(start) if start else None
+            api_url = f'{host.scheme or "https"}://{host.netloc}{API_PATH}' if host and host.netloc else f'https://de.wikipedia.org{API_PATH}'
+        if args.backend == 'api':
+            link_source = MediaWikiLinkSource(api_url, fetcher)
+    page_cache = None
+    if args.cache:
+        page_cache = DiskPageCache(args.cache, max_bytes=args.cache_size * 1024 ** 2, ttl=args.cache_ttl * 3600)
     # Creation of graph object:
     if args.url and args.infile:
         print('You can either specify an url around which the graph is created, or specify a file from which it is loaded.')
         exit(1)
     
-    elif args.url:
+    elif args.url or args.resume or args.dump:
+        if args.out_of_core and (not args.url or args.resume or args.dump or not args.save or args.save_format != 'binary'):
+            print('--out_of_core crawls around an --url and writes the graph straight into --save, in the binary format.')
+            exit(1)
         # If the graph is created, more than likely, it should be saved. Terminating early if the path to the save is invalid.
-        if not args.save and not args.write_gml and not args.write_adj_list:
+        if not args.save and not args.write_gml and not args.write_adj_list and not args.write_edge_list and not args.write_graphml:
             print('\nWARNING: You have not specified any persistence for your graph. If this is a mistake, terminate now and start with appropriate arguments.\n')
         if args.save:
             if os.path.exists(args.save): 
@@ -38,8 +277,46 @@ if __name__=='__main__':
             if not os.path.exists(os.path.dirname(os.path.abspath(args.save))):
                 print(f'{args.save} is an invalid path. The graph could not be saved. Aborting creation...')
                 exit(1)
-        print(f'Creating wikigraph around {args.url} with depth {args.depth} and maximum size {args.size}')
-        graph = WikiGraph(args.url, args.depth, args.size)
+        if args.resume:
+            print(f'Resuming crawl from {args.resume}')
+            try:
+                graph = WikiGraph.resume(args.resume, args.depth, args.size, concurrency=args.concurrency, page_cache=page_cache,
+                                         eager_titles=args.eager_titles, checkpoint_every=args.checkpoint_every,
+                                         search_index=args.search_index, fetcher=fetcher, progress=progress,
+                                         strategy=strategy, parse_workers=args.parse_workers, html_retention=html_retention,
+                                         link_source=link_source)
+            except (FileNotFoundError, ValueError) as e:
+                print(f'{args.resume} could not be resumed: {e}')
+                exit(1)
+        elif args.dump:
+            depth = args.depth if args.depth is not None else 10
+            size = args.size if args.size is not None else 500
+            if not args.url and not args.full:
+                print('Either specify an --url around which the graph is built from the dumps, or build the --full graph.')
+                exit(1)
+            try:
+                graph = WikiGraph.from_dump(args.dump, args.url, depth, size, index_path=args.dump_index, full=args.full, progress=progress,
+                                            strategy=strategy)
+            except (FileNotFoundError, ValueError) as e:
+                print(f'The graph could not be built from the dumps: {e}')
+                exit(1)
+        else:
+            depth = args.depth if args.depth is not None else 10
+            size = args.size if args.size is not None else 500
+            if args.checkpoint and os.path.exists(args.checkpoint):
+                print(f'There is already a file at {args.checkpoint}. To continue that crawl, use --resume {args.checkpoint}. Aborting creation...')
+                exit(1)
+            if args.out_of_core:
+                print(f'Crawling wikigraph around {args.url} with depth {depth} and maximum size {size} into {args.save}')
+                graph = WikiGraph.crawl_to_disk(args.url, args.save, depth, size, memory=int(args.memory * 1024 ** 2),
+                                                work_dir=args.work_dir, concurrency=args.concurrency, page_cache=page_cache,
+                                                link_source=link_source, fetcher=fetcher, progress=progress)
+            else:
+                print(f'Creating wikigraph around {args.url} with depth {depth} and maximum size {size}')
+                graph = WikiGraph(args.url, depth, size, concurrency=args.concurrency, page_cache=page_cache,
+                                  eager_titles=args.eager_titles, checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                                  search_index=args.search_index, fetcher=fetcher, progress=progress, strategy=strategy,
+                                  parse_workers=args.parse_workers, html_retention=html_retention, link_source=link_source)
     elif args.infile:
         print(f'Loading wikigraph from {args.infile}...')
         try:
@@ -47,6 +324,21 @@ if __name__=='__main__':
         except FileNotFoundError as e:
             print(f'{args.infile} could not be loaded: Path invalid.')
             exit(1)
+        if page_cache:
+            graph.page_cache = page_cache
+        if html_retention is not None:
+            graph.html_retention = html_retention
+        graph.link_source = link_source
+        if args.extend:
+            graph.progress = progress
+            graph.strategy = strategy
+            graph.parse_workers = args.parse_workers
+            print(f'Extending wikigraph to depth {args.depth or graph.parameters["depth"]} and maximum size {args.size or graph.parameters["max_nodes"]}')
+            graph.extend(args.depth, args.size)
+    elif args.find_path:
+        # Nothing but the source article, the search fetches what it needs.
+        graph = WikiGraph(args.find_path[0], 0, 1, concurrency=args.concurrency, page_cache=page_cache, fetcher=fetcher,
+                          progress=ProgressReporter(), link_source=link_source)
     else:
         print('You need to either specify a file from which the graph should be loaded, or an url around which it should be created. See --help for help.')
         exit(1)
@@ -54,6 +346,17 @@ if __name__=='__main__':
     ##############
     # Processing #
     ##############
+    if args.find_path:
+        source, target = args.find_path
+        backward = 'graph' if args.path_backward == 'graph' else None
+        if args.path_backward == 'api':
+            backward = MediaWikiLinkSource(api_url, fetcher, prop='linkshere')
+        print(f'Searching paths from {source} to {target}...')
+        paths = graph.find_path(source, target, args.paths, args.path_max_length, backward, args.path_max_articles)
+        if not paths:
+            print(f'No path of at most {args.path_max_length} references found.')
+        for number, path in enumerate(paths, 1):
+            print(f'{number}. ({len(path) - 1} references) ' + ' -> '.join(WikiArticle.title_from_url(url) for url in path))
     # First, draw the graph. It will be displayed while further processing to files takes place.
     if args.draw:
         print(f'drawing graph...')
@@ -61,7 +364,8 @@ if __name__=='__main__':
             print(f'Highlighting all article-nodes containing {args.search_string}')
             if args.html:
                 print(f'Also searching HTML for {args.search_string}')
-        graph.draw(search_term=args.search_string, search_html=args.html)
+        graph.draw(search_term=args.search_string, search_html=args.html, large=True if args.draw_large else None,
+                   reduction=args.draw_reduction, max_drawn=args.draw_max_nodes)
     
     # Write adjacency list file if specified
     if args.write_adj_list:
@@ -72,6 +376,8 @@ if __name__=='__main__':
             print(f'There is already a file in {args.write_adj_list}. Not overwriting.')
         except FileNotFoundError:
             print(f'{args.write_adj_list}: Path invalid')
+        except ImportError as e:
+            print(e)
     # Write gml file if specified
     if args.write_gml:
         print(f'writing gml to {args.write_gml}')
@@ -82,11 +388,37 @@ if __name__=='__main__':
             print(f'There is already a file in {args.write_gml}. Not overwriting.')
         except FileNotFoundError:
             print(f'{args.write_gml}: Path invalid')
+        except ImportError as e:
+            print(e)
+    # Write edge list if specified
+    if args.write_edge_list:
+        print(f'writing edge list to {args.write_edge_list}')
+        try:
+            graph.write_edge_list(args.write_edge_list, '\t' if format_of(args.write_edge_list) == 'tsv' else ',')
+        except FileExistsError:
+            print(f'There is already a file in {args.write_edge_list}. Not overwriting.')
+        except FileNotFoundError:
+            print(f'{args.write_edge_list}: Path invalid')
+        except ImportError as e:
+            print(e)
+    # Write GraphML file if specified
+    if args.write_graphml:
+        print(f'writing GraphML to {args.write_graphml}')
+        if args.write_with_html: print('including article html as GraphML properties')
+        try:
+            graph.write_graphml(args.write_graphml, args.write_with_html)
+        except FileExistsError:
+            print(f'There is already a file in {args.write_graphml}. Not overwriting.')
+        except FileNotFoundError:
+            print(f'{args.write_graphml}: Path invalid')
+        except ImportError as e:
+            print(e)
 
-    if args.save:
+    # Out-of-core crawls were saved while crawling.
+    if args.save and not args.out_of_core:
         print(f'saving graph at {args.save}')
         try:
-            graph.save(args.save)
+            graph.save(args.save, format=args.save_format, with_html=args.save_with_html)
         except FileExistsError:
             print(f'There is already a file in {args.save}. Not overwriting.')
         except FileNotFoundError:
@@ -0,0 +1,257 @@
+"""Drawing of graphs too large for pyvis and the physics of the browser.
+
+The graph is reduced to a drawable amount of nodes first: By PageRank (top), by collapsing the leaves of every node into
+one aggregate node (collapse), or by sampling. The layout is computed here, with a sampled Fruchterman-Reingold, so
+the browser only has to display fixed positions. Nodes and edges are written as compact JSON chunks, which the page
+loads one after another. The chunks are wrapped into script files, as browsers do not fetch plain JSON from local files.
+"""
+import json
+import os
+import webbrowser
+from html import escape
+
+import numpy as np
+
+from graph_core import GraphCore, MERGED
+from wikigraph_analytics import GraphAnalytics
+
+REDUCTIONS = ('top', 'collapse', 'sample')
+# Nodes and edges per chunk file
+CHUNK_SIZE = 2000
+VIS_NETWORK = 'https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js'
+
+
+class ReducedGraph:
+    """The part of a graph that is drawn.
+
+    Attributes:
+        ids (np.ndarray): ids of the drawn nodes of the original graph
+        sources, targets (np.ndarray): edges between the drawn nodes, as positions in ids
+        aggregates (list[tuple[int, int]]): position in ids of the parent and amount of leaves of every aggregate node
+    """
+    def __init__(self, ids, sources, targets, aggregates=()) -> None:
+        self.ids = ids
+        self.sources = sources
+        self.targets = targets
+        self.aggregates = list(aggregates)
+
+
+def _induced(core, ids, aggregates=()):
+    position = np.full(len(core), -1, dtype=np.int64)
+    position[ids] = np.arange(len(ids))
+    sources, targets = core.edges()
+    sources, targets = position[sources], position[targets]
+    inside = (sources >= 0) & (targets >= 0)
+    return ReducedGraph(ids, sources[inside], targets[inside], aggregates)
+
+
+def reduce_graph(core: GraphCore, analytics: GraphAnalytics, root_id: int, max_nodes: int, reduction: str = 'top',
+                 keep=(), seed: int = 0) -> ReducedGraph:
+    """Reduces a graph to at most max_nodes nodes (plus those in keep and the root).
+
+    Args:
+        core (GraphCore): the graph
+        analytics (GraphAnalytics): analytics of the graph, for the importance of nodes
+        root_id (int): id of the root, which is always kept
+        max_nodes (int): amount of nodes to keep
+        reduction (str, optional): top: the nodes with the highest PageRank. collapse: leaves (referenced once, referencing
+            nothing) become one aggregate node per parent, then top if there are still too many. sample: random nodes.
+            Defaults to 'top'.
+        keep (Iterable[int], optional): ids of nodes that are kept in any case, eg. search results. Defaults to ().
+        seed (int, optional): Seed of the sampling. Defaults to 0.
+
+    Raises:
+        ValueError: the reduction is unknown
+
+    Returns:
+        ReducedGraph: the nodes and edges to draw
+    """
+    if reduction not in REDUCTIONS:
+        raise ValueError(f'Unknown reduction {reduction}, choose from {", ".join(REDUCTIONS)}.')
+    size = len(core)
+    forced = np.zeros(size, dtype=bool)
+    forced[root_id] = True
+    forced[list(keep)] = True
+    # Tombstones of merged nodes are no nodes to draw.
+    candidates = core.expansion_array() != MERGED
+    aggregates = {}
+    if reduction == 'collapse':
+        leaves = (core.in_degrees() == 1) & (core.out_degrees() == 0) & ~forced
+        candidates &= ~leaves
+        leaf_ids = np.flatnonzero(leaves)
+        parents = core.reverse_csr()[1][core.reverse_csr()[0][leaf_ids]]
+        for parent, count in zip(*np.unique(parents, return_counts=True)):
+            aggregates[int(parent)] = int(count)
+    if candidates.sum() > max_nodes:
+        if reduction == 'sample':
+            chosen = np.random.default_rng(seed).choice(np.flatnonzero(candidates), max_nodes, replace=False)
+        else:
+            values = np.where(candidates, analytics.pagerank(), -1)
+            chosen = analytics.top_k(values, max_nodes)
+        selected = np.zeros(size, dtype=bool)
+        selected[chosen] = True
+        candidates &= selected
+    ids = np.flatnonzero(candidates | forced)
+    position = {int(node_id): index for index, node_id in enumerate(ids)}
+    return _induced(core, ids, [(position[parent], count) for parent, count in aggregates.items() if parent in position])
+
+
+def layout(count: int, sources, targets, iterations: int = 50, seed: int = 0, samples: int = 400, block: int = 1024) -> np.ndarray:
+    """Fruchterman-Reingold layout with attraction along the edges. Repulsion is computed against a random sample of
+    nodes in every iteration (weighted up accordingly) instead of against all of them, which keeps the cost linear.
+
+    Args:
+        count (int): amount of nodes
+        sources, targets (np.ndarray): edges as node positions
+        iterations (int, optional): Defaults to 50.
+        seed (int, optional): Seed of the initial positions and the samples. Defaults to 0.
+        samples (int, optional): Nodes against which the repulsion is computed per iteration. Defaults to 400.
+        block (int, optional): Nodes whose repulsion is computed at once. Memory is block * samples * 8 bytes. Defaults to 1024.
+
+    Returns:
+        np.ndarray: x and y of every node (count x 2), within [-1, 1]
+    """
+    random = np.random.default_rng(seed)
+    positions = random.uniform(-1, 1, (count, 2)).astype(np.float32)
+    if count < 2:
+        return positions
+    # Ideal distance between nodes, for an area of 4
+    ideal = np.float32(2 / np.sqrt(count))
+    temperature = 0.2
+    for _ in range(iterations):
+        if count > samples:
+            reference = positions[random.choice(count, samples, replace=False)]
+            weight = np.float32(count / samples)
+        else:
+            reference, weight = positions, np.float32(1)
+        displacement = np.zeros_like(positions)
+        for start in range(0, count, block):
+            difference = positions[start:start + block, None, :] - reference[None, :, :]
+            squared = np.maximum((difference ** 2).sum(axis=2), 1e-6)
+            displacement[start:start + block] = weight * (difference * (ideal ** 2 / squared)[:, :, None]).sum(axis=1)
+        delta = positions[sources] - positions[targets]
+        attraction = delta * (np.sqrt((delta ** 2).sum(axis=1)) / ideal)[:, None]
+        np.add.at(displacement, sources, -attraction)
+        np.add.at(displacement, targets, attraction)
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= 0.93
+    positions -= positions.mean(axis=0)
+    return positions / max(np.abs(positions).max(), 1e-9)
+
+
+_PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{vis}"></script>
+<style>body {{ margin: 0; font-family: sans-serif; }} #graph {{ width: {width}; height: {height}; border: 1px solid lightgray; }}</style>
+</head>
+<body>
+<div id="status">Loading...</div>
+<div id="graph"></div>
+<script>
+var chunks = {chunks};
+var nodes = new vis.DataSet();
+var edges = new vis.DataSet();
+var network = new vis.Network(document.getElementById("graph"), {{nodes: nodes, edges: edges}}, {{
+    physics: false,
+    layout: {{improvedLayout: false}},
+    interaction: {{hideEdgesOnDrag: true, tooltipDelay: 100}},
+    nodes: {{shape: "dot", font: {{size: 10}}}},
+    edges: {{arrows: {{to: {{scaleFactor: 0.3}}}}, smooth: false, color: {{opacity: 0.25}}}}
+}});
+var urls = {{}};
+var edgeCount = 0;
+// Called by every chunk file: nodes as [id, x, y, size, label, url, highlighted], edges as flat pairs of ids.
+function wikigraphChunk(data) {{
+    nodes.add(data.nodes.map(function (n) {{
+        if (n[5]) urls[n[0]] = n[5];
+        return {{id: n[0], x: n[1], y: n[2], size: n[3], label: n[4], title: n[4], color: n[6] ? "red" : (n[5] ? undefined : "lightgray")}};
+    }}));
+    var added = [];
+    for (var i = 0; i < data.edges.length; i += 2) added.push({{id: edgeCount++, from: data.edges[i], to: data.edges[i + 1]}});
+    edges.add(added);
+    loadNext();
+}}
+var next = 0;
+function loadNext() {{
+    if (next >= chunks.length) {{ document.getElementById("status").textContent = "{summary}"; return; }}
+    document.getElementById("status").textContent = "Loading " + (next + 1) + " of " + chunks.length + "...";
+    var script = document.createElement("script");
+    script.src = chunks[next++];
+    document.body.appendChild(script);
+}}
+network.on("doubleClick", function (event) {{
+    if (event.nodes.length && urls[event.nodes[0]]) window.open(urls[event.nodes[0]]);
+}});
+loadNext();
+</script>
+</body>
+</html>
+'''
+
+
+def write_drawing(directory: str, core: GraphCore, reduced: ReducedGraph, title_of, importance, highlighted=(),
+                  iterations: int = 50, height: str = '1000px', width: str = '100%') -> str:
+    """Lays out a reduced graph and writes it as page with chunk files into a directory.
+
+    Args:
+        directory (str): directory of the drawing, created if it does not exist
+        core (GraphCore): the graph
+        reduced (ReducedGraph): what of the graph to draw
+        title_of (callable): title of a node by id
+        importance (np.ndarray): value of every node of the graph which determines its size
+        highlighted (Iterable[int], optional): ids of the nodes to color red. Defaults to ().
+        iterations (int, optional): Iterations of the layout. Defaults to 50.
+        height (str, optional): Height of the drawing (css). Defaults to '1000px'.
+        width (str, optional): Width of the drawing (css). Defaults to '100%'.
+
+    Returns:
+        str: path of the page
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Chunks of an earlier drawing into the same directory would be left over otherwise.
+    for name in os.listdir(directory):
+        if name.startswith('chunk_') and name.endswith('.js'):
+            os.remove(os.path.join(directory, name))
+    count = len(reduced.ids)
+    positions = layout(count, reduced.sources, reduced.targets, iterations)
+    # Spread the nodes, so that labels of neighbours do not overlap too much
+    scale = 40 * np.sqrt(count + len(reduced.aggregates))
+    values = importance[reduced.ids].astype(np.float64)
+    sizes = 5 + 25 * np.sqrt(values / values.max()) if count and values.max() > 0 else np.full(count, 5.0)
+    highlighted = set(highlighted)
+    records = [[index, round(float(x * scale), 1), round(float(y * scale), 1), round(float(size), 1), title_of(int(node_id)),
+                core.urls[int(node_id)], int(node_id) in highlighted]
+               for index, (node_id, (x, y), size) in enumerate(zip(reduced.ids, positions, sizes))]
+    edges = np.stack([reduced.sources, reduced.targets], axis=1).ravel().tolist()
+    # Aggregate nodes sit a little further out than their parent
+    for number, (parent, leaves) in enumerate(reduced.aggregates):
+        aggregate = count + number
+        x, y = positions[parent]
+        direction = np.array([x, y]) / max(np.hypot(x, y), 1e-9)
+        records.append([aggregate, round(float((x + 0.03 * direction[0]) * scale), 1), round(float((y + 0.03 * direction[1]) * scale), 1),
+                        round(float(4 + np.log2(leaves)), 1), f'+{leaves}', None, False])
+        edges.extend((parent, aggregate))
+    chunks = []
+    for number, start in enumerate(range(0, max(len(records), len(edges) // 2, 1), CHUNK_SIZE)):
+        name = f'chunk_{number:04d}.js'
+        data = {'nodes': records[start:start + CHUNK_SIZE], 'edges': edges[2 * start:2 * (start + CHUNK_SIZE)]}
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as file:
+            file.write('wikigraphChunk(' + json.dumps(data, ensure_ascii=False, separators=(',', ':')) + ');\n')
+        chunks.append(name)
+    summary = f'{count} of {len(core)} articles and {len(reduced.sources)} of {core.edge_count} references'
+    if reduced.aggregates:
+        summary += f', {sum(leaves for _, leaves in reduced.aggregates)} leaves in {len(reduced.aggregates)} aggregates'
+    page = os.path.join(directory, 'index.html')
+    with open(page, 'w', encoding='utf-8') as file:
+        file.write(_PAGE.format(title=escape(os.path.basename(os.path.abspath(directory))), vis=VIS_NETWORK, width=width, height=height,
+                                chunks=json.dumps(chunks), summary=escape(summary + '. Double click opens an article.')))
+    return page
+
+
+def show(page: str):
+    """Opens a drawing in the standard browser."""
+    webbrowser.open('file://' + os.path.abspath(page))
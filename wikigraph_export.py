@@ -0,0 +1,163 @@
+"""Streaming exporters of graphs into the formats of other graph tools: GML, adjacency list, edge list (CSV/TSV) and GraphML.
+
+Nodes and edges are written straight from the core to the file, one at a time, so next to the graph itself only the
+node that is currently written is held in memory. Files ending in .gz are gzip compressed, files ending in .zst are
+zstd compressed (requires the zstandard package).
+"""
+import csv
+import gzip
+import io
+import re
+from xml.sax.saxutils import quoteattr, escape as xml_escape
+
+import numpy as np
+
+from graph_core import GraphCore, MERGED
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Edges are written in chunks of this many, to keep the conversion of the id arrays vectorized.
+_CHUNK = 65536
+_GML_ESCAPE = re.compile('[^ -~]|[&"]')
+
+
+def open_output(path: str):
+    """Opens a new text file for writing, compressed according to its extension.
+
+    Raises:
+        FileExistsError: there is already a file in this path.
+        ImportError: zstd compression was requested, but zstandard is not installed.
+
+    Returns:
+        TextIO: the opened file
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'xt', encoding='utf-8', newline='')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError('Writing .zst files requires the zstandard package (pip install zstandard).')
+        raw = open(path, 'xb')
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw, closefd=True), encoding='utf-8', newline='')
+    return open(path, 'xt', encoding='utf-8', newline='')
+
+
+def _gml_string(text):
+    # Like networkx: character references for everything but printable ascii, and for quotes and ampersands.
+    return '"' + _GML_ESCAPE.sub(lambda match: f'&#{ord(match.group(0))};', text) + '"'
+
+
+def _edge_chunks(core: GraphCore):
+    # Whole sources at a time, up to about _CHUNK edges, so that the sources are never spelled out for all edges at once.
+    indptr, indices = core.csr()
+    node_count = len(indptr) - 1
+    start = 0
+    while start < node_count:
+        end = min(node_count, max(start + 1, int(np.searchsorted(indptr, indptr[start] + _CHUNK, side='right')) - 1))
+        sources = np.repeat(np.arange(start, end, dtype=np.int32), np.diff(indptr[start:end + 1]))
+        yield sources.tolist(), indices[indptr[start]:indptr[end]].tolist()
+        start = end
+
+
+def write_gml(path: str, core: GraphCore, nodes):
+    """Writes a graph in GML. Nodes are labeled with their url.
+
+    Args:
+        path (str): path of the new file
+        core (GraphCore): core of the graph
+        nodes (Iterable[tuple[int, str, str | None]]): id, title and html (None to leave it out) of every node, in order of ids
+    """
+    with open_output(path) as file:
+        file.write('graph [\n  directed 1\n')
+        for node_id, title, html in nodes:
+            file.write(f'  node [\n    id {node_id}\n    label {_gml_string(core.urls[node_id])}\n    title {_gml_string(title)}\n')
+            if html is not None:
+                file.write(f'    html {_gml_string(html)}\n')
+            file.write('  ]\n')
+        for sources, targets in _edge_chunks(core):
+            file.writelines(f'  edge [\n    source {source}\n    target {target}\n  ]\n' for source, target in zip(sources, targets))
+        file.write(']\n')
+
+
+def write_adjacency_list(path: str, core: GraphCore):
+    """Writes a graph as adjacency list: One line per node, its url followed by the urls it references, separated by spaces.
+
+    Args:
+        path (str): path of the new file
+        core (GraphCore): core of the graph
+    """
+    indptr, indices = core.csr()
+    urls = core.urls
+    with open_output(path) as file:
+        for node_id in range(len(core)):
+            if core.expansion[node_id] == MERGED:
+                continue
+            successors = indices[indptr[node_id]:indptr[node_id + 1]].tolist()
+            file.write(' '.join([urls[node_id]] + [urls[successor] for successor in successors]) + '\n')
+
+
+def write_edge_list(path: str, core: GraphCore, delimiter: str = ','):
+    """Writes a graph as list of edges with a header line: source and target url of one edge per line.
+
+    Args:
+        path (str): path of the new file
+        core (GraphCore): core of the graph
+        delimiter (str, optional): ',' for CSV, '\\t' for TSV. Defaults to ','.
+    """
+    urls = core.urls
+    with open_output(path) as file:
+        writer = csv.writer(file, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(('source', 'target'))
+        for sources, targets in _edge_chunks(core):
+            writer.writerows((urls[source], urls[target]) for source, target in zip(sources, targets))
+
+
+def write_graphml(path: str, core: GraphCore, nodes, with_html: bool = False):
+    """Writes a graph in GraphML. Nodes are identified by their url.
+
+    Args:
+        path (str): path of the new file
+        core (GraphCore): core of the graph
+        nodes (Iterable[tuple[int, str, str | None]]): id, title and html of every node, in order of ids
+        with_html (bool, optional): Declare the html attribute. Defaults to False.
+    """
+    urls = core.urls
+    with open_output(path) as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                   '  <key id="title" for="node" attr.name="title" attr.type="string"/>\n')
+        if with_html:
+            file.write('  <key id="html" for="node" attr.name="html" attr.type="string"/>\n')
+        file.write('  <graph edgedefault="directed">\n')
+        for node_id, title, html in nodes:
+            file.write(f'    <node id={quoteattr(urls[node_id])}><data key="title">{xml_escape(title)}</data>')
+            if html is not None:
+                file.write(f'<data key="html">{xml_escape(html)}</data>')
+            file.write('</node>\n')
+        for sources, targets in _edge_chunks(core):
+            file.writelines(f'    <edge source={quoteattr(urls[source])} target={quoteattr(urls[target])}/>\n'
+                            for source, target in zip(sources, targets))
+        file.write('  </graph>\n</graphml>\n')
+
+
+FORMATS = {
+    'gml': '.gml',
+    'adjlist': '.adjlist',
+    'csv': '.csv',
+    'tsv': '.tsv',
+    'graphml': '.graphml',
+}
+
+
+def format_of(path: str):
+    """
+    Returns:
+        str | None: export format according to the extension of the path (ignoring .gz/.zst), None if unknown
+    """
+    name = re.sub(r'\.(gz|zst)$', '', path.lower())
+    for format, extension in FORMATS.items():
+        if name.endswith(extension):
+            return format
+    return None
@@ -0,0 +1,335 @@
+"""Binary file format for WikiGraphs.
+
+Layout (all numbers little endian):
+    prelude:  magic b'WIKIGRPH', uint16 version, uint16 flags (unused), uint32 length of the header
+    header:   utf-8 JSON with root, depth, counts, build parameters and the position of every section.
+              Prelude and header are padded to HEADER_SPACE bytes, so the header can be read with a single small read.
+    sections: 8 byte aligned, each listed in the header as name: [offset, length]
+        url_offsets/url_data       string table of the urls, uint64 offsets (n+1) into utf-8 data
+        title_offsets/title_data   string table of the titles known from the pages themselves, empty if unknown
+        depths                     int32 (n)
+        indptr/indices             forward CSR adjacency, int64 (n+1) / int32 (edges)
+        reverse_indptr/reverse_indices  backward CSR adjacency
+        expansion                  uint8 (n), whether the references of a node have been added (see graph_core)
+        pending                    optional, utf-8 JSON of the references of partially expanded nodes that did not fit anymore
+        aliases                    optional, utf-8 JSON of further urls of nodes (see graph_core), by url
+        html_offsets/html_data     optional, zlib compressed html of every node, empty if not stored
+        search_<field>_terms_offsets/_data, search_<field>_indptr, search_<field>_ids
+                                   optional, inverted search index (see search_index) of the fields title and body:
+                                   sorted terms, int64 (terms+1) index pointers and int32 ids of the nodes containing them
+        search_bodies              optional, uint8 flags of the nodes whose text is in the search index
+
+Sections which a reader does not know are ignored, so new ones can be added without breaking older readers.
+"""
+import errno
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import Sequence
+
+import numpy as np
+
+from graph_core import GraphCore
+from search_index import FIELDS, SearchIndex
+
+MAGIC = b'WIKIGRPH'
+VERSION = 1
+HEADER_SPACE = 4096
+_PRELUDE = struct.Struct('<8sHHI')
+
+
+def is_graph_file(path: str) -> bool:
+    """
+    Returns:
+        bool: Does the file start like a binary WikiGraph file?
+    """
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def read_header(path: str) -> dict:
+    """Reads only the header of a binary WikiGraph file, leaving nodes and edges untouched.
+
+    Args:
+        path (str): path of the file
+
+    Raises:
+        ValueError: The file is no binary WikiGraph file, or of a newer version than this reader.
+
+    Returns:
+        dict: header of the file
+    """
+    with open(path, 'rb') as file:
+        return _parse_header(file.read(HEADER_SPACE), path)
+
+
+def _parse_header(data, path):
+    magic, version, _, length = _PRELUDE.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is no binary WikiGraph file.')
+    if version > VERSION:
+        raise ValueError(f'{path} has format version {version}, but only up to {VERSION} can be read. Time for an update!')
+    header = json.loads(bytes(data[_PRELUDE.size:_PRELUDE.size + length]).decode('utf-8'))
+    header['version'] = version
+    return header
+
+
+class _SectionWriter:
+    def __init__(self, file) -> None:
+        self._file = file
+        self.sections = {}
+
+    def _align(self):
+        padding = -self._file.tell() % 8
+        self._file.write(b'\0' * padding)
+
+    def write(self, name, data):
+        self._align()
+        offset = self._file.tell()
+        if isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data).data
+        self._file.write(data)
+        self.sections[name] = [offset, self._file.tell() - offset]
+
+    def write_chunks(self, name, chunks):
+        """Writes one section out of an iterable of arrays, one chunk at a time."""
+        self._align()
+        offset = self._file.tell()
+        for chunk in chunks:
+            self._file.write(np.ascontiguousarray(chunk).data)
+        self.sections[name] = [offset, self._file.tell() - offset]
+
+    def write_blobs(self, name, blobs, count, offsets=None):
+        """Writes an offsets and a data section out of an iterable of bytes objects, one blob at a time.
+        The offsets are collected in the given uint64 array of count + 1 entries (eg. a memory mapped one), or in a new one.
+        """
+        if offsets is None:
+            offsets = np.zeros(count + 1, dtype=np.uint64)
+        offsets[0] = 0
+        self._align()
+        start = self._file.tell()
+        position = 0
+        for index, blob in enumerate(blobs):
+            self._file.write(blob)
+            position += len(blob)
+            offsets[index + 1] = position
+        self.sections[f'{name}_data'] = [start, position]
+        self.write(f'{name}_offsets', offsets)
+
+
+def write_graph(path: str, core: GraphCore, root_id: int, parameters: dict, titles=None, html_of=None, pending=None, search_index=None):
+    """Writes a graph core into a binary WikiGraph file.
+
+    Args:
+        path (str): path of the file. Must not exist yet.
+        core (GraphCore): core of the graph
+        root_id (int): id of the root node
+        parameters (dict): build parameters of the graph, stored in the header. Must be JSON serializable.
+        titles (Iterable[str], optional): title of every node, empty or None if not known. Defaults to None.
+        html_of (callable, optional): Returns the html of a node by id, or None. If given, an html section is written. Defaults to None.
+        pending (dict[int, list[str]], optional): References of partially expanded nodes that did not fit into the graph. Defaults to None.
+        search_index (SearchIndex, optional): Search index of the graph, with the titles of all nodes indexed. Defaults to None.
+    """
+    indptr, indices = core.csr()
+    reverse_indptr, reverse_indices = core.reverse_csr()
+    count = len(core)
+
+    def write(writer):
+        writer.write_blobs('url', (url.encode('utf-8') for url in core.urls), count)
+        if titles is not None:
+            writer.write_blobs('title', ((title or '').encode('utf-8') for title in titles), count)
+        writer.write('depths', core.depth_array())
+        writer.write('indptr', indptr.astype(np.int64))
+        writer.write('indices', indices.astype(np.int32))
+        writer.write('reverse_indptr', reverse_indptr.astype(np.int64))
+        writer.write('reverse_indices', reverse_indices.astype(np.int32))
+        writer.write('expansion', core.expansion_array())
+        if core.aliases:
+            writer.write('aliases', json.dumps(core.aliases, ensure_ascii=False).encode('utf-8'))
+        if pending:
+            writer.write('pending', json.dumps({str(node_id): references for node_id, references in pending.items()}).encode('utf-8'))
+        if html_of is not None:
+            def compressed_html():
+                for node_id in range(count):
+                    html = html_of(node_id)
+                    yield zlib.compress(html.encode('utf-8')) if html else b''
+            writer.write_blobs('html', compressed_html(), count)
+        if search_index is not None:
+            arrays = search_index.arrays()
+            for field in FIELDS:
+                terms, term_indptr, ids = arrays[field]
+                writer.write_blobs(f'search_{field}_terms', (term.encode('utf-8') for term in terms), len(terms))
+                writer.write(f'search_{field}_indptr', term_indptr)
+                writer.write(f'search_{field}_ids', ids)
+            writer.write('search_bodies', arrays['bodies'])
+    write_sections(path, core.urls[root_id], root_id, count, int(core.edge_count), parameters, write, merged=core.merged)
+
+
+def write_sections(path: str, root: str, root_id: int, node_count: int, edge_count: int, parameters: dict, write, merged: int = 0):
+    """Writes a binary WikiGraph file whose sections are written by a callback instead of taken from a GraphCore, eg. by
+    the out-of-core crawls of disk_crawl, which stream them from disk.
+
+    Args:
+        path (str): path of the file. Must not exist yet.
+        root (str): url of the root node
+        root_id (int): id of the root node
+        node_count (int): amount of nodes
+        edge_count (int): amount of edges
+        parameters (dict): build parameters of the graph, stored in the header. Must be JSON serializable.
+        write (callable): called with the section writer, whose write, write_chunks and write_blobs write the sections
+            listed in the layout above.
+        merged (int, optional): tombstones of merged redirects among the nodes. Defaults to 0.
+
+    Raises:
+        FileExistsError: there is already a file in the path.
+        ValueError: the header does not fit into the header space.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+    # Written next to the path and only moved there once complete. A failure (eg. a full disk) leaves no file without
+    # header behind, which would block the next attempt and not even be recognized as a binary graph.
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, mode='xb') as file:
+        try:
+            file.write(b'\0' * HEADER_SPACE)
+            writer = _SectionWriter(file)
+            write(writer)
+            header = {
+                'root': root,
+                'root_id': root_id,
+                'node_count': node_count,
+                'edge_count': edge_count,
+                # Tombstones of merged redirects, which are counted in node_count
+                'merged': merged,
+                'parameters': parameters,
+                'sections': writer.sections,
+            }
+            encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            if _PRELUDE.size + len(encoded) > HEADER_SPACE:
+                raise ValueError('The header of the graph does not fit into the header space.')
+            file.seek(0)
+            file.write(_PRELUDE.pack(MAGIC, VERSION, 0, len(encoded)))
+            file.write(encoded)
+        except BaseException:
+            file.close()
+            os.remove(temporary)
+            raise
+    os.replace(temporary, path)
+
+
+class StringTable(Sequence):
+    """Sequence of strings on top of an offsets array and a buffer of utf-8 data. Strings are only decoded when accessed."""
+    def __init__(self, offsets: np.ndarray, data) -> None:
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bytes(self._data[int(self._offsets[index]):int(self._offsets[index + 1])]).decode('utf-8')
+
+    def __reduce__(self):
+        # Pickled as what it represents, without the mapping underneath.
+        return list, (list(self),)
+
+
+class GraphFile:
+    """A memory mapped binary WikiGraph file. Arrays are views on the mapping, so opening costs next to nothing,
+    and only what is used is actually read from disk.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = _parse_header(self._mmap[:HEADER_SPACE], path)
+        self._sections = self.header['sections']
+
+    def has_section(self, name: str) -> bool:
+        return name in self._sections
+
+    def _bytes(self, name):
+        offset, length = self._sections[name]
+        return memoryview(self._mmap)[offset:offset + length]
+
+    def _array(self, name, dtype):
+        offset, length = self._sections[name]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def _strings(self, name):
+        return StringTable(self._array(f'{name}_offsets', np.uint64), self._bytes(f'{name}_data'))
+
+    def core(self) -> GraphCore:
+        """
+        Returns:
+            GraphCore: core on top of the mapped file
+        """
+        titles = self._strings('title') if self.has_section('title_offsets') else None
+        expansion = self._array('expansion', np.uint8) if self.has_section('expansion') else None
+        aliases = json.loads(bytes(self._bytes('aliases')).decode('utf-8')) if self.has_section('aliases') else None
+        return GraphCore.from_arrays(self._strings('url'), self._array('depths', np.int32),
+                                     self._array('indptr', np.int64), self._array('indices', np.int32),
+                                     self._array('reverse_indptr', np.int64), self._array('reverse_indices', np.int32),
+                                     titles=titles, expansion=expansion, aliases=aliases)
+
+    def pending_references(self) -> dict:
+        """
+        Returns:
+            dict[int, list[str]]: References of partially expanded nodes that did not fit into the graph, by node id.
+        """
+        if not self.has_section('pending'):
+            return {}
+        return {int(node_id): references for node_id, references in json.loads(bytes(self._bytes('pending')).decode('utf-8')).items()}
+
+    def search_index(self):
+        """
+        Returns:
+            SearchIndex | None: search index on top of the mapped file, None if none was saved.
+        """
+        if not self.has_section('search_bodies'):
+            return None
+        postings = {field: (self._strings(f'search_{field}_terms'), self._array(f'search_{field}_indptr', np.int64),
+                            self._array(f'search_{field}_ids', np.int32)) for field in FIELDS}
+        return SearchIndex.from_arrays(postings['title'], postings['body'], self._array('search_bodies', np.uint8),
+                                       self.header['node_count'])
+
+    @property
+    def has_html(self) -> bool:
+        return self.has_section('html_offsets')
+
+    def html(self, node_id: int):
+        """Reads and decompresses the stored html of one node.
+
+        Returns:
+            str | None: html of the node, None if it was not stored.
+        """
+        if not self.has_html:
+            return None
+        offsets = self._array('html_offsets', np.uint64)
+        start, end = int(offsets[node_id]), int(offsets[node_id + 1])
+        if start == end:
+            return None
+        offset = self._sections['html_data'][0]
+        return zlib.decompress(self._mmap[offset + start:offset + end]).decode('utf-8')
+
+
+class StoredHtml:
+    """Html store (see WikiArticle.html_store) that reads the html of articles out of a GraphFile."""
+    def __init__(self, graph_file: GraphFile, core: GraphCore) -> None:
+        self._graph_file = graph_file
+        self._core = core
+
+    def get(self, url: str):
+        node_id = self._core.id_of(url)
+        if node_id is None or node_id >= self._graph_file.header['node_count']:
+            return None
+        return self._graph_file.html(node_id)
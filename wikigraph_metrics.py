@@ -0,0 +1,180 @@
+"""Metrics of crawls: counters, gauges and histograms in a registry, exported as JSON lines or in the Prometheus text format.
+
+The modules of the crawl record into the module level REGISTRY:
+    wikigraph_fetch_seconds               histogram of the time it took to get a page (including cache lookups)
+    wikigraph_downloaded_bytes_total      bytes of page bodies received from servers
+    wikigraph_page_cache_total{result}    cache lookups by result: hit, revalidated or miss
+    wikigraph_http_total{event}           requests, retries, throttled and failed downloads of the fetcher
+    wikigraph_host_rate{host}             current request rate of the fetcher per host
+    wikigraph_extraction_seconds          histogram of the time it took to extract title and references of a page
+    wikigraph_frontier_size{depth}        nodes queued for expansion in the frontier of the crawl, by depth
+    wikigraph_expansions_total            nodes whose references were added
+    wikigraph_nodes_added_total           nodes added by crawls
+    wikigraph_nodes                       nodes in the graph of the running crawl
+    wikigraph_nodes_per_second            nodes added per second of the running crawl
+    wikigraph_html_store_bytes{where}     compressed html kept by html stores, in memory or spilled to disk
+    wikigraph_call_seconds{function}      histogram of the durations of functions decorated with debug_timing
+"""
+import json
+import math
+import os
+import threading
+from bisect import bisect_left
+from time import time
+
+# Seconds, from a millisecond to a minute
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    """Value that only goes up."""
+    kind = 'counter'
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Value that is set to whatever it currently is."""
+    kind = 'gauge'
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """Counts of observations within buckets of upper bounds, with their sum."""
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        # Buckets are upper bounds, inclusive. Values beyond the last one go into +Inf.
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'count': self.count, 'sum': self.sum, 'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.counts))}
+
+
+class MetricsRegistry:
+    """Metrics by name and labels. Asking for a metric that does not exist yet creates it."""
+    def __init__(self) -> None:
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, labels, **arguments):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(key, cls(**arguments))
+        return metric
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name: str, **labels) -> Gauge:
+        return self._get(Gauge, name, labels)
+
+    def histogram(self, name: str, buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+        return self._get(Histogram, name, labels, buckets=buckets)
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            dict: time and the current value of every metric, by name and labels (as in name{label="value"})
+        """
+        metrics = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            metrics[name + _labels(labels)] = metric.snapshot()
+        return {'time': time(), 'metrics': metrics}
+
+    def prometheus(self) -> str:
+        """
+        Returns:
+            str: all metrics in the Prometheus text exposition format
+        """
+        lines = []
+        typed = set()
+        for (name, labels), metric in sorted(list(self._metrics.items()), key=lambda item: item[0]):
+            if name not in typed:
+                lines.append(f'# TYPE {name} {metric.kind}')
+                typed.add(name)
+            if metric.kind == 'histogram':
+                snapshot = metric.snapshot()
+                cumulative = 0
+                for bound, count in snapshot['buckets'].items():
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(snapshot["sum"])}')
+                lines.append(f'{name}_count{_labels(labels)} {snapshot["count"]}')
+            else:
+                lines.append(f'{name}{_labels(labels)} {_number(metric.snapshot())}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{str(value)}"' for key, value in labels) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def write_jsonl(path: str, registry: 'MetricsRegistry' = None):
+    """Appends a snapshot of the metrics as one JSON line to a file."""
+    registry = registry or REGISTRY
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(registry.snapshot()) + '\n')
+
+
+def write_prometheus(path: str, registry: 'MetricsRegistry' = None):
+    """Replaces a file with the metrics in the Prometheus text format, eg. for the textfile collector of the node exporter."""
+    registry = registry or REGISTRY
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(registry.prometheus())
+    os.replace(temporary, path)
+
+
+def write_metrics(path: str, registry: 'MetricsRegistry' = None):
+    """Writes the metrics in Prometheus format if the path ends in .prom, otherwise appends them as JSON line."""
+    if path.endswith('.prom'):
+        write_prometheus(path, registry)
+    else:
+        write_jsonl(path, registry)
+
+
+REGISTRY = MetricsRegistry()
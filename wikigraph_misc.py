@@ -1,10 +1,47 @@
-#Decorator for timed debugging
-from time import time
+#Decorator for timed debugging. Durations go into the wikigraph_call_seconds histogram, and into the debug log.
+import functools
+import logging
+from time import perf_counter
+from wikigraph_metrics import REGISTRY
 def debug_timing(function):
+    histogram = REGISTRY.histogram('wikigraph_call_seconds', function=function.__name__)
+    @functools.wraps(function)
     def timed_execution(*args, **kwargs):
-        start = time()
-        returns = function(*args, **kwargs)
-        ex_time = (time()-start) * 1000
-        print(f'{function.__name__} took {ex_time}ms')
-        return returns
-    return timed_execution
\ No newline at end of file
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            ex_time = perf_counter() - start
+            histogram.observe(ex_time)
+            logging.getLogger('wikigraph').debug('%s took %.1fms', function.__name__, ex_time * 1000)
+    return timed_execution
+
+def ordered_prefetch(function, items, executor, window):
+    """Applies function to all items within an executor, while yielding the results in the order of the items.
+    At most window calls are in flight at any time, so that a long list of items does not flood the executor.
+
+    Args:
+        function (callable): Function that is applied to each item
+        items (iterable): Items to which the function is applied.
+        executor (concurrent.futures.Executor): Executor in which the function calls are run.
+        window (int): Maximum amount of calls that are submitted, but not yet consumed.
+
+    Yields:
+        tuple: (item, function(item)) in the order of the items.
+    """
+    from collections import deque
+    pending = deque()
+    iterator = iter(items)
+    try:
+        for item in iterator:
+            pending.append((item, executor.submit(function, item)))
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+    finally:
+        # If the consumer stops early (eg. because the graph is full), the calls that have not started are dropped.
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,147 @@
+"""Progress reporters of crawls. A crawl hands a Progress to its reporter when it starts, at the start of every layer,
+after every expanded node and when it is done. Reporters decide for themselves how often they actually report.
+"""
+import logging
+import sys
+from collections import namedtuple
+from time import monotonic
+
+import wikigraph_metrics
+
+Progress = namedtuple('Progress', ['depth', 'max_depth', 'layer_size', 'layer_done', 'expanded', 'added', 'failed',
+                                   'size', 'max_nodes', 'elapsed'])
+Progress.__doc__ = """State of a running crawl: the layer (depth) that is being expanded and how many of its nodes are done,
+expanded, added and failed nodes of the whole crawl, the size of the graph and seconds since the crawl started."""
+
+
+def nodes_per_second(progress: Progress) -> float:
+    return progress.added / progress.elapsed if progress.elapsed > 0 else 0.0
+
+
+def estimate_remaining(progress: Progress):
+    """Estimates the seconds until the crawl is done, from the rates of the crawl so far.
+
+    The crawl stops when the graph is full, or when the last layer is expanded. How many nodes the layers after the current
+    one will have is unknown before they are reached, so only in the last layer, the end of the layer counts.
+
+    Returns:
+        float | None: estimated seconds, None if nothing has happened to estimate from yet
+    """
+    if progress.elapsed <= 0 or not progress.expanded:
+        return None
+    estimates = []
+    if progress.added:
+        estimates.append((progress.max_nodes - progress.size) / nodes_per_second(progress))
+    if progress.depth >= progress.max_depth - 1:
+        estimates.append((progress.layer_size - progress.layer_done) / (progress.expanded / progress.elapsed))
+    return max(0.0, min(estimates)) if estimates else None
+
+
+class ProgressReporter:
+    """Interface of progress reporters. Does not report anything."""
+    def started(self, progress: Progress):
+        pass
+
+    def layer_started(self, progress: Progress):
+        pass
+
+    def update(self, progress: Progress):
+        pass
+
+    def finished(self, progress: Progress):
+        pass
+
+
+class _Throttled(ProgressReporter):
+    # Reports updates at most once per interval. Every other event is reported right away.
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._last = None
+
+    def update(self, progress):
+        now = monotonic()
+        if self._last is None or now - self._last >= self.interval:
+            self._last = now
+            self.report(progress)
+
+    def report(self, progress):
+        pass
+
+
+class ConsoleProgress(_Throttled):
+    """A single line on the terminal that keeps overwriting itself, with the estimated remaining time."""
+    def __init__(self, interval: float = 0.2, stream=None) -> None:
+        super().__init__(interval)
+        self.stream = stream
+
+    def _write(self, text, end='\n'):
+        print(text, end=end, file=self.stream or sys.stdout, flush=True)
+
+    def started(self, progress):
+        self._write(f'Completing Graph to a depth of up to {progress.max_depth} or a maximum of {progress.max_nodes} wikinodes...')
+
+    def report(self, progress):
+        remaining = estimate_remaining(progress)
+        eta = f'{remaining:.0f}s' if remaining is not None else '?'
+        # Padded, so that a shorter line fully covers the previous one.
+        self._write(f'Treating level {progress.depth}: {progress.layer_done}/{progress.layer_size} done; nodes: {progress.size}/{progress.max_nodes} '
+                    f'({nodes_per_second(progress):.1f}/s); estimated remaining time: {eta}'.ljust(100), end='\r')
+
+    def finished(self, progress):
+        self.report(progress)
+        # Terminating the self overriding progress line
+        self._write(f'\nCompleted in {progress.elapsed:.1f}s.')
+
+
+class LogProgress(_Throttled):
+    """Reports to the logging module, for runs without a terminal."""
+    def __init__(self, interval: float = 10.0, logger: logging.Logger = None) -> None:
+        super().__init__(interval)
+        self.logger = logger or logging.getLogger('wikigraph')
+
+    def layer_started(self, progress):
+        self.logger.info('Expanding layer %d: %d nodes', progress.depth, progress.layer_size)
+
+    def report(self, progress):
+        self.logger.info('Layer %d: %d/%d done; %d nodes; %.1f nodes/s; %d failed', progress.depth, progress.layer_done,
+                         progress.layer_size, progress.size, nodes_per_second(progress), progress.failed)
+
+    def finished(self, progress):
+        self.logger.info('Completed: %d nodes, %d expanded, %d failed in %.1fs', progress.size, progress.expanded,
+                         progress.failed, progress.elapsed)
+
+
+class MetricsProgress(_Throttled):
+    """Writes the metrics of the crawl to a file every interval and when the crawl is done (see wikigraph_metrics.write_metrics)."""
+    def __init__(self, path: str, interval: float = 10.0, registry: wikigraph_metrics.MetricsRegistry = None) -> None:
+        super().__init__(interval)
+        self.path = path
+        self.registry = registry
+
+    def report(self, progress):
+        wikigraph_metrics.write_metrics(self.path, self.registry)
+
+    def finished(self, progress):
+        self.report(progress)
+
+
+class Reporters(ProgressReporter):
+    """Hands everything on to several reporters."""
+    def __init__(self, *reporters: ProgressReporter) -> None:
+        self.reporters = reporters
+
+    def started(self, progress):
+        for reporter in self.reporters:
+            reporter.started(progress)
+
+    def layer_started(self, progress):
+        for reporter in self.reporters:
+            reporter.layer_started(progress)
+
+    def update(self, progress):
+        for reporter in self.reporters:
+            reporter.update(progress)
+
+    def finished(self, progress):
+        for reporter in self.reporters:
+            reporter.finished(progress)
@@ -0,0 +1,60 @@
+"""Canonical form of wikipedia urls, so that the variants under which an article is referenced end up as one node.
+
+Variants that are told apart by the url alone:
+    percent-encoding    'M%c3%bcnchen', 'München' and 'M%C3%BCnchen' are the same article. Titles are encoded the way
+                        MediaWiki encodes its links.
+    spaces              'Joanne K. Rowling', 'Joanne_K._Rowling' and 'Joanne__K._Rowling '
+    first letter        MediaWiki capitalizes the first letter of titles, 'joanne_K._Rowling' is 'Joanne_K._Rowling'
+    host                protocol relative '//de.wikipedia.org/...', plain http, upper case and mobile hosts ('de.m.wikipedia.org')
+    fragments           '#Leben' points into the same page
+
+Redirects (eg. 'Rowling' to 'Joanne_K._Rowling') can only be told apart once the page is downloaded and states its
+canonical url. The graph then merges the nodes (see WikiGraph).
+"""
+import re
+from urllib.parse import quote, unquote, urlsplit
+
+# Characters that MediaWiki leaves unencoded in the titles of its links (see wfUrlencode)
+SAFE = ';@$!*(),/~:'
+_UNDERSCORES = re.compile(r'_+')
+_MOBILE = re.compile(r'^([a-z\-]+)\.m\.(wikipedia\.org)$')
+
+
+def canonical_title(title: str) -> str:
+    """
+    Args:
+        title (str): title of an article, with spaces or underscores and decoded or percent-encoded
+
+    Returns:
+        str: the title as it appears in canonical urls, eg. 'Joanne_K._Rowling'
+    """
+    title = _UNDERSCORES.sub('_', unquote(title, errors='strict').replace(' ', '_')).strip('_')
+    first = title[:1].upper()
+    # Letters like ß have no single upper case letter. MediaWiki leaves them alone.
+    if len(first) == 1:
+        title = first + title[1:]
+    return quote(title, safe=SAFE)
+
+
+def canonical_url(url: str) -> str:
+    """
+    Args:
+        url (str): absolute or protocol relative url of a wikipedia article
+
+    Returns:
+        str: canonical form of the url. Urls that are no article urls (or no valid utf-8 when decoded) are returned
+            without their fragment, but otherwise as they are.
+    """
+    scheme, host, path, query, _ = urlsplit(url)
+    scheme = scheme.lower() or 'https'
+    host = host.lower()
+    if host.endswith('wikipedia.org'):
+        scheme = 'https'
+        host = _MOBILE.sub(r'\1.\2', host)
+    prefix, separator, title = path.partition('/wiki/')
+    if separator and not prefix:
+        try:
+            path = '/wiki/' + canonical_title(title)
+        except UnicodeDecodeError:
+            pass
+    return f"{scheme}://{host}{path}{'?' + query if query else ''}"